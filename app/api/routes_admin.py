@@ -0,0 +1,78 @@
+"""
+Rutas API de Administración
+Diagnóstico de rendimiento de las consultas a Socrata y del arranque
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
+import asyncio
+import os
+from app.core.config import settings
+from app.core.recursos import recursos
+from app.core.tracing import RutaMedida
+from app.services.query_stats import estadisticas_consultas
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.report_service import report_service
+
+async def verificar_admin(x_admin_token: Optional[str] = Header(None)):
+    """Exige X-Admin-Token cuando ADMIN_TOKEN está configurado"""
+    if settings.ADMIN_TOKEN and x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+router = APIRouter(route_class=RutaMedida, dependencies=[Depends(verificar_admin)])
+
+@router.get("/consultas-lentas")
+async def listar_consultas_lentas(
+    limite: int = Query(20, ge=1, le=200),
+    orden: str = Query("total_ms", regex="^(total_ms|p99_ms|p50_ms|max_ms|cantidad|errores)$")
+):
+    """
+    Consultas SoQL agrupadas por huella (literales reemplazados por '?'),
+    ordenadas por el criterio indicado
+    """
+    return {
+        "umbral_lenta_ms": settings.SLOW_QUERY_MS,
+        "consultas": estadisticas_consultas.top(limite=limite, orden=orden)
+    }
+
+@router.delete("/consultas-lentas")
+async def reiniciar_consultas_lentas():
+    """
+    Reinicia los agregados en memoria (el log de consultas lentas se conserva)
+    """
+    estadisticas_consultas.reiniciar()
+    return {"success": True}
+
+@router.get("/arranque")
+async def estado_arranque():
+    """
+    Tiempo total de arranque del lifespan y de apertura de cada recurso
+    """
+    return {**recursos.estado(), "snapshot": dataset_snapshot.estado(), "pid": os.getpid()}
+
+@router.get("/cola-reportes")
+async def estado_cola_reportes():
+    """
+    Lotes escritos por la cola de reportes de este worker y reportes por lote
+    """
+    return {**report_service.cola.estado(), "pid": os.getpid()}
+
+@router.get("/mantenimiento-reportes")
+async def estado_mantenimiento_reportes():
+    """
+    Resultado de la última retención/compactación del almacén de reportes
+    """
+    return {
+        "retencion_dias": settings.REPORTES_RETENCION_DIAS,
+        "intervalo_horas": settings.REPORTES_MANTENIMIENTO_HORAS,
+        "ultimo": report_service.ultimo_mantenimiento(),
+    }
+
+@router.post("/mantenimiento-reportes")
+async def ejecutar_mantenimiento_reportes():
+    """
+    Ejecuta ya la retención y compactación, sin esperar al intervalo
+    """
+    try:
+        return await asyncio.to_thread(report_service.mantener, True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en el mantenimiento: {str(e)}")
@@ -3,11 +3,18 @@ Rutas API para Dashboard
 HU02: Estadísticas y visualizaciones
 HU-INVIMA-002: Visualización de estadísticas de trámites INVIMA
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import re
 from app.services.socrata_client import socrata_client
+from app.services.estadisticas_cubo import cubo_estadisticas
+from app.services.estadisticas_excel import enviar_y_borrar, exportador_excel
+from app.core.arrow import acepta_arrow, respuesta_arrow
+from app.core.condicional import respuesta_json
+from app.core.tracing import RutaMedida
 
-router = APIRouter()
+router = APIRouter(route_class=RutaMedida)
 
 @router.get("/estadisticas")
 async def obtener_estadisticas():
@@ -50,6 +57,7 @@ async def obtener_metricas():
 
 @router.get("/estadisticas-suit")
 async def obtener_estadisticas_suit(
+    request: Request,
     ano: Optional[str] = Query(None, description="Filtrar por año"),
     clase: Optional[str] = Query(None, description="Filtrar por clase de trámite"),
     palabra_clave: Optional[str] = Query(None, description="Filtrar por palabra clave en nombre")
@@ -72,6 +80,8 @@ async def obtener_estadisticas_suit(
     - Cálculo directo sobre datos del SUIT
     - Generación de gráficos <5 segundos (hasta 10,000 registros)
     - Interfaz intuitiva y móvil
+    
+    La respuesta lleva ETag: con If-None-Match y los mismos datos devuelve 304
     """
     try:
         stats = await socrata_client.obtener_estadisticas_suit(
@@ -79,9 +89,64 @@ async def obtener_estadisticas_suit(
             clase=clase,
             palabra_clave=palabra_clave
         )
-        return stats
+        return respuesta_json(request, stats)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error al obtener estadísticas SUIT: {str(e)}"
         )
+
+@router.get("/estadisticas-suit/export.xlsx")
+async def exportar_estadisticas_suit_excel(
+    ano: Optional[str] = Query(None, description="Filtrar por año"),
+    clase: Optional[str] = Query(None, description="Filtrar por clase de trámite"),
+    palabra_clave: Optional[str] = Query(None, description="Filtrar por palabra clave en nombre")
+):
+    """
+    HU-INVIMA-002: Exportación a Excel de las estadísticas SUIT
+    
+    Hojas Resumen, Por Año, Por Categoría, Por Clase y Top Trámites (las de
+    /estadisticas-suit con los mismos filtros) y Detalle, con todas las filas
+    filtradas del dataset. El libro se escribe en un proceso aparte con memoria
+    constante y se envía por bloques
+    """
+    try:
+        ruta = await exportador_excel.exportar(ano=ano, clase=clase, palabra_clave=palabra_clave)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al exportar estadísticas SUIT: {str(e)}"
+        )
+    nombre = f"estadisticas_invima_{re.sub(r'[^A-Za-z0-9_-]', '_', ano or 'todos')}.xlsx"
+    return StreamingResponse(
+        enviar_y_borrar(ruta),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}"',
+            "Content-Length": str(ruta.stat().st_size),
+        }
+    )
+
+@router.get("/estadisticas-suit/cubo")
+async def obtener_cubo_estadisticas_suit(request: Request):
+    """
+    Cubo compacto para calcular /estadisticas-suit en el cliente
+    
+    Conteos por año, clase y nombre del trámite con las dimensiones codificadas
+    como diccionario (`dimensiones` + `codigos`), la máscara de categorías de
+    cada fila y la `version` del dataset de la que sale. Se construye una vez por
+    versión; con If-None-Match responde 304 mientras no cambie
+    
+    Con `Accept: application/vnd.apache.arrow.stream` las dimensiones viajan
+    como columnas de diccionario de Arrow y el resto de campos en los metadatos
+    """
+    try:
+        cubo = await cubo_estadisticas.obtener()
+        if acepta_arrow(request):
+            return respuesta_arrow(request, cubo["tabla"], cubo["metadatos"])
+        return respuesta_json(request, cubo["json"])
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al obtener el cubo de estadísticas SUIT: {str(e)}"
+        )
@@ -3,14 +3,24 @@ Rutas API Públicas
 HU03: Tablero público
 HU04: Datos abiertos
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from app.services.socrata_client import socrata_client
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.exportaciones import FORMATOS, LISTO, ColaExportacionLlena, trabajos_exportacion
+from app.services.exportaciones_completas import exportaciones_completas
+from app.services.perfil_dataset import perfil_dataset
+from app.models.exportacion_model import EstadoExportacion, SolicitudExportacion
+from app.core.archivos import respuesta_archivo
+from app.core.arrow import acepta_arrow, respuesta_arrow, tabla_desde_filas
+from app.core.condicional import respuesta_json
+from app.core.tracing import RutaMedida, medir
+import asyncio
 import io
 import csv
 import json
 
-router = APIRouter()
+router = APIRouter(route_class=RutaMedida)
 
 @router.get("/tablero")
 async def obtener_tablero_publico():
@@ -35,19 +45,71 @@ async def obtener_tablero_publico():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener tablero público: {str(e)}")
 
+@router.get("/version")
+async def obtener_version_dataset(request: Request):
+    """
+    Versión publicada del dataset. El frontend la incluye en la clave de sus
+    cachés: cuando cambia, las entradas de la versión anterior dejan de usarse
+    sin vaciar la caché de nadie más
+    """
+    version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+    return respuesta_json(request, {
+        "dataset_id": dataset_snapshot.dataset_id,
+        "version": version,
+        "snapshot": dataset_snapshot.version,
+    })
+
+@router.get("/perfil")
+async def obtener_perfil_dataset(request: Request):
+    """
+    HU04: Perfil de las columnas del dataset completo
+    
+    Por columna: tipo, nulos, valores distintos, valores más frecuentes (`top`),
+    textos vacíos y longitud de los textos (mínima, media y máxima). Se calcula
+    una vez por versión del dataset; con If-None-Match responde 304 mientras no
+    cambie
+    """
+    try:
+        return respuesta_json(request, await perfil_dataset.obtener())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el perfil del dataset: {str(e)}")
+
 @router.get("/datos-abiertos")
 async def obtener_datos_abiertos(
+    request: Request,
     formato: str = Query("json", regex="^(json|csv)$"),
     limit: int = Query(1000, ge=1, le=10000)
 ):
     """
     HU04: Descarga de datos abiertos en formato JSON o CSV
+    
+    Con formato=json y `Accept: application/vnd.apache.arrow.stream` responde
+    un stream IPC de Arrow (metadatos: total)
     """
     try:
-        datos = await socrata_client.obtener_datos_publicos(
-            formato=formato,
-            limit=limit
-        )
+        arrow = formato == "json" and acepta_arrow(request)
+        tabla = datos = None
+        # Como el cubo: el snapshot solo sirve si es de la versión publicada
+        if dataset_snapshot.disponible:
+            version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+            if dataset_snapshot.version == version:
+                # Servido desde el snapshot compartido, sin consultar Socrata
+                with medir("cache", {"snapshot": version}):
+                    if arrow:
+                        # Vista sobre el snapshot mapeado, sin pasar por objetos de Python
+                        tabla = dataset_snapshot.rebanada(limit)
+                    else:
+                        datos = dataset_snapshot.filas(limit)
+        if tabla is None and datos is None:
+            datos = await socrata_client.obtener_datos_publicos(
+                formato=formato,
+                limit=limit
+            )
+        
+        if arrow:
+            if tabla is None:
+                tabla = tabla_desde_filas(datos)
+            return respuesta_arrow(request, tabla, {"total": tabla.num_rows})
         
         if formato == "csv":
             # Convertir a CSV
@@ -55,7 +117,9 @@ async def obtener_datos_abiertos(
                 raise HTTPException(status_code=404, detail="No hay datos disponibles")
             
             output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=datos[0].keys())
+            # Socrata omite los campos nulos: la cabecera es la unión de las columnas
+            columnas = list(dict.fromkeys(k for fila in datos for k in fila))
+            writer = csv.DictWriter(output, fieldnames=columnas)
             writer.writeheader()
             writer.writerows(datos)
             
@@ -72,3 +136,88 @@ async def obtener_datos_abiertos(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos abiertos: {str(e)}")
+
+@router.api_route("/datos-abiertos/completo.{formato}", methods=["GET", "HEAD"])
+async def descargar_dataset_completo(request: Request, formato: str):
+    """
+    HU04: Dataset completo en csv, json o parquet
+    
+    Se genera una vez por versión del dataset y se sirve desde el disco: en
+    gzip o brotli si el cliente lo acepta (CSV y JSON), con ETag por versión y
+    rangos de bytes (`Range`) para reanudar descargas
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=404, detail=f"Formato no soportado: {formato} (use {', '.join(FORMATOS)})")
+    try:
+        version, variantes = await exportaciones_completas.asegurar(formato)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Exportación completa no disponible: {str(e)}")
+    tipo, extension = FORMATOS[formato]
+    return respuesta_archivo(
+        request, variantes, tipo,
+        filename=f"invima_datos_completo.{extension}",
+        etag=f"{version}-{formato}",
+        # Mismo nombre, contenido nuevo con cada versión: revalidar siempre
+        headers={"Cache-Control": "no-cache"},
+    )
+
+def _con_descarga(request: Request, estado: dict) -> dict:
+    """Estado del trabajo con la ruta del archivo cuando está listo"""
+    descarga = None
+    if estado["estado"] == LISTO:
+        # Ruta relativa: detrás de un proxy el host interno no sirve al navegador
+        descarga = request.app.url_path_for("descargar_exportacion", trabajo_id=estado["id"])
+    return {**estado, "descarga": descarga}
+
+@router.post("/exportaciones", status_code=202, response_model=EstadoExportacion)
+async def crear_exportacion(request: Request, solicitud: SolicitudExportacion):
+    """
+    HU04: Exportación asíncrona de datos abiertos
+    
+    Encola un trabajo con el formato (csv, json o parquet), los filtros (`ano`,
+    `clase`, `palabra_clave`) y el límite de filas, y devuelve su estado con el
+    `id` para consultarlo. Una solicitud igual a un trabajo en marcha o ya
+    terminado (para la misma versión del dataset) recibe ese mismo trabajo
+    """
+    try:
+        estado = await trabajos_exportacion.enviar(
+            solicitud.formato,
+            {"ano": solicitud.ano, "clase": solicitud.clase, "palabra_clave": solicitud.palabra_clave},
+            solicitud.limite
+        )
+    except ColaExportacionLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear la exportación: {str(e)}")
+    return _con_descarga(request, estado)
+
+@router.get("/exportaciones/{trabajo_id}", response_model=EstadoExportacion)
+async def consultar_exportacion(request: Request, trabajo_id: str):
+    """
+    Estado del trabajo: `en_cola`, `en_curso` (con `filas`, `total` y
+    `progreso` de 0 a 1), `listo` (con la URL de `descarga`) o `error`
+    """
+    estado = await asyncio.to_thread(trabajos_exportacion.estado, trabajo_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Exportación no encontrada o vencida")
+    return _con_descarga(request, estado)
+
+@router.api_route("/exportaciones/{trabajo_id}/archivo", methods=["GET", "HEAD"], name="descargar_exportacion")
+async def descargar_exportacion(request: Request, trabajo_id: str):
+    """Archivo generado por el trabajo, servido desde el disco y con rangos de bytes (`Range`)"""
+    estado = await asyncio.to_thread(trabajos_exportacion.estado, trabajo_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Exportación no encontrada o vencida")
+    if estado["estado"] != LISTO:
+        raise HTTPException(status_code=409, detail=f"La exportación no está lista ({estado['estado']})")
+    ruta = trabajos_exportacion.ruta_archivo(estado)
+    if not ruta.exists():
+        raise HTTPException(status_code=404, detail="Exportación no encontrada o vencida")
+    tipo, extension = FORMATOS[estado["formato"]]
+    return respuesta_archivo(
+        request, {"identity": ruta}, tipo,
+        filename=f"invima_datos_{estado['id'][:8]}.{extension}",
+        etag=estado["id"],
+    )
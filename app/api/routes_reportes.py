@@ -2,11 +2,18 @@
 Rutas API para Reportes de Errores
 HU05: Reportar inconsistencias
 """
-from fastapi import APIRouter, HTTPException
-from app.models.reporte_model import ReporteError, ReporteResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timedelta
+from app.models.reporte_model import ReporteError, ReporteLoteResponse, ReporteResponse
 from app.services.report_service import report_service
+from app.services.report_export import FORMATOS
+from app.core.tracing import RutaMedida
+from app.core.config import settings
+import json
 
-router = APIRouter()
+router = APIRouter(route_class=RutaMedida)
 
 @router.post("/crear", response_model=ReporteResponse)
 async def crear_reporte(reporte: ReporteError):
@@ -19,13 +26,151 @@ async def crear_reporte(reporte: ReporteError):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear reporte: {str(e)}")
 
+async def _leer_cuerpo(request: Request, limite: int) -> bytes:
+    """
+    Cuerpo de la solicitud, rechazado con 413 en cuanto supera `limite` bytes:
+    por Content-Length antes de leerlo o, sin él, mientras llega
+    """
+    excedido = HTTPException(status_code=413, detail=f"El cuerpo no puede superar {limite} bytes")
+    largo = request.headers.get("content-length", "")
+    if largo.isdigit() and int(largo) > limite:
+        raise excedido
+    cuerpo = bytearray()
+    async for bloque in request.stream():
+        cuerpo += bloque
+        if len(cuerpo) > limite:
+            raise excedido
+    return bytes(cuerpo)
+
+def _leer_lote(cuerpo: bytes, tipo_contenido: str) -> List[Any]:
+    """Arreglo JSON o NDJSON (una línea por reporte; las líneas inválidas se informan por índice)"""
+    try:
+        texto = cuerpo.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe estar en UTF-8")
+    if "ndjson" in tipo_contenido or "jsonl" in tipo_contenido:
+        elementos: List[Any] = []
+        for linea in texto.splitlines():
+            if not linea.strip():
+                continue
+            try:
+                elementos.append(json.loads(linea))
+            except json.JSONDecodeError as e:
+                elementos.append(ValueError(f"JSON inválido: {e}"))
+        return elementos
+    try:
+        elementos = json.loads(texto)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+    if not isinstance(elementos, list):
+        raise HTTPException(status_code=400, detail="Se esperaba un arreglo de reportes")
+    return elementos
+
+@router.post("/crear-lote", response_model=ReporteLoteResponse)
+async def crear_reportes_lote(request: Request):
+    """
+    Importación masiva de reportes: arreglo JSON de ReporteError o NDJSON
+    (Content-Type: application/x-ndjson). Los válidos se guardan en una sola
+    escritura; la respuesta trae el reporte_id o los errores de cada elemento
+    """
+    limite = settings.REPORTES_IMPORTACION_MAX * settings.REPORTES_IMPORTACION_BYTES_REPORTE
+    cuerpo = await _leer_cuerpo(request, limite)
+    elementos = _leer_lote(cuerpo, request.headers.get("content-type", ""))
+    if len(elementos) > settings.REPORTES_IMPORTACION_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {settings.REPORTES_IMPORTACION_MAX} reportes por solicitud"
+        )
+    try:
+        return await report_service.guardar_lote(elementos)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear reportes: {str(e)}")
+
+@router.get("/estadisticas")
+async def estadisticas_reportes(
+    dias: int = Query(30, ge=1, le=365, description="Días de la serie diaria")
+):
+    """
+    Estadísticas de todos los reportes: por tipo de error, por dominio del
+    email, con/sin radicado, últimos 7 y 30 días (días calendario, incluido
+    hoy), serie diaria y casi duplicados (total y clusters más grandes). Se
+    sirven desde contadores, sin recorrer los reportes
+    """
+    try:
+        return await report_service.obtener_estadisticas(dias=dias)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
+
+def filtros_reportes(
+    tipo_error: Optional[str] = Query(None, description="Tipo de error exacto"),
+    dominio: Optional[str] = Query(None, description="Dominio del email, p. ej. gmail.com"),
+    radicado: Optional[str] = Query(None, description="Número de radicado exacto"),
+    con_radicado: Optional[bool] = Query(None, description="Solo reportes con (true) o sin (false) radicado"),
+    cluster: Optional[str] = Query(None, description="cluster_id: un reporte y sus casi duplicados"),
+    desde: Optional[date] = Query(None, description="Fecha inicial (incluida)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (incluida)")
+) -> Dict[str, Any]:
+    """Filtros comunes de /listar y /exportar"""
+    return {
+        "tipo_error": tipo_error,
+        "email_dominio": dominio,
+        "numero_radicado": radicado,
+        "con_radicado": con_radicado,
+        "cluster_id": cluster,
+        "desde": desde.isoformat() if desde else None,
+        "hasta": (hasta + timedelta(days=1)).isoformat() if hasta else None,
+    }
+
 @router.get("/listar")
-async def listar_reportes(limit: int = 100):
+async def listar_reportes(
+    limit: int = Query(100, ge=1, le=1000),
+    filtros: Dict[str, Any] = Depends(filtros_reportes),
+    orden: str = Query("desc", regex="^(desc|asc)$", description="Orden por fecha del reporte"),
+    cursor: Optional[str] = Query(None, description="Cursor 'siguiente' de la página anterior"),
+    anonimizado: bool = Query(False, description="Sustituir nombre y email por seudónimo y dominio"),
+    q: Optional[str] = Query(None, max_length=200, description="Texto a buscar en descripción y radicado")
+):
     """
-    Listar reportes guardados
+    Listar reportes guardados con filtros, orden por fecha y paginación por
+    cursor. Con `q` devuelve los que contienen todos los términos (sin
+    distinguir tildes ni mayúsculas), ordenados por relevancia
     """
     try:
-        reportes = await report_service.obtener_reportes(limit=limit)
-        return {"reportes": reportes, "total": len(reportes)}
+        if q and q.strip():
+            reportes, siguiente = await report_service.buscar_texto(
+                q, filtros, limit=limit, cursor=cursor, anonimizado=anonimizado
+            )
+        else:
+            reportes, siguiente = await report_service.buscar_reportes(
+                filtros, orden=orden, limit=limit, cursor=cursor, anonimizado=anonimizado
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar reportes: {str(e)}")
+    return {"reportes": reportes, "total": len(reportes), "siguiente": siguiente}
+
+@router.get("/exportar")
+async def exportar_reportes(
+    formato: str = Query("csv", regex="^(csv|jsonl|parquet)$", description="csv, jsonl o parquet"),
+    filtros: Dict[str, Any] = Depends(filtros_reportes),
+    orden: str = Query("desc", regex="^(desc|asc)$", description="Orden por fecha del reporte")
+):
+    """
+    Exporta todos los reportes filtrados, anonimizados en el backend (seudónimo
+    y dominio del email, nunca nombre ni email). El archivo se genera y envía
+    por bloques a medida que se lee el almacén, con memoria constante
+    """
+    try:
+        contenido = await report_service.exportar_reportes(filtros, orden, formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar reportes: {str(e)}")
+    _, tipo, extension = FORMATOS[formato]
+    nombre = f"reportes_anonimos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return StreamingResponse(
+        contenido,
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
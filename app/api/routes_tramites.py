@@ -2,12 +2,14 @@
 Rutas API para Trámites
 HU01: Búsqueda de trámites
 """
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request
 from typing import Optional, List
 from app.services.socrata_client import socrata_client
 from app.models.tramites_model import TramiteResponse, TramiteSuitResponse
+from app.core.arrow import acepta_arrow, respuesta_arrow, tabla_desde_filas
+from app.core.tracing import RutaMedida
 
-router = APIRouter()
+router = APIRouter(route_class=RutaMedida)
 
 @router.get("/buscar", response_model=TramiteResponse)
 async def buscar_tramites(
@@ -65,6 +67,7 @@ async def obtener_campos():
 
 @router.get("/suit", response_model=TramiteSuitResponse)
 async def buscar_tramites_suit(
+    request: Request,
     texto: Optional[str] = Query(None, description="Texto libre para buscar por nombre, propósito o palabra clave"),
     categorias: Optional[List[str]] = Query(
         None,
@@ -75,6 +78,9 @@ async def buscar_tramites_suit(
 ):
     """
     HU-INVIMA-001: Buscar trámites del INVIMA disponibles en el SUIT.
+    
+    Con `Accept: application/vnd.apache.arrow.stream` responde los trámites como
+    stream IPC de Arrow (pasos como lista de structs; metadatos: total, limit, offset)
     """
     try:
         resultado = await socrata_client.buscar_tramites_suit(
@@ -83,6 +89,12 @@ async def buscar_tramites_suit(
             limit=limit,
             offset=offset
         )
+        if acepta_arrow(request):
+            return respuesta_arrow(
+                request,
+                tabla_desde_filas(resultado["tramites"]),
+                {k: resultado[k] for k in ("total", "limit", "offset")}
+            )
         return resultado
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar trámites en el SUIT: {str(e)}")
@@ -0,0 +1,169 @@
+"""
+Archivos servidos desde el disco
+Respuesta para archivos ya generados (exportaciones): elige la copia
+precomprimida que acepta el cliente (Accept-Encoding), responde 304 si ya la
+tiene (If-None-Match) y atiende un rango de bytes (Range / If-Range) para que
+las descargas se puedan reanudar. El cuerpo se envía con la extensión zero-copy
+de ASGI cuando el servidor la ofrece (el servidor hace sendfile) y, si no, se
+lee por bloques sin cargar el archivo en memoria
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import os
+import re
+
+import anyio
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from app.core.condicional import coincide_etag
+
+# Preferencia entre codificaciones que el cliente acepta por igual
+PREFERENCIA = ("br", "gzip", "identity")
+
+_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def elegir_codificacion(request: Request, disponibles) -> str:
+    """Codificación de Accept-Encoding (con sus q) entre las disponibles; "identity" si ninguna"""
+    aceptadas: Dict[str, float] = {}
+    for parte in request.headers.get("accept-encoding", "").split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if not nombre:
+            continue
+        q = 1.0
+        coincidencia = re.search(r"q=([\d.]+)", parametros)
+        if coincidencia:
+            try:
+                q = float(coincidencia.group(1))
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    comodin = aceptadas.get("*", 0.0)
+    candidatas = [
+        (aceptadas.get(c, comodin), -PREFERENCIA.index(c), c)
+        for c in PREFERENCIA if c in disponibles and c != "identity"
+    ]
+    candidatas = [c for c in candidatas if c[0] > 0]
+    return max(candidatas)[2] if candidatas else "identity"
+
+
+def rango_pedido(cabecera: Optional[str], tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    (inicio, fin inclusive) de un Range de un solo tramo. None si no hay o no se
+    entiende (varios tramos, otras unidades): se responde el archivo completo.
+    ValueError si el tramo queda fuera del archivo (416)
+    """
+    if not cabecera:
+        return None
+    coincidencia = _RANGO.match(cabecera.strip())
+    if not coincidencia or coincidencia.groups() == ("", ""):
+        return None
+    inicio, fin = coincidencia.groups()
+    if inicio == "":
+        # Sufijo: los últimos n bytes
+        largo = int(fin)
+        if largo == 0:
+            raise ValueError("Rango vacío")
+        return max(tamano - largo, 0), tamano - 1
+    inicio = int(inicio)
+    fin = tamano - 1 if fin == "" else min(int(fin), tamano - 1)
+    if inicio >= tamano or inicio > fin:
+        raise ValueError("Rango fuera del archivo")
+    return inicio, fin
+
+
+class ArchivoResponse(FileResponse):
+    """FileResponse que envía solo el tramo [inicio, fin] del archivo"""
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, inicio: int, fin: int, **kwargs):
+        super().__init__(path, **kwargs)
+        self.inicio = inicio
+        self.fin = fin
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        restantes = self.fin - self.inicio + 1
+        if self.send_header_only or restantes <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as archivo:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": archivo,
+                    "offset": self.inicio,
+                    "count": restantes,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as archivo:
+                await archivo.seek(self.inicio)
+                while restantes > 0:
+                    bloque = await archivo.read(min(self.chunk_size, restantes))
+                    if not bloque:
+                        break
+                    restantes -= len(bloque)
+                    await send({"type": "http.response.body", "body": bloque, "more_body": restantes > 0})
+                if restantes > 0:
+                    # El archivo se acortó mientras se enviaba: cerrar el cuerpo igual
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def respuesta_archivo(
+    request: Request,
+    variantes: Dict[str, Path],
+    media_type: str,
+    filename: str,
+    etag: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Respuesta para un archivo del que hay copias por codificación ("identity" es
+    el original). `etag` identifica el contenido (por ejemplo, la versión del
+    dataset); a cada copia se le agrega su codificación. El rango, si lo hay, se
+    aplica a los bytes de la copia que se envía
+    """
+    codificacion = elegir_codificacion(request, variantes)
+    ruta = variantes[codificacion]
+    etag = f'"{etag}-{codificacion}"'
+    estado_archivo = os.stat(ruta)
+    tamano = estado_archivo.st_size
+    cabeceras = {
+        **(headers or {}),
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if coincide_etag(request, etag):
+        return Response(status_code=304, headers=cabeceras)
+
+    rango = None
+    si_rango = request.headers.get("if-range")
+    # If-Range: el rango vale solo si el cliente tiene la misma copia
+    if si_rango is None or si_rango.strip() == etag:
+        try:
+            rango = rango_pedido(request.headers.get("range"), tamano)
+        except ValueError:
+            return Response(status_code=416, headers={**cabeceras, "Content-Range": f"bytes */{tamano}"})
+
+    if rango is None:
+        inicio, fin, estado = 0, tamano - 1, 200
+    else:
+        (inicio, fin), estado = rango, 206
+        cabeceras["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+    if codificacion != "identity":
+        cabeceras["Content-Encoding"] = codificacion
+    cabeceras["Content-Length"] = str(fin - inicio + 1)
+    return ArchivoResponse(
+        ruta, inicio, fin,
+        status_code=estado,
+        headers=cabeceras,
+        media_type=media_type,
+        filename=filename,
+        stat_result=estado_archivo,
+        method=request.method,
+    )
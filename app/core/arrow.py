@@ -0,0 +1,65 @@
+"""
+Transporte Arrow
+Negociación de contenido para application/vnd.apache.arrow.stream: si el
+cliente lo pide en Accept, las respuestas tabulares salen como un stream IPC de
+Arrow en lugar de JSON. El cliente las lee sin parsear texto, con los tipos ya
+resueltos y, sin compresión de buffers, sin copiar los datos. Los metadatos de
+la respuesta (total, límites, versión) viajan como JSON en el esquema
+"""
+from typing import Any, Dict, Iterable, Optional
+import json
+
+import pyarrow as pa
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.core.condicional import respuesta_condicional
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+# Clave del esquema con los metadatos de la respuesta
+CLAVE_METADATOS = b"invima"
+
+
+def acepta_arrow(request: Request) -> bool:
+    """True si Accept incluye el stream de Arrow (con q > 0)"""
+    for parte in request.headers.get("accept", "").split(","):
+        tipo, *parametros = [p.strip() for p in parte.split(";")]
+        if tipo.lower() != ARROW_STREAM:
+            continue
+        for parametro in parametros:
+            nombre, _, valor = parametro.partition("=")
+            if nombre.strip() == "q":
+                try:
+                    return float(valor) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def tabla_desde_filas(filas: Iterable[Dict]) -> pa.Table:
+    """
+    Tabla a partir de registros como los de Socrata, que omiten los campos
+    nulos: las columnas son la unión de las claves, no solo las del primero
+    """
+    filas = list(filas)
+    columnas = list(dict.fromkeys(k for fila in filas for k in fila))
+    return pa.table({c: [fila.get(c) for fila in filas] for c in columnas})
+
+
+def serializar(tabla: pa.Table, metadatos: Optional[Dict[str, Any]] = None) -> bytes:
+    tabla = tabla.replace_schema_metadata(
+        {**(tabla.schema.metadata or {}), CLAVE_METADATOS: json.dumps(metadatos or {}, default=str)}
+    )
+    opciones = pa.ipc.IpcWriteOptions(compression=settings.ARROW_COMPRESION or None)
+    sumidero = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sumidero, tabla.schema, options=opciones) as escritor:
+        escritor.write_table(tabla)
+    return sumidero.getvalue().to_pybytes()
+
+
+def respuesta_arrow(
+    request: Request, tabla: pa.Table, metadatos: Optional[Dict[str, Any]] = None
+) -> Response:
+    """Stream IPC de Arrow con ETag"""
+    return respuesta_condicional(request, serializar(tabla, metadatos), ARROW_STREAM, {"Vary": "Accept"})
@@ -0,0 +1,44 @@
+"""
+Respuestas condicionales
+Las respuestas llevan un ETag calculado sobre el cuerpo serializado; si el
+cliente ya tiene esa versión (If-None-Match) se responde 304 sin cuerpo y el
+cliente reutiliza la copia que guardó
+"""
+from typing import Any, Dict, Optional
+import hashlib
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def etag_de(cuerpo: bytes) -> str:
+    return f'"{hashlib.sha1(cuerpo).hexdigest()[:20]}"'
+
+
+def coincide_etag(request: Request, etag: str) -> bool:
+    """Comparación débil de If-None-Match: ignora el prefijo W/ y acepta listas y *"""
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    return any(e.strip().removeprefix("W/") == etag for e in cabecera.split(","))
+
+
+def respuesta_condicional(
+    request: Request, cuerpo: bytes, media_type: str, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Respuesta con ETag, o 304 si el cliente ya tiene el mismo cuerpo"""
+    etag = etag_de(cuerpo)
+    # no-cache: los clientes pueden guardar la respuesta pero deben revalidarla
+    cabeceras = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+    if coincide_etag(request, etag):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, media_type=media_type, headers=cabeceras)
+
+
+def respuesta_json(request: Request, contenido: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON con ETag, serializado igual que JSONResponse"""
+    cuerpo = JSONResponse(jsonable_encoder(contenido)).body
+    return respuesta_condicional(request, cuerpo, "application/json", headers)
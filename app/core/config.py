@@ -1,6 +1,7 @@
 """
 Configuration Settings
 """
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -12,6 +13,64 @@ class Settings(BaseSettings):
     SOCRATA_USERNAME: str = ""
     SOCRATA_PASSWORD: str = ""
     
+    # Cassettes: "grabar" guarda cada respuesta, "reproducir" las sirve sin red
+    SOCRATA_CASSETTE_MODO: str = ""
+    SOCRATA_CASSETTE_RUTA: str = "cassettes/socrata.jsonl.gz"
+    SOCRATA_CASSETTE_LATENCIA: bool = False
+    
+    # Snapshot del dataset completo (Arrow IPC mapeado en memoria, compartido entre
+    # workers). Descarga el dataset entero al arrancar: gunicorn.conf.py lo activa
+    # en producción; con uvicorn (desarrollo) queda desactivado salvo que se defina
+    SNAPSHOT_HABILITADO: bool = False
+    SNAPSHOT_DIR: str = "snapshots"
+    SNAPSHOT_PAGINA: int = 50000
+    # Cada cuánto se consulta a Socrata la versión publicada del dataset (/public/version)
+    DATASET_VERSION_SEGUNDOS: float = 60.0
+    
+    # Reportes: "sqlite" (WAL, consultas indexadas) o "segmentos" (JSON Lines de solo anexado)
+    REPORTES_BACKEND: str = "sqlite"
+    REPORTES_SQLITE: str = "reports/reportes.db"
+    REPORTES_SEGMENTO_MAX_BYTES: int = 4 * 1024 * 1024
+    # Commit agrupado: espera para juntar reportes, tamaño máximo del lote y
+    # política de fsync ("lote", "intervalo" o "nunca"; true/false de versiones
+    # anteriores equivalen a "lote"/"nunca")
+    REPORTES_FLUSH_MS: float = 2.0
+    REPORTES_LOTE_MAX: int = 256
+    REPORTES_FSYNC: str = "lote"
+    REPORTES_FSYNC_INTERVALO_MS: float = 1000.0
+    REPORTES_IMPORTACION_MAX: int = 10000  # Reportes por solicitud en /crear-lote
+    # Bytes por reporte en /crear-lote: el cuerpo admite REPORTES_IMPORTACION_MAX veces esto
+    REPORTES_IMPORTACION_BYTES_REPORTE: int = 8192
+    # Retención: 0 conserva todo; si no, los reportes más antiguos salen del almacén
+    REPORTES_RETENCION_DIAS: int = 0
+    REPORTES_RETENCION_ARCHIVAR: bool = True  # False: se eliminan sin archivar
+    REPORTES_ARCHIVO_DIR: str = "reports/archivo"
+    REPORTES_MANTENIMIENTO_HORAS: float = 24.0  # Cada cuánto se compacta el almacén
+    # Casi duplicados (MinHash/LSH sobre la descripción)
+    REPORTES_DUPLICADOS_UMBRAL: float = 0.6
+    REPORTES_DUPLICADOS_PERMUTACIONES: int = 64
+    REPORTES_DUPLICADOS_BANDAS: int = 16
+    # Clave de los seudónimos de usuario en las exportaciones; vacía = aleatoria en reports/
+    REPORTES_CLAVE_ANONIMIZACION: str = ""
+    
+    # Respuestas Arrow (Accept: application/vnd.apache.arrow.stream): compresión de
+    # los buffers, "" (ninguna: el cliente lee sin copiar), "lz4" o "zstd"
+    ARROW_COMPRESION: str = ""
+    
+    # Excel de estadísticas: procesos que escriben libros a la vez y directorio
+    # de los archivos temporales ("" = el del sistema)
+    EXCEL_PROCESOS: int = 2
+    EXCEL_TMP_DIR: str = ""
+    
+    # Trabajos de exportación de datos abiertos: directorio de los archivos,
+    # trabajos simultáneos por worker, trabajos en espera, horas que se conserva
+    # cada archivo y filas máximas por exportación
+    EXPORTACION_DIR: str = "exports"
+    EXPORTACION_TRABAJADORES: int = 2
+    EXPORTACION_COLA: int = 32
+    EXPORTACION_HORAS: float = 24.0
+    EXPORTACION_MAX_FILAS: int = 1000000
+    
     # FastAPI
     FASTAPI_HOST: str = "0.0.0.0"
     FASTAPI_PORT: int = 8000
@@ -20,6 +79,33 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:8501", "http://streamlit:8501"]
     
+    # Trazas: devolver la traza JSON completa cuando se solicita con X-Debug-Trace
+    TRACE_DEBUG: bool = False
+    
+    # Consultas lentas a Socrata
+    SLOW_QUERY_MS: float = 2000.0
+    SLOW_QUERY_LOG: str = "logs/consultas_lentas.log"
+    SLOW_QUERY_LOG_MAX_BYTES: int = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS: int = 5
+    SLOW_QUERY_MUESTRAS: int = 1000
+    
+    # Administración: si se define, las rutas /admin exigen la cabecera X-Admin-Token
+    ADMIN_TOKEN: str = ""
+    
+    @field_validator("REPORTES_FSYNC", mode="before")
+    @classmethod
+    def _politica_fsync(cls, valor):
+        # REPORTES_FSYNC era booleano: los valores antiguos siguen valiendo
+        if isinstance(valor, bool):
+            return "lote" if valor else "nunca"
+        if isinstance(valor, str):
+            valor = valor.strip().lower()
+            if valor in ("true", "1", "yes", "on"):
+                return "lote"
+            if valor in ("false", "0", "no", "off"):
+                return "nunca"
+        return valor
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,93 @@
+"""
+Recursos del proceso
+Los servicios pesados (clientes HTTP, snapshots, índices, almacenes) se registran
+aquí sin construirse al importar; el lifespan de FastAPI los abre en paralelo al
+arrancar y los cierra en orden inverso al apagar
+"""
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("invima.recursos")
+
+
+@dataclass(eq=False)
+class Recurso:
+    nombre: str
+    abrir: Callable[[], object]
+    cerrar: Optional[Callable[[], object]] = None
+
+
+class Recursos:
+    def __init__(self):
+        self._registrados: List[Recurso] = []
+        self._abiertos: List[Recurso] = []
+        self.tiempos_ms: Dict[str, float] = {}
+        self.arranque_ms: Optional[float] = None
+
+    def registrar(self, nombre: str, abrir: Callable[[], object], cerrar: Optional[Callable[[], object]] = None) -> None:
+        """Registra un recurso; `abrir` y `cerrar` pueden ser bloqueantes o async"""
+        self._registrados.append(Recurso(nombre, abrir, cerrar))
+
+    @staticmethod
+    async def _ejecutar(funcion: Callable[[], object]) -> None:
+        # Las funciones async corren en el event loop; las bloqueantes, en un hilo
+        if asyncio.iscoroutinefunction(funcion):
+            await funcion()
+        else:
+            await asyncio.to_thread(funcion)
+
+    async def _abrir(self, recurso: Recurso) -> None:
+        inicio = time.perf_counter()
+        await self._ejecutar(recurso.abrir)
+        self.tiempos_ms[recurso.nombre] = round((time.perf_counter() - inicio) * 1000, 2)
+        self._abiertos.append(recurso)
+
+    async def abrir(self) -> None:
+        """Abre todos los recursos registrados a la vez, cada uno en un hilo"""
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(
+            *(self._abrir(r) for r in self._registrados), return_exceptions=True
+        )
+        errores = [r for r in resultados if isinstance(r, BaseException)]
+        if errores:
+            # Cerrar lo que sí se abrió antes de abortar el arranque
+            await self.cerrar()
+            raise errores[0]
+        self.arranque_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    async def cerrar(self) -> None:
+        """
+        Cierra los recursos abiertos en orden inverso al de registro, sin depender
+        del orden en que terminaron de abrirse; un fallo no impide cerrar el resto
+        """
+        abiertos = [r for r in reversed(self._registrados) if r in self._abiertos]
+        self._abiertos = []
+        for recurso in abiertos:
+            if recurso.cerrar is None:
+                continue
+            try:
+                await self._ejecutar(recurso.cerrar)
+            except Exception:
+                logger.exception("Error al cerrar el recurso %s", recurso.nombre)
+
+    def estado(self) -> Dict:
+        return {
+            "arranque_ms": self.arranque_ms,
+            "recursos_ms": dict(self.tiempos_ms),
+            "abiertos": [r.nombre for r in self._registrados if r in self._abiertos],
+        }
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        await self.abrir()
+        try:
+            yield
+        finally:
+            await self.cerrar()
+
+
+recursos = Recursos()
@@ -0,0 +1,162 @@
+"""
+Trazas por solicitud
+Registra la duración de cada consulta a Socrata, cada búsqueda en caché, cada
+cálculo de un agregado (cubo, perfil) y la serialización de la respuesta, y las
+expone en la cabecera Server-Timing
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import time
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+# Orden en que se reportan las métricas en Server-Timing
+CATEGORIAS = ("socrata", "cache", "calculo", "app", "serializacion")
+
+
+class Traza:
+    """Eventos medidos durante una única solicitud HTTP"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.eventos: List[Dict] = []
+
+    def registrar(self, categoria: str, duracion_ms: float, detalle: Optional[Dict] = None) -> None:
+        evento = {
+            "categoria": categoria,
+            "inicio_ms": round((time.perf_counter() - self.inicio) * 1000 - duracion_ms, 2),
+            "duracion_ms": round(duracion_ms, 2),
+        }
+        if detalle:
+            evento["detalle"] = detalle
+        self.eventos.append(evento)
+
+    def duracion(self, categoria: str) -> float:
+        return sum(e["duracion_ms"] for e in self.eventos if e["categoria"] == categoria)
+
+    def server_timing(self) -> str:
+        """Agrega los eventos por categoría en el formato de la cabecera Server-Timing"""
+        metricas = []
+        for categoria in CATEGORIAS:
+            eventos = [e for e in self.eventos if e["categoria"] == categoria]
+            if not eventos:
+                continue
+            metricas.append(
+                f'{categoria};dur={self.duracion(categoria):.1f};desc="{len(eventos)} eventos"'
+            )
+        total_ms = (time.perf_counter() - self.inicio) * 1000
+        metricas.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(metricas)
+
+    def como_dict(self) -> Dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.inicio) * 1000, 2),
+            "eventos": self.eventos,
+        }
+
+
+_traza_actual: ContextVar[Optional[Traza]] = ContextVar("traza_actual", default=None)
+
+
+def obtener_traza() -> Optional[Traza]:
+    """Traza de la solicitud en curso, o None fuera de una solicitud"""
+    return _traza_actual.get()
+
+
+@contextmanager
+def medir(categoria: str, detalle: Optional[Dict] = None):
+    """
+    Mide el bloque y lo registra en la traza de la solicitud actual.
+    Fuera de una solicitud no hace nada.
+    """
+    traza = _traza_actual.get()
+    if traza is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza.registrar(categoria, (time.perf_counter() - inicio) * 1000, detalle)
+
+
+def _medir_endpoint(endpoint: Callable) -> Callable:
+    """Envuelve el endpoint para separar su tiempo del de serialización"""
+    # include_router vuelve a construir la ruta con el endpoint ya envuelto
+    if not asyncio.iscoroutinefunction(endpoint) or getattr(endpoint, "_medido", False):
+        return endpoint
+
+    @wraps(endpoint)
+    async def endpoint_medido(*args, **kwargs):
+        with medir("app"):
+            return await endpoint(*args, **kwargs)
+
+    endpoint_medido._medido = True
+    return endpoint_medido
+
+
+class RutaMedida(APIRoute):
+    """
+    Ruta que registra el tiempo del endpoint y, por diferencia, el de
+    validación y serialización de la respuesta
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _medir_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def handler_medido(request):
+            inicio = time.perf_counter()
+            response = await handler(request)
+            traza = _traza_actual.get()
+            if traza is not None:
+                total_ms = (time.perf_counter() - inicio) * 1000
+                traza.registrar("serializacion", max(total_ms - traza.duracion("app"), 0.0))
+            return response
+
+        return handler_medido
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI que abre una traza por solicitud y agrega la cabecera
+    Server-Timing. Con TRACE_DEBUG activo y la cabecera X-Debug-Trace: 1 en la
+    solicitud, también devuelve la traza completa en JSON.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traza = Traza()
+        token = _traza_actual.set(traza)
+        solicitar_debug = settings.TRACE_DEBUG and any(
+            nombre == b"x-debug-trace" and valor.lower() in (b"1", b"true")
+            for nombre, valor in scope.get("headers", [])
+        )
+
+        async def send_con_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", traza.server_timing())
+                if solicitar_debug:
+                    headers.append("X-Debug-Trace", json.dumps(traza.como_dict()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_timing)
+        finally:
+            _traza_actual.reset(token)
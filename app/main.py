@@ -5,12 +5,30 @@ Backend para Dashboard INVIMA - Consumo de API Socrata
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import routes_tramites, routes_dashboard, routes_reportes, routes_public
+from app.core.tracing import ServerTimingMiddleware
+from app.core.recursos import recursos
+from app.services.socrata_client import socrata_client
+from app.services.report_service import report_service
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.estadisticas_excel import exportador_excel
+from app.services.exportaciones import trabajos_exportacion
+from app.api import routes_tramites, routes_dashboard, routes_reportes, routes_public, routes_admin
+
+# Recursos pesados: se abren en paralelo al arrancar y se cierran al apagar
+recursos.registrar("socrata", socrata_client.abrir, socrata_client.cerrar)
+recursos.registrar("reportes", report_service.abrir, report_service.cerrar)
+recursos.registrar("snapshot", dataset_snapshot.abrir, dataset_snapshot.cerrar)
+recursos.registrar(
+    "mantenimiento-reportes", report_service.iniciar_mantenimiento, report_service.detener_mantenimiento
+)
+recursos.registrar("excel", exportador_excel.abrir, exportador_excel.cerrar)
+recursos.registrar("exportaciones", trabajos_exportacion.abrir, trabajos_exportacion.cerrar)
 
 app = FastAPI(
     title="INVIMA Dashboard API",
     description="API para consultar trámites del INVIMA vía Socrata",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=recursos.lifespan
 )
 
 # CORS Middleware
@@ -20,8 +38,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Debug-Trace"],
 )
 
+# Trazas por solicitud: cabecera Server-Timing en todas las respuestas
+app.add_middleware(ServerTimingMiddleware)
+
 # Include routers
 app.include_router(
     routes_tramites.router,
@@ -43,6 +65,11 @@ app.include_router(
     prefix=f"{settings.API_PREFIX}/public",
     tags=["Público"]
 )
+app.include_router(
+    routes_admin.router,
+    prefix=f"{settings.API_PREFIX}/admin",
+    tags=["Administración"]
+)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,33 @@
+"""
+Modelos de Datos para Exportaciones
+"""
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+class SolicitudExportacion(BaseModel):
+    formato: str = Field("csv", pattern="^(csv|json|parquet)$", description="csv, json o parquet")
+    limite: Optional[int] = Field(
+        None, ge=1, le=settings.EXPORTACION_MAX_FILAS, description="Filas como máximo; vacío = todas (hasta EXPORTACION_MAX_FILAS)"
+    )
+    ano: Optional[str] = Field(None, description="Filtrar por año")
+    clase: Optional[str] = Field(None, description="Filtrar por clase de trámite")
+    palabra_clave: Optional[str] = Field(None, description="Filtrar por palabra clave en nombre")
+
+class EstadoExportacion(BaseModel):
+    id: str
+    formato: str
+    filtros: Dict[str, str]
+    limite: Optional[int] = None
+    version: Optional[str] = None
+    estado: str = Field(..., description="en_cola, en_curso, listo o error")
+    filas: int = 0
+    total: Optional[int] = None
+    progreso: float = 0.0
+    bytes: Optional[int] = None
+    error: Optional[str] = None
+    creado: float
+    actualizado: float
+    duracion_ms: Optional[float] = None
+    descarga: Optional[str] = None
@@ -2,7 +2,7 @@
 Modelos de Datos para Reportes
 """
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class ReporteError(BaseModel):
@@ -17,3 +17,21 @@ class ReporteResponse(BaseModel):
     success: bool
     message: str
     reporte_id: Optional[str] = None
+    # Si se parece a un reporte existente: el más parecido y su grupo
+    duplicado_de: Optional[str] = None
+    cluster_id: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    indice: int
+    success: bool
+    reporte_id: Optional[str] = None
+    duplicado_de: Optional[str] = None
+    cluster_id: Optional[str] = None
+    errores: List[Dict[str, str]] = []
+
+class ReporteLoteResponse(BaseModel):
+    success: bool
+    message: str
+    creados: int
+    rechazados: int
+    resultados: List[ResultadoLote]
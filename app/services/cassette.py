@@ -0,0 +1,110 @@
+"""
+Cassettes de respuestas de Socrata
+Graba cada par (parámetros → respuesta) de SocrataClient en un archivo JSON Lines
+comprimido con gzip y lo reproduce sin acceso a red, opcionalmente con la
+latencia original, para perfilar cargas reales
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import gzip
+import json
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo, no hace falta bloquear
+    fcntl = None
+
+MODOS = ("grabar", "reproducir")
+
+
+class RespuestaNoGrabada(LookupError):
+    """La consulta solicitada no existe en el cassette"""
+
+
+class ErrorGrabado(Exception):
+    """Error que Socrata devolvió durante la grabación"""
+
+
+class Cassette:
+    def __init__(self, ruta: str, modo: str, respetar_latencia: bool = False):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de cassette inválido: {modo} (use {' o '.join(MODOS)})")
+        self.ruta = Path(ruta)
+        self.modo = modo
+        self.respetar_latencia = respetar_latencia
+        self._lock = threading.Lock()
+        self._entradas: Optional[Dict[str, List[Dict]]] = None
+        self._uso: Dict[str, int] = {}
+
+    @staticmethod
+    def clave(dataset_id: str, query_params: Dict[str, Any]) -> str:
+        """Clave canónica: el orden de los parámetros no importa"""
+        return json.dumps(
+            {"dataset": dataset_id, "params": {k: str(v) for k, v in query_params.items()}},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+
+    def cargar(self) -> Dict[str, List[Dict]]:
+        if self._entradas is None:
+            entradas: Dict[str, List[Dict]] = {}
+            if self.ruta.exists():
+                # Cada grabación es un miembro gzip independiente; gzip los lee en secuencia
+                with gzip.open(self.ruta, "rt", encoding="utf-8") as f:
+                    for linea in f:
+                        if linea.strip():
+                            entrada = json.loads(linea)
+                            entradas.setdefault(entrada["clave"], []).append(entrada)
+            self._entradas = entradas
+        return self._entradas
+
+    def _grabar(self, entrada: Dict) -> None:
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        linea = json.dumps(entrada, ensure_ascii=False) + "\n"
+        # Cada escritura agrega un miembro gzip completo, O(1) por respuesta. Se
+        # comprime en memoria y se anexa de una vez bajo un bloqueo de archivo:
+        # con varios workers grabando, los miembros no se intercalan
+        miembro = gzip.compress(linea.encode("utf-8"), mtime=0)
+        with open(self.ruta, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(miembro)
+            f.flush()
+
+    def ejecutar(self, dataset_id: str, query_params: Dict[str, Any], funcion: Callable[[], Any]) -> Any:
+        """
+        En modo grabar ejecuta `funcion` y guarda su resultado (o error);
+        en modo reproducir devuelve la respuesta grabada sin llamar a `funcion`
+        """
+        clave = self.clave(dataset_id, query_params)
+        if self.modo == "reproducir":
+            with self._lock:
+                grabaciones = self.cargar().get(clave)
+                if not grabaciones:
+                    raise RespuestaNoGrabada(f"Sin respuesta grabada para {clave}")
+                # Varias grabaciones de la misma consulta se reproducen en orden circular
+                indice = self._uso.get(clave, 0)
+                self._uso[clave] = indice + 1
+                entrada = grabaciones[indice % len(grabaciones)]
+            if self.respetar_latencia and entrada.get("latencia_ms"):
+                time.sleep(entrada["latencia_ms"] / 1000)
+            if "error" in entrada:
+                raise ErrorGrabado(entrada["error"])
+            return entrada["respuesta"]
+
+        inicio = time.perf_counter()
+        entrada: Dict[str, Any] = {"clave": clave, "dataset": dataset_id, "params": query_params}
+        try:
+            respuesta = funcion()
+            entrada["respuesta"] = respuesta
+            return respuesta
+        except Exception as e:
+            entrada["error"] = str(e)
+            raise
+        finally:
+            entrada["latencia_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+            entrada["grabado"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            with self._lock:
+                self._grabar(entrada)
@@ -0,0 +1,253 @@
+"""
+Snapshot del dataset
+Descarga el dataset completo de Socrata a un archivo Arrow IPC versionado por la
+fecha de actualización que publica Socrata (rowsUpdatedAt). Cada proceso lo abre
+como memoria mapeada, de modo que todos los workers leen las mismas páginas del
+caché del sistema operativo en lugar de tener una copia cada uno
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pyarrow as pa
+
+from app.core.config import settings
+from app.services.socrata_client import socrata_client
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo, no hace falta bloquear
+    fcntl = None
+
+logger = logging.getLogger("invima.snapshot")
+
+
+def _texto(valor) -> Optional[str]:
+    # Socrata devuelve texto; los tipos compuestos (ubicaciones, URLs) se guardan como JSON
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+class DatasetSnapshot:
+    def __init__(self):
+        self.directorio = Path(settings.SNAPSHOT_DIR)
+        self.dataset_id = settings.SOCRATA_DATASET_ID
+        self._tabla: Optional[pa.Table] = None
+        self.version: Optional[str] = None
+        self.ruta: Optional[Path] = None
+        self._lock = threading.Lock()
+        # Última versión publicada consultada y cuándo (time.monotonic)
+        self._publicada: Optional[Tuple[str, float]] = None
+        # Descarga en segundo plano de una versión nueva (una a la vez)
+        self._refresco: Optional[threading.Thread] = None
+
+    # Archivos ----------------------------------------------------------------
+
+    def _ruta_version(self, version: str) -> Path:
+        segura = re.sub(r"[^A-Za-z0-9_-]", "_", version)
+        return self.directorio / f"{self.dataset_id}-{segura}.arrow"
+
+    def _archivos(self) -> List[Path]:
+        """Snapshots en disco, del más reciente al más antiguo"""
+        if not self.directorio.exists():
+            return []
+        return sorted(
+            self.directorio.glob(f"{self.dataset_id}-*.arrow"),
+            key=lambda ruta: ruta.stat().st_mtime,
+            reverse=True
+        )
+
+    def _version_de(self, ruta: Path) -> str:
+        return ruta.stem[len(self.dataset_id) + 1:]
+
+    # Descarga ----------------------------------------------------------------
+
+    def _version_remota(self) -> Tuple[str, List[str]]:
+        metadata = socrata_client.obtener_metadata()
+        version = str(metadata.get("rowsUpdatedAt") or metadata.get("viewLastModified") or "0")
+        columnas = [
+            c["fieldName"] for c in metadata.get("columns", [])
+            if c.get("fieldName") and not c["fieldName"].startswith(":")
+        ]
+        return version, columnas
+
+    def _descargar(self, destino: Path, columnas: List[str]) -> int:
+        """Escribe el dataset página a página; la memoria no crece con el tamaño total"""
+        pagina = settings.SNAPSHOT_PAGINA
+        temporal = destino.with_suffix(f".{os.getpid()}.tmp")
+        esquema = None
+        total = 0
+        try:
+            with pa.OSFile(str(temporal), "wb") as archivo:
+                escritor = None
+                offset = 0
+                while True:
+                    filas = socrata_client.obtener_pagina(pagina, offset)
+                    if esquema is None:
+                        # Sin columnas en los metadatos, usar las de la primera página
+                        nombres = columnas or sorted({c for fila in filas for c in fila})
+                        esquema = pa.schema([(c, pa.string()) for c in nombres])
+                        escritor = pa.ipc.new_file(archivo, esquema)
+                    if filas:
+                        escritor.write_batch(pa.RecordBatch.from_arrays(
+                            [pa.array([_texto(f.get(c)) for f in filas], pa.string()) for c in esquema.names],
+                            schema=esquema
+                        ))
+                        total += len(filas)
+                    if len(filas) < pagina:
+                        break
+                    offset += pagina
+                escritor.close()
+            # Publicación atómica: los lectores nunca ven un archivo a medias
+            os.replace(temporal, destino)
+        finally:
+            if temporal.exists():
+                temporal.unlink()
+        return total
+
+    def asegurar(self) -> Path:
+        """
+        Garantiza que exista en disco el snapshot de la versión publicada y lo
+        devuelve. Con varios procesos solo uno descarga; el resto espera el
+        bloqueo y encuentra el archivo listo. Sin acceso a Socrata usa el último
+        snapshot disponible
+        """
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        with open(self.directorio / ".lock", "w") as bloqueo:
+            if fcntl is not None:
+                fcntl.flock(bloqueo, fcntl.LOCK_EX)
+            try:
+                version, columnas = self._version_remota()
+            except Exception as e:
+                existentes = self._archivos()
+                if not existentes:
+                    raise
+                logger.warning("Socrata no disponible (%s); se usa el snapshot %s", e, existentes[0].name)
+                return existentes[0]
+
+            destino = self._ruta_version(version)
+            if not destino.exists():
+                inicio = time.perf_counter()
+                total = self._descargar(destino, columnas)
+                logger.info(
+                    "Snapshot %s: %s filas en %.0f ms", destino.name, total, (time.perf_counter() - inicio) * 1000
+                )
+            # Conservar la versión anterior: otro proceso puede tenerla mapeada aún
+            for antigua in [r for r in self._archivos() if r != destino][1:]:
+                antigua.unlink(missing_ok=True)
+            return destino
+
+    # Ciclo de vida -----------------------------------------------------------
+
+    def cargar(self, ruta: Path) -> None:
+        """Mapea el archivo en memoria: la tabla no copia los datos al heap del proceso"""
+        fuente = pa.memory_map(str(ruta), "r")
+        tabla = pa.ipc.open_file(fuente).read_all()
+        with self._lock:
+            self._tabla = tabla
+            self.ruta = ruta
+            self.version = self._version_de(ruta)
+
+    def abrir(self) -> None:
+        """Asegura y mapea el snapshot (lo llama el lifespan en cada worker)"""
+        if not settings.SNAPSHOT_HABILITADO:
+            return
+        try:
+            self.cargar(self.asegurar())
+        except Exception as e:
+            # Sin snapshot los endpoints consultan Socrata directamente
+            logger.warning("No se pudo abrir el snapshot del dataset: %s", e)
+
+    def _refrescar(self) -> None:
+        try:
+            self.cargar(self.asegurar())
+        except Exception as e:
+            logger.warning("No se pudo actualizar el snapshot del dataset: %s", e)
+
+    def refrescar(self) -> None:
+        """
+        Descarga y mapea la versión publicada en un hilo. Mientras tanto sigue
+        abierta la tabla anterior; cargar() la reemplaza de una vez al terminar.
+        Entre procesos, el bloqueo de asegurar() hace que solo uno descargue
+        """
+        with self._lock:
+            if self._refresco is not None and self._refresco.is_alive():
+                return
+            self._refresco = threading.Thread(target=self._refrescar, name="snapshot-refresco", daemon=True)
+            self._refresco.start()
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._tabla = None
+            self.ruta = None
+            self.version = None
+
+    # Lectura -----------------------------------------------------------------
+
+    @property
+    def tabla(self) -> Optional[pa.Table]:
+        return self._tabla
+
+    @property
+    def disponible(self) -> bool:
+        return self._tabla is not None
+
+    def filas(self, limit: int, offset: int = 0) -> List[Dict]:
+        """Filas como las devuelve Socrata: sin los campos nulos"""
+        tabla = self._tabla
+        if tabla is None:
+            return []
+        return [
+            {k: v for k, v in fila.items() if v is not None}
+            for fila in tabla.slice(offset, limit).to_pylist()
+        ]
+
+    def version_publicada(self) -> Optional[str]:
+        """
+        Versión que publica Socrata (rowsUpdatedAt), consultada como mucho una
+        vez cada DATASET_VERSION_SEGUNDOS. Sin acceso a Socrata devuelve la
+        última conocida o la del snapshot abierto. Si difiere de la del snapshot
+        abierto, lo refresca en segundo plano
+        """
+        publicada = self._publicada
+        if publicada and time.monotonic() - publicada[1] < settings.DATASET_VERSION_SEGUNDOS:
+            return publicada[0]
+        try:
+            version, _ = self._version_remota()
+        except Exception as e:
+            logger.warning("No se pudo consultar la versión publicada del dataset: %s", e)
+            return publicada[0] if publicada else self.version
+        self._publicada = (version, time.monotonic())
+        if settings.SNAPSHOT_HABILITADO and version != self.version:
+            self.refrescar()
+        return version
+
+    def rebanada(self, limit: int, offset: int = 0) -> Optional[pa.Table]:
+        """Filas como tabla Arrow: una vista sobre el archivo mapeado, sin copiar"""
+        tabla = self._tabla
+        if tabla is None:
+            return None
+        return tabla.slice(offset, limit)
+
+    def estado(self) -> Dict:
+        tabla = self._tabla
+        return {
+            "disponible": tabla is not None,
+            "version": self.version,
+            "archivo": self.ruta.name if self.ruta else None,
+            "filas": tabla.num_rows if tabla is not None else 0,
+            "columnas": tabla.num_columns if tabla is not None else 0,
+            "bytes": tabla.nbytes if tabla is not None else 0,
+        }
+
+
+# Instancia singleton
+dataset_snapshot = DatasetSnapshot()
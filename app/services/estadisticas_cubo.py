@@ -0,0 +1,173 @@
+"""
+Cubo de estadísticas SUIT
+Conteos de los trámites del INVIMA agrupados por año, clase y nombre, con las
+dimensiones codificadas como diccionario: cada fila del cubo guarda índices a
+las listas de valores, una máscara de bits con las categorías del trámite y la
+cantidad. Se construye una vez por versión del dataset; el frontend lo descarga
+una sola vez y calcula por su cuenta los agregados de /estadisticas-suit para
+cualquier combinación de filtros
+"""
+from typing import Dict, List, Optional
+import asyncio
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.core.tracing import medir
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.socrata_client import socrata_client
+
+logger = logging.getLogger("invima.cubo")
+
+# dimensión del cubo: campo de Socrata
+DIMENSIONES = {
+    "ano": "a_o",
+    "clase": "clase",
+    "nombre": "nombre_del_tr_mite_u_otro",
+    "nombre_comun": "nombre_com_n",
+}
+
+# Filas por página al agrupar en Socrata
+_PAGINA = 50000
+
+
+def _texto(valor) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+
+class CuboEstadisticas:
+    def __init__(self):
+        self._cubo: Optional[Dict] = None
+        self._lock = asyncio.Lock()
+
+    # Fuentes -----------------------------------------------------------------
+
+    def _filas_snapshot(self) -> Optional[pa.Table]:
+        """Agrupa el snapshot en memoria (sin red); None si le faltan columnas"""
+        tabla = dataset_snapshot.tabla
+        campos = list(DIMENSIONES.values())
+        if tabla is None or any(c not in tabla.column_names for c in campos + ["nombre_de_la_entidad"]):
+            return None
+        invima = tabla.filter(pc.equal(tabla["nombre_de_la_entidad"], socrata_client.INVIMA_ENTITY_NAME))
+        agrupada = invima.select(campos).group_by(campos).aggregate(
+            [(campos[0], "count", pc.CountOptions(mode="all"))]
+        )
+        return agrupada.rename_columns(list(DIMENSIONES) + ["cantidad"])
+
+    async def _filas_socrata(self) -> pa.Table:
+        """Agrupa en Socrata, por páginas; el resultado tiene una fila por combinación"""
+        filas: List[Dict] = []
+        offset = 0
+        while True:
+            pagina = await socrata_client.query(
+                select=", ".join(f"{campo} as {nombre}" for nombre, campo in DIMENSIONES.items())
+                + ", count(*) as cantidad",
+                where=f"nombre_de_la_entidad = '{socrata_client.INVIMA_ENTITY_NAME}'",
+                group=", ".join(DIMENSIONES),
+                limit=_PAGINA,
+                offset=offset,
+            )
+            filas.extend(pagina)
+            if len(pagina) < _PAGINA:
+                break
+            offset += _PAGINA
+        columnas = {d: pa.array([_texto(f.get(d)) for f in filas], pa.string()) for d in DIMENSIONES}
+        columnas["cantidad"] = pa.array([int(f.get("cantidad", 0)) for f in filas], pa.int64())
+        return pa.table(columnas)
+
+    # Construcción ------------------------------------------------------------
+
+    @staticmethod
+    def _categorias(valores: List[Optional[str]]) -> np.ndarray:
+        """Máscara de categorías por valor del diccionario, con la regla de /estadisticas-suit (LIKE sin mayúsculas)"""
+        mascaras = np.zeros(len(valores), dtype=np.int64)
+        for bit, palabras in enumerate(socrata_client.CATEGORY_KEYWORDS.values()):
+            claves = [p.upper() for p in palabras]
+            presente = np.fromiter(
+                (v is not None and any(c in v.upper() for c in claves) for v in valores),
+                dtype=bool, count=len(valores)
+            )
+            mascaras[presente] |= 1 << bit
+        return mascaras
+
+    @staticmethod
+    def _compactar(arreglo: pa.Array) -> pa.Array:
+        if pa.types.is_dictionary(arreglo.type):
+            tamano = len(arreglo.dictionary)
+            indices = pa.int8() if tamano <= 127 else pa.int16() if tamano <= 32767 else pa.int32()
+            return arreglo.cast(pa.dictionary(indices, arreglo.type.value_type))
+        maximo = pc.max(arreglo).as_py() or 0
+        return arreglo.cast(pa.int32() if maximo < 2 ** 31 else pa.int64())
+
+    def _construir(self, tabla: pa.Table, version: Optional[str], fuente: str) -> Dict:
+        """
+        El cubo en sus dos formas: tabla Arrow con columnas de diccionario (para
+        Accept: application/vnd.apache.arrow.stream) y su equivalente JSON
+        """
+        columnas = {
+            nombre: pc.dictionary_encode(tabla[nombre].combine_chunks(), null_encoding="encode")
+            for nombre in DIMENSIONES
+        }
+        dimensiones = {nombre: columna.dictionary.to_pylist() for nombre, columna in columnas.items()}
+        codigos = {nombre: columna.indices.to_numpy(zero_copy_only=False) for nombre, columna in columnas.items()}
+        categoria = (
+            self._categorias(dimensiones["nombre"])[codigos["nombre"]]
+            | self._categorias(dimensiones["nombre_comun"])[codigos["nombre_comun"]]
+        )
+        metadatos = {
+            "version": version,
+            "fuente": fuente,
+            "filas": tabla.num_rows,
+            # Bit i de `categoria` = categorias[i]
+            "categorias": list(socrata_client.CATEGORY_LABELS.values()),
+        }
+        return {
+            "metadatos": metadatos,
+            # Índices y conteos con el entero más angosto que los contiene
+            "tabla": pa.table({
+                **{nombre: self._compactar(columna) for nombre, columna in columnas.items()},
+                "categoria": pa.array(categoria, pa.uint8()),
+                "cantidad": self._compactar(tabla["cantidad"].combine_chunks()),
+            }),
+            "json": {
+                **metadatos,
+                "dimensiones": dimensiones,
+                "codigos": {nombre: valores.tolist() for nombre, valores in codigos.items()},
+                "categoria": categoria.tolist(),
+                "cantidad": tabla["cantidad"].to_pylist(),
+            },
+        }
+
+    async def obtener(self) -> Dict:
+        """Cubo de la versión publicada del dataset; se reconstruye solo cuando cambia"""
+        version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+        cubo = self._cubo
+        if cubo is not None and cubo["metadatos"]["version"] == version:
+            return cubo
+        async with self._lock:
+            cubo = self._cubo
+            if cubo is not None and cubo["metadatos"]["version"] == version:
+                return cubo
+            tabla = None
+            # Construcción completa, con la fuente en el detalle (las consultas a
+            # Socrata, además, se registran como tales)
+            detalle = {"cubo": version}
+            with medir("calculo", detalle):
+                # El snapshot solo sirve si es de la versión publicada
+                if dataset_snapshot.disponible and dataset_snapshot.version == version:
+                    tabla = await asyncio.to_thread(self._filas_snapshot)
+                fuente = "snapshot"
+                if tabla is None:
+                    tabla = await self._filas_socrata()
+                    fuente = "socrata"
+                detalle["fuente"] = fuente
+                cubo = self._construir(tabla, version, fuente)
+            logger.info("Cubo de estadísticas %s: %s filas (%s)", version, tabla.num_rows, fuente)
+            self._cubo = cubo
+            return cubo
+
+
+# Instancia singleton
+cubo_estadisticas = CuboEstadisticas()
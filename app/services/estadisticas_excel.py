@@ -0,0 +1,191 @@
+"""
+Exportación a Excel de las estadísticas SUIT
+El libro tiene las mismas hojas que exportaba la página de Estadísticas (resumen,
+por año, por categoría, por clase y top de trámites) y además el detalle de
+todas las filas que cumplen los filtros. Lo escribe xlsxwriter en modo
+constant_memory (cada fila se vuelca a disco al pasar a la siguiente) dentro de
+un pool de procesos, así un libro grande no bloquea el event loop ni compite por
+el GIL con las solicitudes. El detalle llega al proceso como un archivo Arrow
+temporal que se lee mapeado, por lotes
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+import multiprocessing
+import shutil
+import tempfile
+
+import pyarrow as pa
+import xlsxwriter
+
+from app.core.config import settings
+from app.services.filas_filtradas import filas_filtradas
+from app.services.socrata_client import socrata_client
+
+logger = logging.getLogger("invima.excel")
+
+# Filas de datos por hoja que admite Excel (la primera es el encabezado)
+MAX_FILAS_EXCEL = 1048575
+# Bytes por bloque al enviar el archivo
+BLOQUE_BYTES = 256 * 1024
+
+# hoja: (nombre de la hoja, columnas, filas)
+Hoja = Tuple[str, List[str], List[List]]
+
+
+def escribir_libro(hojas: List[Hoja], detalle: str, destino: str) -> int:
+    """
+    Escribe el libro en `destino` y devuelve las filas de detalle escritas. Corre
+    en el pool de procesos: recibe rutas y listas pequeñas, no la tabla
+    """
+    libro = xlsxwriter.Workbook(destino, {
+        "constant_memory": True,
+        "tmpdir": str(Path(destino).parent),
+        # Los textos del dataset se escriben tal cual, nunca como fórmulas o enlaces
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    negrita = libro.add_format({"bold": True})
+    try:
+        for nombre, columnas, filas in hojas:
+            hoja = libro.add_worksheet(nombre)
+            hoja.write_row(0, 0, columnas, negrita)
+            for i, fila in enumerate(filas, 1):
+                hoja.write_row(i, 0, fila)
+
+        hoja = libro.add_worksheet("Detalle")
+        escritas = 0
+        with pa.memory_map(detalle, "r") as fuente:
+            lector = pa.ipc.open_file(fuente)
+            hoja.write_row(0, 0, lector.schema.names, negrita)
+            for indice in range(lector.num_record_batches):
+                lote = lector.get_batch(indice)
+                restantes = MAX_FILAS_EXCEL - escritas
+                if restantes <= 0:
+                    break
+                lote = lote.slice(0, restantes)
+                for fila in zip(*(columna.to_pylist() for columna in lote.columns)):
+                    escritas += 1
+                    hoja.write_row(escritas, 0, fila)
+    finally:
+        libro.close()
+    return escritas
+
+
+def _entero(valor) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def hojas_resumen(stats: Dict, filas_detalle: int) -> List[Hoja]:
+    """Hojas de la respuesta de /estadisticas-suit, en el orden de la página de Estadísticas"""
+    hojas: List[Hoja] = [(
+        "Resumen",
+        ["Total Registros", "Años", "Clases", "Categorías", "Filas en Detalle"],
+        [[
+            stats.get("total_registros", 0),
+            len(stats.get("por_ano", [])),
+            len(stats.get("por_clase", [])),
+            len(stats.get("distribucion_categorias", [])),
+            min(filas_detalle, MAX_FILAS_EXCEL),
+        ]],
+    )]
+    for nombre, clave in (
+        ("Por Año", "por_ano"),
+        ("Por Categoría", "distribucion_categorias"),
+        ("Por Clase", "por_clase"),
+        ("Top Trámites", "top_tramites"),
+    ):
+        registros = stats.get(clave) or []
+        if not registros:
+            continue
+        # Como un DataFrame de los registros: columnas en orden de aparición
+        columnas = list(dict.fromkeys(k for registro in registros for k in registro))
+        filas = [
+            [_entero(r.get(c)) if c == "cantidad" else r.get(c) for c in columnas]
+            for r in registros
+        ]
+        hojas.append((nombre, columnas, filas))
+    return hojas
+
+
+def enviar_y_borrar(ruta: Path) -> Iterator[bytes]:
+    """Envía el archivo por bloques y borra su directorio temporal al terminar (o si el cliente corta)"""
+    try:
+        with open(ruta, "rb") as archivo:
+            while True:
+                bloque = archivo.read(BLOQUE_BYTES)
+                if not bloque:
+                    break
+                yield bloque
+    finally:
+        shutil.rmtree(ruta.parent, ignore_errors=True)
+
+
+class ExportadorExcel:
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    # Ciclo de vida -----------------------------------------------------------
+
+    def abrir(self) -> None:
+        """Crea el pool; los procesos arrancan con la primera exportación"""
+        # spawn: no hereda los hilos ni los sockets abiertos del worker web
+        self._pool = ProcessPoolExecutor(
+            max_workers=settings.EXCEL_PROCESOS, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def cerrar(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # Exportación -------------------------------------------------------------
+
+    async def exportar(
+        self,
+        ano: Optional[str] = None,
+        clase: Optional[str] = None,
+        palabra_clave: Optional[str] = None
+    ) -> Path:
+        """
+        Genera el libro y devuelve su ruta, dentro de un directorio temporal
+        propio que borra enviar_y_borrar
+        """
+        stats, detalle = await asyncio.gather(
+            socrata_client.obtener_estadisticas_suit(ano=ano, clase=clase, palabra_clave=palabra_clave),
+            filas_filtradas(ano, clase, palabra_clave, limite=MAX_FILAS_EXCEL),
+        )
+        directorio = Path(tempfile.mkdtemp(prefix="excel_", dir=settings.EXCEL_TMP_DIR or None))
+        try:
+            entrada = directorio / "detalle.arrow"
+            destino = directorio / "estadisticas.xlsx"
+            await asyncio.to_thread(self._guardar_detalle, detalle, entrada)
+            hojas = hojas_resumen(stats, detalle.num_rows)
+            if self._pool is not None:
+                escritas = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, escribir_libro, hojas, str(entrada), str(destino)
+                )
+            else:
+                # Sin lifespan (scripts, pruebas): en un hilo
+                escritas = await asyncio.to_thread(escribir_libro, hojas, str(entrada), str(destino))
+            entrada.unlink()
+        except BaseException:
+            shutil.rmtree(directorio, ignore_errors=True)
+            raise
+        logger.info("Excel de estadísticas: %s filas de detalle, %s bytes", escritas, destino.stat().st_size)
+        return destino
+
+    @staticmethod
+    def _guardar_detalle(tabla: pa.Table, ruta: Path) -> None:
+        with pa.OSFile(str(ruta), "wb") as archivo:
+            with pa.ipc.new_file(archivo, tabla.schema) as escritor:
+                escritor.write_table(tabla, max_chunksize=10000)
+
+
+# Instancia singleton
+exportador_excel = ExportadorExcel()
@@ -0,0 +1,289 @@
+"""
+Trabajos de exportación de datos abiertos
+Una descarga grande ya no se arma dentro de una solicitud: se envía un trabajo
+(formato, filtros y límite) y se recibe su id, se consulta su avance y, cuando
+termina, el archivo se descarga del disco. Los trabajos los ejecuta un número
+fijo de trabajadores; los que no caben esperan en una cola acotada.
+
+El id es la huella del trabajo (formato, filtros, límite y versión del dataset):
+dos solicitudes iguales reciben el mismo id y comparten la ejecución o el
+archivo ya generado. El estado de cada trabajo se guarda como JSON junto al
+archivo ({id}.estado.json), así cualquier worker del servidor puede responder por él
+"""
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.filas_filtradas import filas_filtradas
+
+logger = logging.getLogger("invima.exportaciones")
+
+# formato: (tipo de contenido, extensión)
+FORMATOS: Dict[str, tuple] = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+FILTROS = ("ano", "clase", "palabra_clave")
+
+EN_COLA, EN_CURSO, LISTO, ERROR = "en_cola", "en_curso", "listo", "error"
+# Filas por lote al escribir el archivo (y entre actualizaciones de avance)
+FILAS_POR_LOTE = 10000
+# Un trabajo en curso cuyo estado no cambia en este tiempo se da por abandonado
+# (el worker que lo ejecutaba se reinició) y se puede volver a enviar
+SEGUNDOS_ABANDONO = 900
+
+
+class ColaExportacionLlena(Exception):
+    """Hay demasiados trabajos en espera"""
+
+
+# Escritores -----------------------------------------------------------------
+#
+# Reciben la tabla y una función de avance que se llama con las filas escritas
+
+def _escribir_csv(tabla: pa.Table, archivo, avance: Callable[[int], None]) -> None:
+    with pacsv.CSVWriter(archivo, tabla.schema) as escritor:
+        escritas = 0
+        for lote in tabla.to_batches(FILAS_POR_LOTE):
+            escritor.write_batch(lote)
+            escritas += lote.num_rows
+            avance(escritas)
+
+
+def _escribir_json(tabla: pa.Table, archivo, avance: Callable[[int], None]) -> None:
+    # Misma forma que /datos-abiertos: {"total": n, "datos": [...]}, sin los campos nulos
+    archivo.write(f'{{"total": {tabla.num_rows}, "datos": ['.encode("utf-8"))
+    escritas = 0
+    for lote in tabla.to_batches(FILAS_POR_LOTE):
+        filas = (
+            json.dumps({k: v for k, v in fila.items() if v is not None}, ensure_ascii=False)
+            for fila in lote.to_pylist()
+        )
+        archivo.write(((",\n" if escritas else "\n") + ",\n".join(filas)).encode("utf-8"))
+        escritas += lote.num_rows
+        avance(escritas)
+    archivo.write(b"\n]}\n")
+
+
+def _escribir_parquet(tabla: pa.Table, archivo, avance: Callable[[int], None]) -> None:
+    with pq.ParquetWriter(archivo, tabla.schema, compression="zstd") as escritor:
+        escritas = 0
+        for lote in tabla.to_batches(FILAS_POR_LOTE):
+            escritor.write_batch(lote)
+            escritas += lote.num_rows
+            avance(escritas)
+
+
+ESCRITORES: Dict[str, Callable] = {
+    "csv": _escribir_csv,
+    "json": _escribir_json,
+    "parquet": _escribir_parquet,
+}
+
+
+class TrabajosExportacion:
+    def __init__(self):
+        self.directorio = Path(settings.EXPORTACION_DIR)
+        self._cola: Optional[asyncio.Queue] = None
+        self._trabajadores = []
+
+    # Ciclo de vida -----------------------------------------------------------
+
+    async def abrir(self) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._cola = asyncio.Queue(maxsize=settings.EXPORTACION_COLA)
+        self._trabajadores = [
+            asyncio.create_task(self._trabajador()) for _ in range(settings.EXPORTACION_TRABAJADORES)
+        ]
+        await asyncio.to_thread(self.purgar)
+
+    async def cerrar(self) -> None:
+        for tarea in self._trabajadores:
+            tarea.cancel()
+        await asyncio.gather(*self._trabajadores, return_exceptions=True)
+        self._trabajadores = []
+        self._cola = None
+
+    # Estado ------------------------------------------------------------------
+
+    def _ruta_estado(self, trabajo_id: str) -> Path:
+        # Sufijo propio: el archivo de una exportación JSON también termina en .json
+        return self.directorio / f"{trabajo_id}.estado.json"
+
+    def ruta_archivo(self, estado: Dict) -> Path:
+        return self.directorio / f"{estado['id']}.{FORMATOS[estado['formato']][1]}"
+
+    def estado(self, trabajo_id: str) -> Optional[Dict]:
+        if not trabajo_id.isalnum():
+            return None
+        try:
+            return json.loads(self._ruta_estado(trabajo_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _guardar(self, estado: Dict) -> Dict:
+        estado["actualizado"] = time.time()
+        ruta = self._ruta_estado(estado["id"])
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        temporal.write_text(json.dumps(estado, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporal, ruta)
+        return estado
+
+    def _reclamar(self, estado: Dict) -> bool:
+        """Crea el estado solo si no existe: entre procesos, uno solo ejecuta cada trabajo"""
+        try:
+            descriptor = os.open(self._ruta_estado(estado["id"]), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        estado["actualizado"] = time.time()
+        with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+            json.dump(estado, archivo, ensure_ascii=False)
+        return True
+
+    def _vigente(self, estado: Dict) -> bool:
+        """Si el trabajo sirve para una solicitud igual: en marcha o con su archivo en disco"""
+        if estado["estado"] in (EN_COLA, EN_CURSO):
+            return time.time() - estado["actualizado"] < SEGUNDOS_ABANDONO
+        if estado["estado"] == LISTO:
+            return self.ruta_archivo(estado).exists()
+        return False
+
+    def purgar(self) -> int:
+        """Borra los trabajos terminados hace más de EXPORTACION_HORAS y sus archivos"""
+        limite = time.time() - settings.EXPORTACION_HORAS * 3600
+        borrados = 0
+        for ruta in self.directorio.glob("*.estado.json"):
+            estado = self.estado(ruta.name.split(".")[0])
+            if estado is None or estado["estado"] in (EN_COLA, EN_CURSO) or estado["actualizado"] > limite:
+                continue
+            if estado["estado"] == LISTO:
+                self.ruta_archivo(estado).unlink(missing_ok=True)
+            ruta.unlink(missing_ok=True)
+            borrados += 1
+        return borrados
+
+    # Envío -------------------------------------------------------------------
+
+    @staticmethod
+    def huella(formato: str, filtros: Dict, limite: Optional[int], version: Optional[str]) -> str:
+        clave = json.dumps(
+            {"formato": formato, "filtros": filtros, "limite": limite, "version": version}, sort_keys=True
+        )
+        return hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20]
+
+    async def enviar(self, formato: str, filtros: Dict, limite: Optional[int] = None) -> Dict:
+        """
+        Encola el trabajo y devuelve su estado. Si ya hay uno igual en marcha o
+        terminado (para la misma versión del dataset), devuelve ese
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato no soportado: {formato} (use {', '.join(FORMATOS)})")
+        if self._cola is None:
+            raise RuntimeError("El servicio de exportaciones no está abierto")
+        filtros = {k: filtros[k] for k in FILTROS if filtros.get(k)}
+        # Sin límite (o por encima del máximo) se exportan EXPORTACION_MAX_FILAS
+        limite = min(limite or settings.EXPORTACION_MAX_FILAS, settings.EXPORTACION_MAX_FILAS)
+        await asyncio.to_thread(self.purgar)
+        version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+        trabajo_id = self.huella(formato, filtros, limite, version)
+
+        existente = self.estado(trabajo_id)
+        if existente is not None:
+            if self._vigente(existente):
+                return existente
+            # Fallido, abandonado o sin archivo: se vuelve a ejecutar
+            self._ruta_estado(trabajo_id).unlink(missing_ok=True)
+
+        if self._cola.full():
+            raise ColaExportacionLlena(f"Hay {self._cola.qsize()} exportaciones en espera; intente más tarde")
+        estado = {
+            "id": trabajo_id,
+            "formato": formato,
+            "filtros": filtros,
+            "limite": limite,
+            "version": version,
+            "estado": EN_COLA,
+            "filas": 0,
+            "total": None,
+            "progreso": 0.0,
+            "bytes": None,
+            "error": None,
+            "creado": time.time(),
+        }
+        if not self._reclamar(estado):
+            # Otra solicitud igual lo reclamó entre la lectura y la creación
+            return self.estado(trabajo_id) or estado
+        self._cola.put_nowait(trabajo_id)
+        return estado
+
+    # Ejecución ---------------------------------------------------------------
+
+    async def _trabajador(self) -> None:
+        while True:
+            trabajo_id = await self._cola.get()
+            try:
+                await self._ejecutar(trabajo_id)
+            except Exception:
+                logger.exception("Error inesperado en la exportación %s", trabajo_id)
+            finally:
+                self._cola.task_done()
+
+    async def _ejecutar(self, trabajo_id: str) -> None:
+        estado = self.estado(trabajo_id)
+        if estado is None or estado["estado"] != EN_COLA:
+            return
+        inicio = time.perf_counter()
+        try:
+            self._guardar({**estado, "estado": EN_CURSO})
+            estado["estado"] = EN_CURSO
+            tabla = await filas_filtradas(**estado["filtros"], solo_invima=False, limite=estado["limite"])
+            estado["total"] = tabla.num_rows
+            self._guardar(estado)
+            await asyncio.to_thread(self._escribir, estado, tabla)
+            estado.update(
+                estado=LISTO, filas=tabla.num_rows, progreso=1.0,
+                bytes=self.ruta_archivo(estado).stat().st_size,
+                duracion_ms=round((time.perf_counter() - inicio) * 1000, 1),
+            )
+        except Exception as e:
+            logger.warning("Falló la exportación %s: %s", trabajo_id, e)
+            estado.update(estado=ERROR, error=str(e))
+        self._guardar(estado)
+
+    def _escribir(self, estado: Dict, tabla: pa.Table) -> None:
+        """Escribe el archivo (en un hilo) y publica el avance como mucho dos veces por segundo"""
+        destino = self.ruta_archivo(estado)
+        temporal = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+        ultimo = 0.0
+
+        def avance(filas: int) -> None:
+            nonlocal ultimo
+            ahora = time.monotonic()
+            if ahora - ultimo >= 0.5:
+                ultimo = ahora
+                estado.update(filas=filas, progreso=round(filas / max(tabla.num_rows, 1), 3))
+                self._guardar(estado)
+
+        try:
+            with open(temporal, "wb") as archivo:
+                ESCRITORES[estado["formato"]](tabla, archivo, avance)
+            # Publicación atómica: nadie descarga un archivo a medias
+            os.replace(temporal, destino)
+        finally:
+            temporal.unlink(missing_ok=True)
+
+
+# Instancia singleton
+trabajos_exportacion = TrabajosExportacion()
@@ -0,0 +1,169 @@
+"""
+Exportaciones completas del dataset
+Las descargas más pedidas son el dataset completo en cada formato. Se generan una
+sola vez por versión publicada del dataset, con copias precomprimidas (gzip y,
+si está instalado, brotli) junto al original, y se sirven desde el disco. Una
+versión nueva genera sus archivos con la primera descarga y borra los de las
+versiones anteriores (salvo la inmediatamente anterior, que puede estar
+descargándose). Entre workers, un bloqueo de archivo hace que solo uno escriba
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import asyncio
+import gzip
+import logging
+import os
+import re
+import shutil
+import time
+
+import pyarrow as pa
+
+from app.core.config import settings
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.exportaciones import ESCRITORES, FORMATOS
+from app.services.filas_filtradas import filas_filtradas
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo, no hace falta bloquear
+    fcntl = None
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se guarda la copia gzip
+    brotli = None
+
+logger = logging.getLogger("invima.exportaciones")
+
+NOMBRE = "invima_datos"
+# Bytes por bloque al comprimir
+BLOQUE_BYTES = 1024 * 1024
+# Se comprime una vez por versión: se puede pagar el nivel alto
+NIVEL_GZIP = 9
+CALIDAD_BROTLI = 9
+# Parquet ya va comprimido por columnas (zstd): no se precomprime
+PRECOMPRIMIDOS = ("csv", "json")
+
+
+def _comprimir_gzip(origen: Path, destino: Path) -> None:
+    with open(origen, "rb") as entrada, open(destino, "wb") as salida:
+        # mtime=0: el mismo archivo produce siempre los mismos bytes
+        with gzip.GzipFile(fileobj=salida, mode="wb", compresslevel=NIVEL_GZIP, mtime=0) as comprimido:
+            shutil.copyfileobj(entrada, comprimido, BLOQUE_BYTES)
+
+
+def _comprimir_brotli(origen: Path, destino: Path) -> None:
+    compresor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=CALIDAD_BROTLI)
+    with open(origen, "rb") as entrada, open(destino, "wb") as salida:
+        while True:
+            bloque = entrada.read(BLOQUE_BYTES)
+            if not bloque:
+                break
+            salida.write(compresor.process(bloque))
+        salida.write(compresor.finish())
+
+
+# codificación (Content-Encoding): (sufijo del archivo, compresor)
+CODIFICACIONES = {"gzip": (".gz", _comprimir_gzip)}
+if brotli is not None:
+    CODIFICACIONES["br"] = (".br", _comprimir_brotli)
+
+
+class ExportacionesCompletas:
+    def __init__(self):
+        self.directorio = Path(settings.EXPORTACION_DIR) / "completas"
+        # Una generación por (versión, formato) a la vez dentro del proceso
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    # Archivos ----------------------------------------------------------------
+
+    def _directorio_version(self, version: str) -> Path:
+        return self.directorio / re.sub(r"[^A-Za-z0-9_-]", "_", version)
+
+    def ruta(self, version: str, formato: str) -> Path:
+        return self._directorio_version(version) / f"{NOMBRE}.{FORMATOS[formato][1]}"
+
+    def variantes(self, version: str, formato: str) -> Dict[str, Path]:
+        """Archivos de un formato por codificación ("identity" es el original)"""
+        ruta = self.ruta(version, formato)
+        variantes = {"identity": ruta}
+        if formato in PRECOMPRIMIDOS:
+            for codificacion, (sufijo, _) in CODIFICACIONES.items():
+                comprimido = ruta.with_name(ruta.name + sufijo)
+                if comprimido.exists():
+                    variantes[codificacion] = comprimido
+        return variantes
+
+    # Generación --------------------------------------------------------------
+
+    def _generar(self, version: str, formato: str, tabla: pa.Table) -> None:
+        """
+        Escribe el original y sus copias comprimidas (en un hilo). El original se
+        publica al final: si existe, las copias comprimidas ya están en disco
+        """
+        directorio = self._directorio_version(version)
+        directorio.mkdir(parents=True, exist_ok=True)
+        with open(directorio / f".{formato}.lock", "w") as bloqueo:
+            if fcntl is not None:
+                fcntl.flock(bloqueo, fcntl.LOCK_EX)
+            destino = self.ruta(version, formato)
+            if destino.exists():
+                # Otro worker lo generó mientras se esperaba el bloqueo
+                return
+            inicio = time.perf_counter()
+            temporal = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+            temporales = [temporal]
+            try:
+                with open(temporal, "wb") as archivo:
+                    ESCRITORES[formato](tabla, archivo, lambda filas: None)
+                if formato in PRECOMPRIMIDOS:
+                    for sufijo, comprimir in CODIFICACIONES.values():
+                        comprimido = destino.with_name(destino.name + sufijo)
+                        temporal_comprimido = comprimido.with_name(f"{comprimido.name}.{os.getpid()}.tmp")
+                        temporales.append(temporal_comprimido)
+                        comprimir(temporal, temporal_comprimido)
+                        os.replace(temporal_comprimido, comprimido)
+                os.replace(temporal, destino)
+            finally:
+                for ruta in temporales:
+                    ruta.unlink(missing_ok=True)
+            logger.info(
+                "Exportación completa %s (versión %s): %s filas, %s bytes en %.0f ms",
+                destino.name, version, tabla.num_rows, destino.stat().st_size,
+                (time.perf_counter() - inicio) * 1000
+            )
+        self._purgar(directorio)
+
+    def _purgar(self, actual: Path) -> None:
+        """Borra las versiones anteriores, salvo la más reciente: puede estar descargándose"""
+        anteriores = sorted(
+            (d for d in self.directorio.iterdir() if d.is_dir() and d != actual),
+            key=lambda d: d.stat().st_mtime,
+            reverse=True
+        )
+        for antigua in anteriores[1:]:
+            shutil.rmtree(antigua, ignore_errors=True)
+
+    async def asegurar(self, formato: str) -> Tuple[str, Dict[str, Path]]:
+        """
+        Versión publicada y archivos del formato para esa versión, generándolos
+        si es la primera descarga de la versión
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato no soportado: {formato} (use {', '.join(FORMATOS)})")
+        version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+        if version is None:
+            raise RuntimeError("No se conoce la versión publicada del dataset")
+        if not self.ruta(version, formato).exists():
+            lock = self._locks.setdefault((version, formato), asyncio.Lock())
+            async with lock:
+                if not self.ruta(version, formato).exists():
+                    tabla = await filas_filtradas(solo_invima=False)
+                    await asyncio.to_thread(self._generar, version, formato, tabla)
+            self._locks.pop((version, formato), None)
+        return version, await asyncio.to_thread(self.variantes, version, formato)
+
+
+# Instancia singleton
+exportaciones_completas = ExportacionesCompletas()
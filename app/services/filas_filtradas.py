@@ -0,0 +1,94 @@
+"""
+Filas del dataset filtradas
+Las filas completas que cumplen los filtros de HU-INVIMA-002 (año, clase y
+palabra clave en el nombre del trámite o el nombre común), como tabla Arrow. Se
+filtra el snapshot con pyarrow.compute cuando es de la versión publicada y, si
+no, se pagina Socrata con el mismo WHERE que /estadisticas-suit. Las usan la
+exportación a Excel y los trabajos de exportación de datos abiertos
+"""
+from typing import Dict, List, Optional
+import asyncio
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.core.arrow import tabla_desde_filas
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.socrata_client import socrata_client
+
+# Filas por página al leer de Socrata
+PAGINA = 50000
+
+_CAMPOS = ["nombre_de_la_entidad", "a_o", "clase", "nombre_del_tr_mite_u_otro", "nombre_com_n"]
+
+
+def filtrar_snapshot(
+    ano: Optional[str] = None,
+    clase: Optional[str] = None,
+    palabra_clave: Optional[str] = None,
+    solo_invima: bool = True,
+    limite: Optional[int] = None
+) -> Optional[pa.Table]:
+    """Filtra el snapshot con la semántica de /estadisticas-suit; None si no está o le faltan columnas"""
+    tabla = dataset_snapshot.tabla
+    if tabla is None or any(c not in tabla.column_names for c in _CAMPOS):
+        return None
+    condiciones = []
+    if solo_invima:
+        condiciones.append(pc.equal(tabla["nombre_de_la_entidad"], socrata_client.INVIMA_ENTITY_NAME))
+    if ano:
+        condiciones.append(pc.equal(tabla["a_o"], ano))
+    if clase:
+        condiciones.append(pc.equal(tabla["clase"], clase))
+    if palabra_clave:
+        texto = palabra_clave.upper()
+
+        def contiene(campo: str):
+            return pc.fill_null(pc.match_substring(pc.utf8_upper(tabla[campo]), texto), False)
+
+        condiciones.append(pc.or_(contiene("nombre_del_tr_mite_u_otro"), contiene("nombre_com_n")))
+    if condiciones:
+        condicion = condiciones[0]
+        for otra in condiciones[1:]:
+            condicion = pc.and_(condicion, otra)
+        tabla = tabla.filter(condicion)
+    return tabla if limite is None else tabla.slice(0, limite)
+
+
+async def filas_socrata(
+    ano: Optional[str] = None,
+    clase: Optional[str] = None,
+    palabra_clave: Optional[str] = None,
+    solo_invima: bool = True,
+    limite: Optional[int] = None
+) -> pa.Table:
+    where = socrata_client.where_estadisticas_suit(ano, clase, palabra_clave, solo_invima)
+    filas: List[Dict] = []
+    offset = 0
+    while limite is None or len(filas) < limite:
+        pagina_limite = PAGINA if limite is None else min(PAGINA, limite - len(filas))
+        pagina = await socrata_client.query(where=where, order=":id", limit=pagina_limite, offset=offset)
+        filas.extend(pagina)
+        if len(pagina) < pagina_limite:
+            break
+        offset += pagina_limite
+    return tabla_desde_filas(filas)
+
+
+async def filas_filtradas(
+    ano: Optional[str] = None,
+    clase: Optional[str] = None,
+    palabra_clave: Optional[str] = None,
+    solo_invima: bool = True,
+    limite: Optional[int] = None
+) -> pa.Table:
+    """Filas que cumplen los filtros, como máximo `limite` (None: todas)"""
+    tabla = None
+    # Como el cubo: el snapshot solo sirve si es de la versión publicada
+    if dataset_snapshot.disponible:
+        version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+        if dataset_snapshot.version == version:
+            tabla = await asyncio.to_thread(filtrar_snapshot, ano, clase, palabra_clave, solo_invima, limite)
+    if tabla is None:
+        tabla = await filas_socrata(ano, clase, palabra_clave, solo_invima, limite)
+    return tabla
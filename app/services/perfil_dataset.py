@@ -0,0 +1,185 @@
+"""
+Perfil de columnas del dataset
+Para cada columna del dataset completo: tipo, nulos, valores distintos (exactos),
+valores más frecuentes, textos vacíos y longitud de los textos. Se calcula con
+pyarrow.compute, un conteo por hash (value_counts) y un cálculo de longitudes por
+columna, una vez por versión del dataset; reemplaza al perfil que la página de
+Datos Abiertos sacaba de una muestra de 100 filas. Sin snapshot se piden a
+Socrata solo agregados (conteos, distintos, top por columna), sin paginar el
+dataset; en ese caso no hay longitudes ni tamaño en memoria
+"""
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.core.tracing import medir
+from app.services.dataset_snapshot import dataset_snapshot
+from app.services.socrata_client import socrata_client
+
+logger = logging.getLogger("invima.perfil")
+
+# Valores más frecuentes por columna
+TOP_VALORES = 5
+
+
+def _valor(valor):
+    # Los tipos compuestos de Socrata (ubicaciones, URLs) se muestran como texto
+    return valor if valor is None or isinstance(valor, (str, int, float, bool)) else str(valor)
+
+
+def perfil_columna(nombre: str, columna: pa.ChunkedArray) -> Dict:
+    """Perfil de una columna; las longitudes solo para columnas de texto"""
+    arreglo = columna.combine_chunks()
+    total = len(arreglo)
+    perfil = {
+        "columna": nombre,
+        "tipo": str(arreglo.type),
+        "nulos": arreglo.null_count,
+        "no_nulos": total - arreglo.null_count,
+        "porcentaje_nulos": round(arreglo.null_count / total * 100, 2) if total else 0.0,
+        "distintos": None,
+        "top": [],
+        "vacios": None,
+        "longitud": None,
+        "bytes": arreglo.nbytes,
+    }
+    try:
+        conteos = pc.value_counts(arreglo)
+    except pa.ArrowNotImplementedError:
+        # Tipos sin hash (listas, estructuras): sin distintos ni top
+        conteos = None
+    if conteos is not None:
+        valores, cantidades = conteos.field("values"), conteos.field("counts")
+        validos = pc.is_valid(valores)
+        valores, cantidades = valores.filter(validos), cantidades.filter(validos)
+        perfil["distintos"] = len(valores)
+        orden = np.argsort(-cantidades.to_numpy(), kind="stable")[:TOP_VALORES]
+        perfil["top"] = [
+            {"valor": _valor(valores[int(i)].as_py()), "cantidad": int(cantidades[int(i)].as_py())}
+            for i in orden
+        ]
+    if pa.types.is_string(arreglo.type) or pa.types.is_large_string(arreglo.type):
+        longitudes = pc.utf8_length(arreglo)
+        extremos = pc.min_max(longitudes)
+        media = pc.mean(longitudes).as_py()
+        perfil["vacios"] = pc.sum(pc.equal(longitudes, 0)).as_py() or 0
+        perfil["longitud"] = {
+            "min": extremos["min"].as_py(),
+            "max": extremos["max"].as_py(),
+            "media": round(media, 2) if media is not None else None,
+        }
+    return perfil
+
+
+def perfilar(tabla: pa.Table) -> List[Dict]:
+    return [perfil_columna(nombre, tabla[nombre]) for nombre in tabla.column_names]
+
+
+async def _top_socrata(columna: str) -> List[Dict]:
+    filas = await socrata_client.query(
+        select=f"{columna} as valor, count(*) as cantidad",
+        where=f"{columna} IS NOT NULL",
+        group=columna,
+        order="cantidad DESC",
+        limit=TOP_VALORES,
+    )
+    return [{"valor": _valor(f.get("valor")), "cantidad": int(f.get("cantidad", 0))} for f in filas]
+
+
+async def _vacios_socrata(columna: str) -> int:
+    filas = await socrata_client.query(select="count(*) as vacios", where=f"{columna} = ''", limit=1)
+    return int(filas[0].get("vacios", 0)) if filas else 0
+
+
+async def perfilar_socrata() -> Dict:
+    """Perfil con consultas agregadas: una con conteos y distintos de todas las columnas,
+    y por columna una con los valores más frecuentes (y los vacíos en las de texto)"""
+    metadata = await asyncio.to_thread(socrata_client.obtener_metadata)
+    columnas = [(c["fieldName"], c.get("dataTypeName", "text")) for c in metadata.get("columns", [])]
+    conteos = await socrata_client.query(
+        select=", ".join(
+            ["count(*) as filas"]
+            + [f"count({nombre}) as n_{i}, count(distinct {nombre}) as d_{i}" for i, (nombre, _) in enumerate(columnas)]
+        ),
+        limit=1,
+    )
+    conteos = conteos[0] if conteos else {}
+    total = int(conteos.get("filas", 0))
+    tops, vacios = await asyncio.gather(
+        asyncio.gather(*(_top_socrata(nombre) for nombre, _ in columnas)),
+        asyncio.gather(*(_vacios_socrata(nombre) for nombre, tipo in columnas if tipo == "text")),
+    )
+    vacios = iter(vacios)
+    perfil = []
+    for i, (nombre, tipo) in enumerate(columnas):
+        no_nulos = int(conteos.get(f"n_{i}", 0))
+        perfil.append({
+            "columna": nombre,
+            "tipo": tipo,
+            "nulos": total - no_nulos,
+            "no_nulos": no_nulos,
+            "porcentaje_nulos": round((total - no_nulos) / total * 100, 2) if total else 0.0,
+            "distintos": int(conteos.get(f"d_{i}", 0)),
+            "top": tops[i],
+            "vacios": next(vacios) if tipo == "text" else None,
+            "longitud": None,
+            "bytes": None,
+        })
+    return {"filas": total, "columnas": len(columnas), "bytes": None, "perfil": perfil}
+
+
+class PerfilDataset:
+    def __init__(self):
+        self._perfil: Optional[Dict] = None
+        self._lock = asyncio.Lock()
+
+    async def obtener(self) -> Dict:
+        """Perfil de la versión publicada del dataset; se recalcula solo cuando cambia"""
+        version = await asyncio.to_thread(dataset_snapshot.version_publicada)
+        perfil = self._perfil
+        if perfil is not None and perfil["version"] == version:
+            return perfil
+        async with self._lock:
+            perfil = self._perfil
+            if perfil is not None and perfil["version"] == version:
+                return perfil
+            inicio = time.perf_counter()
+            detalle = {"perfil": version}
+            with medir("calculo", detalle):
+                # El snapshot solo sirve si es de la versión publicada
+                if dataset_snapshot.disponible and dataset_snapshot.version == version:
+                    tabla, fuente = dataset_snapshot.tabla, "snapshot"
+                    resumen = {
+                        "filas": tabla.num_rows,
+                        "columnas": tabla.num_columns,
+                        "bytes": tabla.nbytes,
+                        "perfil": await asyncio.to_thread(perfilar, tabla),
+                    }
+                else:
+                    fuente = "socrata"
+                    resumen = await perfilar_socrata()
+                detalle["fuente"] = fuente
+            perfil = {
+                "version": version,
+                "fuente": fuente,
+                "filas": resumen["filas"],
+                "columnas": resumen["columnas"],
+                "bytes": resumen["bytes"],
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                "perfil": resumen["perfil"],
+            }
+            logger.info(
+                "Perfil del dataset %s: %s filas, %s columnas en %s ms (%s)",
+                version, perfil["filas"], perfil["columnas"], perfil["duracion_ms"], fuente
+            )
+            self._perfil = perfil
+            return perfil
+
+
+# Instancia singleton
+perfil_dataset = PerfilDataset()
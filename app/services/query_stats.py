@@ -0,0 +1,166 @@
+"""
+Estadísticas de consultas SoQL
+Agrupa las consultas a Socrata por huella (literales reemplazados por '?') y
+registra en un log rotativo las que superan el umbral configurado
+"""
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+
+from app.core.config import settings
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_LISTA_IN = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SEPARADOR_OR = re.compile(r"\s+OR\s+", re.IGNORECASE)
+_ESPACIOS = re.compile(r"\s+")
+
+# Parámetros SoQL que definen la forma de la consulta ($limit/$offset no cuentan)
+PARAMETROS_HUELLA = ("$select", "$where", "$group", "$order")
+
+
+def canonicalizar(texto: Optional[str]) -> str:
+    """
+    Reemplaza literales por '?', colapsa listas IN y elimina condiciones OR
+    repetidas, de modo que consultas que solo difieren en sus valores coincidan
+    """
+    if not texto:
+        return ""
+    canonico = _LITERAL_TEXTO.sub("?", str(texto))
+    canonico = _LITERAL_NUMERO.sub("?", canonico)
+    canonico = _LISTA_IN.sub("in (?+)", canonico)
+    canonico = _ESPACIOS.sub(" ", canonico).strip()
+
+    # Las búsquedas por categoría repiten la misma condición por cada palabra clave
+    terminos: List[str] = []
+    for termino in _SEPARADOR_OR.split(canonico):
+        if termino not in terminos:
+            terminos.append(termino)
+    return " OR ".join(terminos)
+
+
+def huella_consulta(query_params: Dict) -> Dict[str, str]:
+    """Devuelve el texto canónico de la consulta y su identificador corto"""
+    partes = [
+        f"{parametro}={canonicalizar(query_params.get(parametro))}"
+        for parametro in PARAMETROS_HUELLA
+        if query_params.get(parametro)
+    ]
+    canonica = " ".join(partes)
+    return {
+        "huella": hashlib.sha1(canonica.encode("utf-8")).hexdigest()[:12],
+        "consulta": canonica,
+    }
+
+
+def _percentil(valores: List[float], percentil: float) -> float:
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not valores:
+        return 0.0
+    indice = max(0, math.ceil(percentil / 100 * len(valores)) - 1)
+    return valores[min(indice, len(valores) - 1)]
+
+
+class _Agregado:
+    def __init__(self, consulta: str):
+        self.consulta = consulta
+        self.cantidad = 0
+        self.errores = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.muestras: Deque[float] = deque(maxlen=settings.SLOW_QUERY_MUESTRAS)
+        self.ultima = ""
+
+    def como_dict(self, huella: str) -> Dict:
+        ordenadas = sorted(self.muestras)
+        return {
+            "huella": huella,
+            "consulta": self.consulta,
+            "cantidad": self.cantidad,
+            "errores": self.errores,
+            "total_ms": round(self.total_ms, 1),
+            "p50_ms": round(_percentil(ordenadas, 50), 1),
+            "p99_ms": round(_percentil(ordenadas, 99), 1),
+            "max_ms": round(self.max_ms, 1),
+            "ultima_ejecucion": self.ultima,
+        }
+
+
+class EstadisticasConsultas:
+    """Agregados por huella de las consultas ejecutadas contra Socrata"""
+
+    ORDENES = ("total_ms", "p99_ms", "p50_ms", "max_ms", "cantidad", "errores")
+
+    def __init__(self):
+        self._agregados: Dict[str, _Agregado] = {}
+        self._lock = threading.Lock()
+        self._log_lentas: Optional[logging.Logger] = None
+
+    def _obtener_log(self) -> logging.Logger:
+        """Crea el log rotativo en el primer uso para no tocar disco al importar"""
+        if self._log_lentas is None:
+            ruta = Path(settings.SLOW_QUERY_LOG)
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            logger = logging.getLogger("invima.consultas_lentas")
+            logger.setLevel(logging.WARNING)
+            logger.propagate = False
+            if not logger.handlers:
+                handler = RotatingFileHandler(
+                    ruta,
+                    maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                    backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+                    encoding="utf-8",
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            self._log_lentas = logger
+        return self._log_lentas
+
+    def registrar(self, query_params: Dict, duracion_ms: float, error: Optional[str] = None) -> str:
+        """Acumula una ejecución y la escribe en el log si supera el umbral"""
+        huella = huella_consulta(query_params)
+        ahora = datetime.now().isoformat()
+        with self._lock:
+            agregado = self._agregados.get(huella["huella"])
+            if agregado is None:
+                agregado = self._agregados[huella["huella"]] = _Agregado(huella["consulta"])
+            agregado.cantidad += 1
+            agregado.total_ms += duracion_ms
+            agregado.max_ms = max(agregado.max_ms, duracion_ms)
+            agregado.muestras.append(duracion_ms)
+            agregado.ultima = ahora
+            if error:
+                agregado.errores += 1
+
+        if duracion_ms >= settings.SLOW_QUERY_MS:
+            self._obtener_log().warning(json.dumps({
+                "fecha": ahora,
+                "huella": huella["huella"],
+                "duracion_ms": round(duracion_ms, 1),
+                "consulta": {k: str(v) for k, v in query_params.items()},
+                "error": error,
+            }, ensure_ascii=False))
+        return huella["huella"]
+
+    def top(self, limite: int = 20, orden: str = "total_ms") -> List[Dict]:
+        """Consultas más costosas según el criterio indicado"""
+        with self._lock:
+            filas = [agregado.como_dict(huella) for huella, agregado in self._agregados.items()]
+        filas.sort(key=lambda fila: fila[orden], reverse=True)
+        return filas[:limite]
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._agregados.clear()
+
+
+# Instancia singleton
+estadisticas_consultas = EstadisticasConsultas()
@@ -0,0 +1,139 @@
+"""
+Detección de reportes casi duplicados
+Cada descripción se resume en una firma MinHash sobre sus fragmentos de
+caracteres; las firmas se reparten en bandas (LSH) y solo se comparan los
+reportes que coinciden en alguna banda, así que marcar un reporte nuevo no
+recorre todo el histórico. Los casi duplicados comparten cluster_id: el
+reporte_id del primero del grupo
+"""
+from typing import Dict, List, Optional, Tuple
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+_PRIMO = np.uint64((1 << 61) - 1)
+_MASCARA = np.uint64((1 << 32) - 1)
+
+
+def normalizar_texto(texto: Optional[str]) -> str:
+    """Minúsculas, sin tildes ni signos y con los espacios colapsados"""
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join("".join(c if c.isalnum() else " " for c in sin_tildes).split())
+
+
+class IndiceDuplicados:
+    def __init__(self, permutaciones: int = 64, bandas: int = 16, umbral: float = 0.6, k: int = 5):
+        """
+        Args:
+            permutaciones: Tamaño de la firma MinHash
+            bandas: Bandas LSH; con r = permutaciones / bandas filas por banda,
+                los pares con similitud mayor a (1/bandas)^(1/r) casi siempre
+                comparten alguna banda
+            umbral: Similitud de Jaccard estimada a partir de la cual un
+                reporte se marca como duplicado
+            k: Longitud de los fragmentos de caracteres
+        """
+        if permutaciones % bandas:
+            raise ValueError("permutaciones debe ser múltiplo de bandas")
+        self.bandas = bandas
+        self.filas = permutaciones // bandas
+        self.umbral = umbral
+        self.k = k
+        generador = np.random.default_rng(20241020)
+        self._a = generador.integers(1, int(_PRIMO), size=permutaciones, dtype=np.uint64)
+        self._b = generador.integers(0, int(_PRIMO), size=permutaciones, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self._ids: List[str] = []
+        self._clusters: List[str] = []
+        self._posiciones: Dict[str, int] = {}
+        self._firmas = np.zeros((1024, len(self._a)), dtype=np.uint32)
+        self._cubetas: List[Dict[int, List[int]]] = [{} for _ in range(self.bandas)]
+
+    def firma(self, texto: Optional[str]) -> np.ndarray:
+        normalizado = normalizar_texto(texto)
+        if len(normalizado) <= self.k:
+            fragmentos = {normalizado}
+        else:
+            fragmentos = {normalizado[i:i + self.k] for i in range(len(normalizado) - self.k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode("utf-8")) for f in fragmentos), dtype=np.uint64, count=len(fragmentos)
+        )
+        # Permutaciones (a·x + b) mod p; el desbordamiento de uint64 forma parte del hash
+        with np.errstate(over="ignore"):
+            permutados = ((hashes[:, None] * self._a + self._b) % _PRIMO) & _MASCARA
+        return permutados.min(axis=0).astype(np.uint32)
+
+    def _claves(self, firma: np.ndarray) -> List[int]:
+        return [hash(firma[i * self.filas:(i + 1) * self.filas].tobytes()) for i in range(self.bandas)]
+
+    def _insertar(self, reporte_id: str, cluster_id: str, firma: np.ndarray, claves: List[int]) -> None:
+        posicion = len(self._ids)
+        if posicion == len(self._firmas):
+            self._firmas = np.concatenate([self._firmas, np.zeros_like(self._firmas)])
+        self._firmas[posicion] = firma
+        self._ids.append(reporte_id)
+        self._clusters.append(cluster_id)
+        self._posiciones[reporte_id] = posicion
+        for cubetas, clave in zip(self._cubetas, claves):
+            cubetas.setdefault(clave, []).append(posicion)
+
+    def _mas_parecido(self, firma: np.ndarray, claves: List[int]) -> Tuple[Optional[int], float]:
+        candidatos = {p for cubetas, clave in zip(self._cubetas, claves) for p in cubetas.get(clave, ())}
+        if not candidatos:
+            return None, 0.0
+        posiciones = np.fromiter(candidatos, dtype=np.int64, count=len(candidatos))
+        similitudes = (self._firmas[posiciones] == firma).mean(axis=1)
+        mejor = int(similitudes.argmax())
+        return int(posiciones[mejor]), float(similitudes[mejor])
+
+    def agregar(self, registro: Dict) -> None:
+        """Indexa un reporte ya guardado, con el cluster que se le asignó al escribirlo"""
+        with self._lock:
+            if registro["reporte_id"] in self._posiciones:
+                return
+            firma = self.firma(registro.get("descripcion"))
+            self._insertar(
+                registro["reporte_id"], registro.get("cluster_id") or registro["reporte_id"],
+                firma, self._claves(firma)
+            )
+
+    def marcar(self, registro: Dict) -> None:
+        """
+        Asigna cluster_id al reporte nuevo (y duplicado_de y similitud si se
+        parece al menos `umbral` a uno existente) y lo indexa
+        """
+        with self._lock:
+            firma = self.firma(registro.get("descripcion"))
+            claves = self._claves(firma)
+            posicion, similitud = self._mas_parecido(firma, claves)
+            if posicion is not None and similitud >= self.umbral:
+                registro["cluster_id"] = self._clusters[posicion]
+                registro["duplicado_de"] = self._ids[posicion]
+                registro["similitud"] = round(similitud, 3)
+            else:
+                registro["cluster_id"] = registro["reporte_id"]
+            if registro["reporte_id"] not in self._posiciones:
+                self._insertar(registro["reporte_id"], registro["cluster_id"], firma, claves)
+
+    def quitar(self, reporte_ids: List[str]) -> None:
+        """Retira reportes cuya escritura falló"""
+        with self._lock:
+            for reporte_id in reporte_ids:
+                posicion = self._posiciones.pop(reporte_id, None)
+                if posicion is None:
+                    continue
+                for cubetas, clave in zip(self._cubetas, self._claves(self._firmas[posicion])):
+                    miembros = cubetas.get(clave)
+                    if miembros and posicion in miembros:
+                        miembros.remove(posicion)
+
+    def __len__(self) -> int:
+        return len(self._posiciones)
@@ -0,0 +1,166 @@
+"""
+Exportación de reportes anonimizados
+Los reportes se anonimizan en el backend antes de salir del proceso: nombre y
+email se sustituyen por un seudónimo estable y el dominio del email. Los
+escritores reciben un iterador de filas y producen el archivo por bloques, de
+modo que la memoria no crece con el tamaño del histórico
+"""
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from pathlib import Path
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import secrets
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.report_store import dominio_email
+
+CAMPOS_ANONIMOS = [
+    "reporte_id", "usuario_id", "email_dominio", "tipo_error",
+    "descripcion", "numero_radicado", "tiene_radicado", "fecha_reporte",
+    "cluster_id", "duplicado_de",
+]
+
+# Filas por bloque enviado (CSV, JSON Lines) o por grupo de filas (Parquet)
+FILAS_POR_BLOQUE = 1000
+
+
+class Anonimizador:
+    def __init__(self, clave: bytes):
+        self.clave = clave
+
+    @classmethod
+    def desde_archivo(cls, ruta: Path, clave: str = "") -> "Anonimizador":
+        """
+        Usa la clave configurada o, si no hay, una aleatoria que se genera una
+        sola vez y se guarda en `ruta` para que los seudónimos sean estables
+        entre reinicios y entre workers
+        """
+        if clave:
+            return cls(clave.encode("utf-8"))
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            descriptor = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return cls(ruta.read_bytes())
+        generada = secrets.token_hex(32).encode("ascii")
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(generada)
+        return cls(generada)
+
+    def seudonimo(self, email: Optional[str]) -> str:
+        """Mismo email, mismo seudónimo; sin la clave no se puede revertir"""
+        if not email:
+            return "Usuario_anonimo"
+        resumen = hmac.new(self.clave, email.strip().lower().encode("utf-8"), hashlib.sha256)
+        return f"Usuario_{resumen.hexdigest()[:8]}"
+
+    def anonimizar(self, registro: Dict) -> Dict:
+        return {
+            "reporte_id": registro.get("reporte_id", ""),
+            "usuario_id": self.seudonimo(registro.get("email")),
+            "email_dominio": dominio_email(registro.get("email")) or "Desconocido",
+            "tipo_error": registro.get("tipo_error") or "No especificado",
+            "descripcion": registro.get("descripcion", ""),
+            "numero_radicado": registro.get("numero_radicado"),
+            "tiene_radicado": bool(registro.get("numero_radicado")),
+            "fecha_reporte": registro.get("fecha_reporte", ""),
+            "cluster_id": registro.get("cluster_id") or registro.get("reporte_id", ""),
+            "duplicado_de": registro.get("duplicado_de"),
+        }
+
+
+# Escritores -----------------------------------------------------------------
+
+def _csv(filas: Iterable[Dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=CAMPOS_ANONIMOS)
+    escritor.writeheader()
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow(fila)
+        if i % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _jsonl(filas: Iterable[Dict]) -> Iterator[bytes]:
+    bloque = []
+    for fila in filas:
+        bloque.append(json.dumps(fila, ensure_ascii=False))
+        if len(bloque) == FILAS_POR_BLOQUE:
+            yield ("\n".join(bloque) + "\n").encode("utf-8")
+            bloque = []
+    if bloque:
+        yield ("\n".join(bloque) + "\n").encode("utf-8")
+
+
+class _Sumidero(io.RawIOBase):
+    """Archivo de solo escritura que acumula lo escrito hasta que se recoge"""
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        # Posición absoluta: Parquet la usa para los offsets del pie del archivo
+        return self._posicion
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+_ESQUEMA_PARQUET = pa.schema(
+    [(c, pa.bool_() if c == "tiene_radicado" else pa.string()) for c in CAMPOS_ANONIMOS]
+)
+
+
+def _parquet(filas: Iterable[Dict]) -> Iterator[bytes]:
+    sumidero = _Sumidero()
+    escritor = pq.ParquetWriter(pa.PythonFile(sumidero, mode="w"), _ESQUEMA_PARQUET, compression="zstd")
+    try:
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) == FILAS_POR_BLOQUE:
+                escritor.write_batch(pa.RecordBatch.from_pylist(bloque, schema=_ESQUEMA_PARQUET))
+                bloque = []
+                yield sumidero.recoger()
+        if bloque:
+            escritor.write_batch(pa.RecordBatch.from_pylist(bloque, schema=_ESQUEMA_PARQUET))
+    finally:
+        escritor.close()
+    yield sumidero.recoger()
+
+
+# formato: (escritor, tipo de contenido, extensión)
+FORMATOS: Dict[str, tuple] = {
+    "csv": (_csv, "text/csv", "csv"),
+    "jsonl": (_jsonl, "application/x-ndjson", "jsonl"),
+    "parquet": (_parquet, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def exportar(filas: Iterable[Dict], formato: str) -> Iterator[bytes]:
+    """Serializa las filas anonimizadas en el formato pedido, por bloques"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato} (use {', '.join(FORMATOS)})")
+    escritor: Callable[[Iterable[Dict]], Iterator[bytes]] = FORMATOS[formato][0]
+    return escritor(filas)
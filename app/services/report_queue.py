@@ -0,0 +1,126 @@
+"""
+Cola de escritura de reportes con commit agrupado
+Los reportes que llegan mientras se escribe un lote (o dentro del intervalo de
+espera) se escriben juntos en una sola transacción/anexado; cada solicitud
+espera a que su lote quede confirmado. Con varios workers cada proceso tiene su
+propia cola y el almacén serializa los lotes entre procesos (flock o SQLite)
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import time
+
+POLITICAS_FSYNC = ("lote", "intervalo", "nunca")
+
+_FIN = object()
+
+
+class ColaEscrituraReportes:
+    def __init__(
+        self,
+        escribir: Callable[[List[Dict], bool], None],
+        intervalo_ms: float = 2.0,
+        lote_max: int = 256,
+        politica_fsync: str = "lote",
+        fsync_intervalo_ms: float = 1000.0,
+        capacidad: int = 10000
+    ):
+        """
+        Args:
+            escribir: Función bloqueante que persiste un lote (registros, fsync)
+            intervalo_ms: Espera tras el primer reporte para agrupar los siguientes
+            lote_max: Máximo de reportes por escritura
+            politica_fsync: "lote" (cada escritura), "intervalo" (como mucho cada
+                fsync_intervalo_ms) o "nunca" (lo decide el sistema operativo)
+            capacidad: Reportes en espera antes de frenar a quien encola
+        """
+        if politica_fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync inválida: {politica_fsync} (use {', '.join(POLITICAS_FSYNC)})")
+        self.escribir = escribir
+        self.intervalo = intervalo_ms / 1000
+        self.lote_max = lote_max
+        self.politica_fsync = politica_fsync
+        self.fsync_intervalo = fsync_intervalo_ms / 1000
+        self.capacidad = capacidad
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ultimo_fsync = 0.0
+        self.lotes = 0
+        self.escritos = 0
+
+    def _asegurar_tarea(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._tarea is None or self._tarea.done():
+            self._loop = loop
+            self._cola = asyncio.Queue(maxsize=self.capacidad)
+            self._tarea = loop.create_task(self._procesar())
+
+    async def encolar(self, registro: Dict) -> None:
+        """Vuelve cuando el lote que contiene al registro está escrito; propaga el error si falló"""
+        self._asegurar_tarea()
+        futuro = self._loop.create_future()
+        await self._cola.put((registro, futuro))
+        await futuro
+
+    def _sincronizar(self) -> bool:
+        if self.politica_fsync == "lote":
+            return True
+        if self.politica_fsync == "nunca":
+            return False
+        ahora = time.monotonic()
+        if ahora - self._ultimo_fsync >= self.fsync_intervalo:
+            self._ultimo_fsync = ahora
+            return True
+        return False
+
+    async def _procesar(self) -> None:
+        terminar = False
+        while not terminar:
+            primero = await self._cola.get()
+            if primero is _FIN:
+                return
+            lote: List[Tuple[Dict, asyncio.Future]] = [primero]
+            # Commit agrupado: dar un momento a que lleguen más reportes
+            if self.intervalo > 0:
+                await asyncio.sleep(self.intervalo)
+            while len(lote) < self.lote_max:
+                try:
+                    elemento = self._cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if elemento is _FIN:
+                    terminar = True
+                    break
+                lote.append(elemento)
+            await self._escribir_lote(lote)
+
+    async def _escribir_lote(self, lote: List[Tuple[Dict, asyncio.Future]]) -> None:
+        try:
+            await asyncio.to_thread(self.escribir, [registro for registro, _ in lote], self._sincronizar())
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        self.lotes += 1
+        self.escritos += len(lote)
+        for _, futuro in lote:
+            if not futuro.done():
+                futuro.set_result(None)
+
+    async def cerrar(self) -> None:
+        """Escribe los reportes pendientes y detiene la tarea (al apagar la aplicación)"""
+        if self._tarea is None or self._tarea.done():
+            return
+        await self._cola.put(_FIN)
+        await self._tarea
+        self._tarea = None
+
+    def estado(self) -> Dict:
+        return {
+            "pendientes": self._cola.qsize() if self._cola is not None else 0,
+            "lotes": self.lotes,
+            "escritos": self.escritos,
+            "promedio_por_lote": round(self.escritos / self.lotes, 2) if self.lotes else 0.0,
+            "politica_fsync": self.politica_fsync,
+        }
@@ -0,0 +1,103 @@
+"""
+Búsqueda de texto en los reportes
+Índice invertido en memoria sobre la descripción y el número de radicado, sin
+distinguir tildes ni mayúsculas. Cada término apunta a los reportes que lo
+contienen; una consulta solo recorre las listas de sus términos y ordena por
+relevancia (BM25). Guarda además los campos que usan los filtros de /listar
+para filtrar sin leer los reportes del almacén
+"""
+from typing import Any, Dict, List, Tuple
+import math
+import sys
+import threading
+
+from app.services.report_dedup import normalizar_texto
+from app.services.report_store import coincide, dominio_email
+
+
+def terminos(texto: str) -> List[str]:
+    return normalizar_texto(texto).split()
+
+
+class IndiceTexto:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._documentos: List[Dict[str, Any]] = []
+        self._longitudes: List[int] = []
+        self._posiciones: Dict[str, int] = {}
+        self._longitud_total = 0
+
+    @staticmethod
+    def _metadatos(registro: Dict) -> Dict[str, Any]:
+        # sys.intern: los valores repetidos (tipo de error, dominio) se guardan una vez
+        def texto(valor):
+            return sys.intern(valor) if isinstance(valor, str) else valor
+
+        return {
+            "reporte_id": registro["reporte_id"],
+            "tipo_error": texto(registro.get("tipo_error")),
+            "email_dominio": texto(dominio_email(registro.get("email"))),
+            "numero_radicado": registro.get("numero_radicado"),
+            "cluster_id": registro.get("cluster_id") or registro["reporte_id"],
+            "fecha_reporte": registro.get("fecha_reporte") or "",
+        }
+
+    def agregar(self, registro: Dict) -> None:
+        palabras = terminos(registro.get("descripcion"))
+        if registro.get("numero_radicado"):
+            # Las partes del radicado y, si lleva guiones o espacios, también el radicado completo
+            partes = terminos(registro["numero_radicado"])
+            palabras.extend(partes)
+            if len(partes) > 1:
+                palabras.append("".join(partes))
+        with self._lock:
+            if registro["reporte_id"] in self._posiciones:
+                return
+            posicion = len(self._documentos)
+            self._documentos.append(self._metadatos(registro))
+            self._longitudes.append(len(palabras))
+            self._posiciones[registro["reporte_id"]] = posicion
+            self._longitud_total += len(palabras)
+            for palabra in palabras:
+                frecuencias = self._postings.setdefault(sys.intern(palabra), {})
+                frecuencias[posicion] = frecuencias.get(posicion, 0) + 1
+
+    def buscar(self, consulta: str, filtros: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """
+        Reportes que contienen todos los términos de la consulta y cumplen los
+        filtros, del más al menos relevante (a igual relevancia, el más reciente)
+        """
+        consulta_terminos = list(dict.fromkeys(terminos(consulta)))
+        if not consulta_terminos:
+            return []
+        with self._lock:
+            listas = [self._postings.get(t) for t in consulta_terminos]
+            if any(not lista for lista in listas):
+                return []
+            total = len(self._documentos)
+            promedio = self._longitud_total / total
+            # Intersección empezando por la lista más corta
+            orden = sorted(range(len(listas)), key=lambda i: len(listas[i]))
+            candidatos = set(listas[orden[0]])
+            for i in orden[1:]:
+                candidatos.intersection_update(listas[i])
+            idf = [math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5)) for lista in listas]
+            resultados = []
+            for posicion in candidatos:
+                documento = self._documentos[posicion]
+                if not coincide(documento, filtros):
+                    continue
+                normalizacion = self.k1 * (1 - self.b + self.b * self._longitudes[posicion] / promedio)
+                puntaje = sum(
+                    peso * lista[posicion] * (self.k1 + 1) / (lista[posicion] + normalizacion)
+                    for peso, lista in zip(idf, listas)
+                )
+                resultados.append((documento["reporte_id"], puntaje, documento["fecha_reporte"]))
+        resultados.sort(key=lambda r: (r[1], r[2]), reverse=True)
+        return [(reporte_id, round(puntaje, 4)) for reporte_id, puntaje, _ in resultados]
+
+    def __len__(self) -> int:
+        return len(self._posiciones)
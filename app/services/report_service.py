@@ -1,82 +1,407 @@
 """
 Servicio para manejo de reportes de errores
-Almacena todos los reportes en un único archivo JSON: reports/reportes.json
+Almacena los reportes en el backend configurado en REPORTES_BACKEND:
+SQLite (reports/reportes.db) o segmentos JSON Lines (reports/segmentos/).
+Las escrituras pasan por una cola con commit agrupado y cada reporte nuevo se
+compara con el índice de casi duplicados antes de guardarse. Los índices en
+memoria (duplicados y texto) se mantienen al día con cada escritura. Una tarea
+de fondo aplica la retención y compacta el almacén periódicamente
 """
-from typing import Dict, List
-from datetime import datetime
-import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from app.core.config import settings
 from app.models.reporte_model import ReporteError
+from pydantic import ValidationError
+from app.services.report_store import (
+    AlmacenSegmentos, BloqueoArchivo, codificar_cursor, crear_almacen, decodificar_cursor
+)
+from app.services.report_queue import ColaEscrituraReportes
+from app.services.report_export import Anonimizador, exportar
+from app.services.report_dedup import IndiceDuplicados
+from app.services.report_search import IndiceTexto
 import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("invima.reportes")
 
 class ReportService:
     def __init__(self):
+        # Sin acceso al sistema de archivos al importar: abrir() lo prepara
         self.reports_dir = Path("reports")
-        self.reports_dir.mkdir(exist_ok=True)
+        # Archivo JSON único de versiones anteriores; se migra una sola vez
         self.reports_file = self.reports_dir / "reportes.json"
-        self._lock = asyncio.Lock()
-        
-        # Crear archivo si no existe
-        if not self.reports_file.exists():
-            with open(self.reports_file, "w", encoding="utf-8") as f:
-                json.dump([], f)
-    
-    async def _leer_reportes(self) -> List[Dict]:
-        """Lee todos los reportes del archivo JSON único"""
+        self.segmentos_dir = self.reports_dir / "segmentos"
+        self.almacen = crear_almacen(
+            settings.REPORTES_BACKEND,
+            self.segmentos_dir,
+            settings.REPORTES_SEGMENTO_MAX_BYTES,
+            Path(settings.REPORTES_SQLITE)
+        )
+        self.cola = ColaEscrituraReportes(
+            self._escribir_lote,
+            intervalo_ms=settings.REPORTES_FLUSH_MS,
+            lote_max=settings.REPORTES_LOTE_MAX,
+            politica_fsync=settings.REPORTES_FSYNC,
+            fsync_intervalo_ms=settings.REPORTES_FSYNC_INTERVALO_MS
+        )
+        self.anonimizador: Optional[Anonimizador] = None
+        self._lock_indices = threading.Lock()
+        self._reiniciar_indices(0)
+        self._tarea_mantenimiento: Optional[asyncio.Task] = None
+        self._abierto = False
+        self._lock_apertura = threading.Lock()
+
+    def abrir(self) -> None:
+        """Prepara el almacén y migra los formatos anteriores (lo llama el lifespan)"""
+        if self._abierto:
+            return
+        with self._lock_apertura:
+            if not self._abierto:
+                self._abrir()
+
+    def _abrir(self) -> None:
+        self.almacen.abrir()
+        if self.reports_file.exists():
+            migrados = self.almacen.migrar_json(self.reports_file)
+            logger.info("Migrados %s reportes de %s", migrados, self.reports_file)
+        if not isinstance(self.almacen, AlmacenSegmentos) and self.segmentos_dir.exists():
+            # Cambio de backend: importar una vez los segmentos existentes
+            segmentos = AlmacenSegmentos(self.segmentos_dir)
+            segmentos.abrir()
+            migrados = self.almacen.importar(segmentos.todos())
+            try:
+                self.segmentos_dir.rename(self.segmentos_dir.with_name("segmentos.migrado"))
+            except OSError:
+                pass
+            logger.info("Migrados %s reportes de %s", migrados, self.segmentos_dir)
+        self.anonimizador = Anonimizador.desde_archivo(
+            self.reports_dir / ".clave_anonimizacion", settings.REPORTES_CLAVE_ANONIMIZACION
+        )
+        self.sincronizar_indices()
+        logger.info("Índices de duplicados y de texto: %s reportes", len(self.duplicados))
+        self._abierto = True
+
+    async def cerrar(self) -> None:
+        """Confirma los reportes en cola y cierra el almacén"""
+        await self.cola.cerrar()
+        await asyncio.to_thread(self.almacen.cerrar)
+        self._abierto = False
+
+    def _reiniciar_indices(self, generacion: int) -> None:
+        self.duplicados = IndiceDuplicados(
+            permutaciones=settings.REPORTES_DUPLICADOS_PERMUTACIONES,
+            bandas=settings.REPORTES_DUPLICADOS_BANDAS,
+            umbral=settings.REPORTES_DUPLICADOS_UMBRAL
+        )
+        self.texto = IndiceTexto()
+        # Posición del almacén hasta la que los índices en memoria están al día
+        self._marca = None
+        self._generacion = generacion
+
+    def sincronizar_indices(self) -> None:
+        with self._lock_indices:
+            self._sincronizar_indices()
+
+    def _sincronizar_indices(self) -> None:
+        """Indexa lo escrito desde la última marca, también por otros workers"""
+        generacion = self.almacen.generacion()
+        if generacion != self._generacion:
+            # El mantenimiento retiró o reescribió reportes: reconstruir desde cero
+            self._reiniciar_indices(generacion)
+        while True:
+            registros, self._marca = self.almacen.posteriores(self._marca)
+            for registro in registros:
+                self.duplicados.agregar(registro)
+                self.texto.agregar(registro)
+            if not registros:
+                return
+
+    def _escribir_lote(self, registros: List[Dict], fsync: bool) -> None:
+        self.abrir()
+        with self._lock_indices:
+            self._sincronizar_indices()
+            for registro in registros:
+                self.duplicados.marcar(registro)
+            try:
+                self.almacen.agregar(registros, fsync)
+            except Exception:
+                self.duplicados.quitar([r["reporte_id"] for r in registros])
+                raise
+            for registro in registros:
+                self.texto.agregar(registro)
+
+    @staticmethod
+    def _registro(reporte: ReporteError) -> Dict:
+        # El sufijo aleatorio evita colisiones entre workers en el mismo microsegundo
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        reporte_dict = reporte.model_dump()
+        reporte_dict["fecha_reporte"] = reporte_dict["fecha_reporte"].isoformat()
+        reporte_dict["reporte_id"] = f"REP_{timestamp}_{uuid.uuid4().hex[:6]}"
+        return reporte_dict
+
+    # Mantenimiento -----------------------------------------------------------
+
+    @property
+    def _archivo_mantenimiento(self) -> Path:
+        return self.reports_dir / ".mantenimiento.json"
+
+    def ultimo_mantenimiento(self) -> Optional[Dict]:
         try:
-            with open(self.reports_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return json.loads(self._archivo_mantenimiento.read_text(encoding="utf-8"))
         except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    async def _escribir_reportes(self, reportes: List[Dict]) -> None:
-        """Escribe todos los reportes al archivo JSON único"""
-        with open(self.reports_file, "w", encoding="utf-8") as f:
-            json.dump(reportes, f, indent=2, ensure_ascii=False)
-    
+            return None
+
+    def mantener(self, forzar: bool = False) -> Optional[Dict]:
+        """
+        Retención y compactación del almacén. Con varios workers la ejecuta uno
+        solo por intervalo: el resto espera el bloqueo y ve que ya se hizo.
+        Devuelve el resultado, o None si no tocaba
+        """
+        self.abrir()
+        intervalo = settings.REPORTES_MANTENIMIENTO_HORAS * 3600
+        with BloqueoArchivo(self.reports_dir / ".mantenimiento.lock"):
+            ultimo = self.ultimo_mantenimiento()
+            if not forzar and ultimo and time.time() - ultimo["timestamp"] < intervalo:
+                return None
+            corte = None
+            if settings.REPORTES_RETENCION_DIAS > 0:
+                corte = (date.today() - timedelta(days=settings.REPORTES_RETENCION_DIAS)).isoformat()
+            inicio = time.perf_counter()
+            resultado = self.almacen.mantener(
+                corte, Path(settings.REPORTES_ARCHIVO_DIR), archivar=settings.REPORTES_RETENCION_ARCHIVAR
+            )
+            resultado.update({
+                "corte": corte,
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+                "timestamp": time.time(),
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+            })
+            temporal = self._archivo_mantenimiento.with_suffix(".tmp")
+            temporal.write_text(json.dumps(resultado), encoding="utf-8")
+            temporal.replace(self._archivo_mantenimiento)
+        logger.info("Mantenimiento de reportes: %s", resultado)
+        self.sincronizar_indices()
+        return resultado
+
+    async def _ciclo_mantenimiento(self) -> None:
+        while True:
+            # Revisa cada minuto: así los workers que no ejecutaron el
+            # mantenimiento reconstruyen sus índices sin esperar a una solicitud
+            await asyncio.sleep(60)
+            try:
+                if await asyncio.to_thread(self.mantener) is None:
+                    await asyncio.to_thread(self.sincronizar_indices)
+            except Exception:
+                logger.exception("Error en el mantenimiento de reportes")
+
+    async def iniciar_mantenimiento(self) -> None:
+        """Arranca la tarea de fondo (lo llama el lifespan)"""
+        if self._tarea_mantenimiento is None or self._tarea_mantenimiento.done():
+            self._tarea_mantenimiento = asyncio.get_running_loop().create_task(self._ciclo_mantenimiento())
+
+    async def detener_mantenimiento(self) -> None:
+        if self._tarea_mantenimiento is not None:
+            self._tarea_mantenimiento.cancel()
+            try:
+                await self._tarea_mantenimiento
+            except asyncio.CancelledError:
+                pass
+            self._tarea_mantenimiento = None
+
     async def guardar_reporte(self, reporte: ReporteError) -> Dict:
         """
-        HU05: Guardar reporte de error en un único archivo JSON
-        Usa lock para evitar condiciones de carrera en escrituras concurrentes
+        HU05: Guardar reporte de error
+        Responde cuando el lote que incluye el reporte quedó escrito
         """
-        async with self._lock:  # Proteger lectura/escritura concurrente
+        try:
+            reporte_dict = self._registro(reporte)
+            reporte_id = reporte_dict["reporte_id"]
+
+            await self.cola.encolar(reporte_dict)
+
+            return {
+                "success": True,
+                "message": "Reporte guardado exitosamente",
+                "reporte_id": reporte_id,
+                "duplicado_de": reporte_dict.get("duplicado_de"),
+                "cluster_id": reporte_dict.get("cluster_id")
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error al guardar reporte: {str(e)}",
+                "reporte_id": None
+            }
+
+    def _validar_lote(self, elementos: List[Any]) -> Tuple[List[Dict], List[Dict]]:
+        registros: List[Dict] = []
+        resultados: List[Dict] = []
+        for indice, elemento in enumerate(elementos):
+            if isinstance(elemento, Exception):
+                # Línea NDJSON que no es JSON válido
+                resultados.append({"indice": indice, "success": False, "errores": [
+                    {"campo": "", "mensaje": str(elemento)}
+                ]})
+                continue
             try:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                reporte_id = f"REP_{timestamp}"
-                
-                # Leer reportes existentes
-                reportes = await self._leer_reportes()
-                
-                # Preparar nuevo reporte
-                reporte_dict = reporte.model_dump()
-                reporte_dict["fecha_reporte"] = reporte_dict["fecha_reporte"].isoformat()
-                reporte_dict["reporte_id"] = reporte_id
-                
-                # Agregar al inicio de la lista (más reciente primero)
-                reportes.insert(0, reporte_dict)
-                
-                # Guardar todos los reportes
-                await self._escribir_reportes(reportes)
-                
-                return {
-                    "success": True,
-                    "message": "Reporte guardado exitosamente",
-                    "reporte_id": reporte_id
-                }
-            except Exception as e:
-                return {
-                    "success": False,
-                    "message": f"Error al guardar reporte: {str(e)}",
-                    "reporte_id": None
-                }
-    
+                registro = self._registro(ReporteError.model_validate(elemento))
+            except ValidationError as e:
+                resultados.append({"indice": indice, "success": False, "errores": [
+                    {"campo": ".".join(str(p) for p in error["loc"]), "mensaje": error["msg"]}
+                    for error in e.errors()
+                ]})
+                continue
+            registros.append(registro)
+            resultados.append({"indice": indice, "success": True, "registro": registro})
+        return registros, resultados
+
+    async def guardar_lote(self, elementos: List[Any]) -> Dict:
+        """
+        Importación masiva: valida todos los elementos en una pasada y escribe
+        los válidos en una sola transacción/anexado, sin pasar por la cola.
+        Los inválidos se informan por índice y no impiden guardar el resto
+        """
+        registros, resultados = await asyncio.to_thread(self._validar_lote, elementos)
+        if registros:
+            await asyncio.to_thread(self._escribir_lote, registros, True)
+        for resultado in resultados:
+            registro = resultado.pop("registro", None)
+            if registro is not None:
+                resultado["reporte_id"] = registro["reporte_id"]
+                resultado["duplicado_de"] = registro.get("duplicado_de")
+                resultado["cluster_id"] = registro.get("cluster_id")
+        rechazados = len(resultados) - len(registros)
+        return {
+            "success": rechazados == 0,
+            "message": f"{len(registros)} reportes guardados, {rechazados} rechazados",
+            "creados": len(registros),
+            "rechazados": rechazados,
+            "resultados": resultados
+        }
+
     async def obtener_reportes(self, limit: int = 100) -> list:
         """
-        Obtiene lista de reportes desde el archivo único JSON
-        Los reportes ya están ordenados por fecha (más reciente primero)
+        Obtiene lista de reportes, del más reciente al más antiguo
+        """
+        await asyncio.to_thread(self.abrir)
+        return await asyncio.to_thread(self.almacen.recientes, limit)
+
+    async def buscar_reportes(
+        self,
+        filtros: Dict[str, Any],
+        orden: str = "desc",
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        anonimizado: bool = False
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Reportes filtrados y ordenados por fecha, paginados por cursor.
+        Lanza ValueError si el cursor no es válido
         """
-        async with self._lock:
-            reportes = await self._leer_reportes()
-            return reportes[:limit]
+        await asyncio.to_thread(self.abrir)
+        reportes, siguiente = await asyncio.to_thread(self.almacen.buscar, filtros, orden, limit, cursor)
+        if anonimizado:
+            reportes = [self.anonimizador.anonimizar(r) for r in reportes]
+        return reportes, siguiente
+
+    def _buscar_texto(
+        self, consulta: str, filtros: Dict[str, Any], limit: int, cursor: Optional[str]
+    ) -> Tuple[List[Dict], Optional[str]]:
+        desde = 0
+        if cursor:
+            valores = decodificar_cursor(cursor)
+            if len(valores) != 1 or not isinstance(valores[0], int):
+                raise ValueError("Cursor inválido")
+            desde = valores[0]
+        self.abrir()
+        # Incluir lo que otros workers escribieron desde la última consulta
+        self.sincronizar_indices()
+        encontrados = self.texto.buscar(consulta, filtros)
+        pagina = encontrados[desde:desde + limit]
+        relevancia = dict(pagina)
+        reportes = self.almacen.obtener([reporte_id for reporte_id, _ in pagina])
+        for reporte in reportes:
+            reporte["relevancia"] = relevancia[reporte["reporte_id"]]
+        siguiente = codificar_cursor([desde + limit]) if len(encontrados) > desde + limit else None
+        return reportes, siguiente
+
+    async def buscar_texto(
+        self,
+        consulta: str,
+        filtros: Dict[str, Any],
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        anonimizado: bool = False
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Búsqueda de texto en descripción y radicado (sin tildes), ordenada por
+        relevancia y paginada por cursor. Lanza ValueError si el cursor no es válido
+        """
+        reportes, siguiente = await asyncio.to_thread(self._buscar_texto, consulta, filtros, limit, cursor)
+        if anonimizado:
+            reportes = [
+                {**self.anonimizador.anonimizar(r), "relevancia": r["relevancia"]} for r in reportes
+            ]
+        return reportes, siguiente
+
+    async def exportar_reportes(self, filtros: Dict[str, Any], orden: str, formato: str) -> Iterator[bytes]:
+        """
+        Exportación anonimizada de todos los reportes filtrados. Devuelve un
+        generador bloqueante que lee el almacén por páginas a medida que se
+        consume; lanza ValueError si el formato no está soportado
+        """
+        await asyncio.to_thread(self.abrir)
+        filas = (self.anonimizador.anonimizar(r) for r in self.almacen.iterar(filtros, orden))
+        return exportar(filas, formato)
+
+    async def obtener_estadisticas(self, dias: int = 30) -> Dict:
+        """
+        Estadísticas de todo el histórico a partir de los contadores que se
+        actualizan en cada escritura: no recorre los reportes
+        """
+        await asyncio.to_thread(self.abrir)
+        hoy = date.today()
+        ventana = max(dias, 30)
+        desde = (hoy - timedelta(days=ventana - 1)).isoformat()
+        contadores = await asyncio.to_thread(self.almacen.contadores, desde)
+
+        def dimension(nombre: str) -> Dict[str, int]:
+            valores = {c: n for (d, c), n in contadores.items() if d == nombre and n}
+            return dict(sorted(valores.items(), key=lambda par: par[1], reverse=True))
+
+        por_dia = dimension("dia")
+
+        def ultimos(n: int) -> int:
+            return sum(por_dia.get((hoy - timedelta(days=i)).isoformat(), 0) for i in range(n))
+
+        radicado = dimension("radicado")
+        # Solo los grupos con duplicados; cada uno suma el reporte original
+        clusters = dimension("cluster")
+        return {
+            "total_reportes": contadores.get(("total", ""), 0),
+            "por_tipo": dimension("tipo_error"),
+            "por_dominio": dimension("dominio"),
+            "con_radicado": radicado.get("con", 0),
+            "sin_radicado": radicado.get("sin", 0),
+            "ultimos_7_dias": ultimos(7),
+            "ultimos_30_dias": ultimos(30),
+            "archivados": contadores.get(("retencion", "archivados"), 0),
+            "eliminados": contadores.get(("retencion", "eliminados"), 0),
+            "duplicados": contadores.get(("duplicados", ""), 0),
+            "clusters_con_duplicados": len(clusters),
+            "clusters_principales": [
+                {"cluster_id": cluster_id, "reportes": cantidad + 1}
+                for cluster_id, cantidad in list(clusters.items())[:10]
+            ],
+            "serie_diaria": [
+                {"fecha": dia, "cantidad": por_dia.get(dia, 0)}
+                for dia in ((hoy - timedelta(days=i)).isoformat() for i in range(dias - 1, -1, -1))
+            ]
+        }
 
 report_service = ReportService()
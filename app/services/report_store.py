@@ -0,0 +1,1246 @@
+"""
+Almacenamiento de reportes
+Backends intercambiables para ReportService (REPORTES_BACKEND):
+- sqlite: base SQLite en modo WAL con índices por fecha, tipo de error,
+  radicado y dominio del email; filtros y paginación por cursor indexados
+- segmentos: JSON Lines de solo anexado. Cada segmento (seg-000001.jsonl) tiene
+  un índice de desplazamientos (seg-000001.idx, un entero de 8 bytes por
+  reporte) que permite leer del más reciente al más antiguo sin recorrer el
+  archivo. Anexar es O(1); al superar el tamaño máximo se abre un segmento nuevo.
+  Los contadores se llevan en memoria y contadores.json es un punto de control
+  periódico: al abrir se suma lo anexado después de él
+
+mantener() aplica la retención: retira los reportes anteriores a una fecha de
+corte, opcionalmente archivándolos en reports/archivo/reportes-AAAA-MM.jsonl.gz,
+y compacta el almacén (fusiona segmentos o libera páginas de SQLite)
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import base64
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo
+    fcntl = None
+
+_OFFSET = struct.Struct("<Q")
+# Reportes anexados entre dos puntos de control de los contadores de segmentos
+CONTADORES_PUNTO_CONTROL = 10000
+
+
+class BloqueoArchivo:
+    """Exclusión mutua entre procesos (workers de gunicorn) y entre hilos"""
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self._hilos = threading.Lock()
+        self._archivo = None
+
+    def __enter__(self):
+        self._hilos.acquire()
+        self._archivo = open(self.ruta, "a")
+        if fcntl is not None:
+            fcntl.flock(self._archivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._archivo, fcntl.LOCK_UN)
+            self._archivo.close()
+        finally:
+            self._archivo = None
+            self._hilos.release()
+
+
+class ArchivoMensual:
+    """
+    Anexa reportes a archivos comprimidos por mes del reporte. Cada ejecución
+    agrega un miembro gzip nuevo al final; gzip y zcat los leen como un solo
+    archivo JSON Lines
+    """
+
+    def __init__(self, directorio: Path):
+        self.directorio = Path(directorio)
+        self._abiertos: Dict[str, Tuple[Any, gzip.GzipFile]] = {}
+        self.cantidad = 0
+
+    def agregar(self, registro: Dict) -> None:
+        mes = (registro.get("fecha_reporte") or "")[:7] or "sin-fecha"
+        if mes not in self._abiertos:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            crudo = open(self.directorio / f"reportes-{mes}.jsonl.gz", "ab")
+            self._abiertos[mes] = (crudo, gzip.GzipFile(fileobj=crudo, mode="wb"))
+        self._abiertos[mes][1].write((json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.cantidad += 1
+
+    def sincronizar(self) -> None:
+        """Deja en disco lo escrito: se llama antes de borrar esos reportes del almacén"""
+        for crudo, comprimido in self._abiertos.values():
+            comprimido.flush()
+            crudo.flush()
+            os.fsync(crudo.fileno())
+
+    def cerrar(self) -> None:
+        for crudo, comprimido in self._abiertos.values():
+            comprimido.close()
+            crudo.flush()
+            os.fsync(crudo.fileno())
+            crudo.close()
+        self._abiertos = {}
+
+    def __enter__(self) -> "ArchivoMensual":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+
+def dominio_email(email: Optional[str]) -> Optional[str]:
+    if not email or "@" not in email:
+        return None
+    return email.rsplit("@", 1)[1].strip().lower() or None
+
+
+def codificar_cursor(valores: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> List[Any]:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(valores, list):
+        raise ValueError("Cursor inválido")
+    return valores
+
+
+def incrementos_contadores(registros: Iterable[Dict]) -> Counter:
+    """
+    Contadores que cambian con cada reporte, por (dimensión, clave): total,
+    tipo de error, dominio del email, con/sin radicado, día (YYYY-MM-DD) y,
+    para los casi duplicados, cluster (reportes que se sumaron a cada grupo)
+    """
+    incrementos: Counter = Counter()
+    for registro in registros:
+        incrementos[("total", "")] += 1
+        incrementos[("tipo_error", registro.get("tipo_error") or "No especificado")] += 1
+        incrementos[("dominio", dominio_email(registro.get("email")) or "Desconocido")] += 1
+        incrementos[("radicado", "con" if registro.get("numero_radicado") else "sin")] += 1
+        dia = (registro.get("fecha_reporte") or "")[:10]
+        if dia:
+            incrementos[("dia", dia)] += 1
+        if registro.get("duplicado_de"):
+            incrementos[("duplicados", "")] += 1
+            incrementos[("cluster", registro["cluster_id"])] += 1
+    return incrementos
+
+
+class AlmacenReportes(ABC):
+    """
+    Interfaz común de los backends. Los métodos son bloqueantes; ReportService
+    los ejecuta fuera del event loop. Un backend al que le falte un método
+    abstracto no se puede instanciar.
+
+    Filtros de buscar(): tipo_error, email_dominio, numero_radicado,
+    con_radicado (bool), cluster_id, desde y hasta (fechas ISO, hasta exclusivo)
+    """
+
+    @abstractmethod
+    def abrir(self) -> None:
+        ...
+
+    def cerrar(self) -> None:
+        pass
+
+    @abstractmethod
+    def agregar(self, registros: Iterable[Dict], fsync: bool = False) -> None:
+        ...
+
+    @abstractmethod
+    def recientes(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def buscar(
+        self,
+        filtros: Dict[str, Any],
+        orden: str = "desc",
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Página de reportes y cursor de la siguiente (None si no hay más)"""
+
+    def iterar(self, filtros: Dict[str, Any], orden: str = "desc", tamano_pagina: int = 1000) -> Iterator[Dict]:
+        """Recorre todos los reportes filtrados página a página, con memoria constante"""
+        cursor = None
+        while True:
+            pagina, cursor = self.buscar(filtros, orden, tamano_pagina, cursor)
+            yield from pagina
+            if cursor is None:
+                return
+
+    @abstractmethod
+    def todos(self) -> Iterator[Dict]:
+        """Todos los reportes, del más antiguo al más reciente"""
+
+    def generacion(self) -> int:
+        """
+        Cambia cada vez que mantener() retira o reescribe reportes: las marcas de
+        posteriores() dejan de valer y los índices en memoria se reconstruyen
+        """
+        return 0
+
+    @abstractmethod
+    def mantener(self, corte: Optional[str], directorio_archivo: Path, archivar: bool = True) -> Dict[str, Any]:
+        """
+        Retira los reportes con fecha_reporte anterior a `corte` (None: ninguno),
+        archivándolos por mes si `archivar`, y compacta el almacén
+        """
+
+    def obtener(self, reporte_ids: List[str]) -> List[Dict]:
+        """Reportes por reporte_id, en el mismo orden (los que no existen se omiten)"""
+        pendientes = set(reporte_ids)
+        encontrados = {}
+        for registro in self.todos():
+            if registro.get("reporte_id") in pendientes:
+                encontrados[registro["reporte_id"]] = registro
+                if len(encontrados) == len(pendientes):
+                    break
+        return [encontrados[i] for i in reporte_ids if i in encontrados]
+
+    @abstractmethod
+    def posteriores(self, marca: Any = None, limit: int = 1000) -> Tuple[List[Dict], Any]:
+        """
+        Reportes escritos después de `marca` (None: desde el principio), en orden
+        de escritura y de cualquier proceso, y la marca para la siguiente llamada.
+        Permite a cada worker mantener sus índices en memoria al día
+        """
+
+    @abstractmethod
+    def contadores(self, desde_dia: Optional[str] = None) -> Dict[Tuple[str, str], int]:
+        """
+        Contadores mantenidos en cada escritura (ver incrementos_contadores);
+        los días anteriores a `desde_dia` se omiten
+        """
+
+    @abstractmethod
+    def contar(self) -> int:
+        ...
+
+    def vacio(self) -> bool:
+        return self.contar() == 0
+
+    def importar(self, registros: Iterable[Dict]) -> int:
+        """Carga inicial desde otro almacenamiento (del más antiguo al más reciente)"""
+        registros = list(registros)
+        if registros and self.vacio():
+            self.agregar(registros, fsync=True)
+            return len(registros)
+        return 0
+
+    def migrar_json(self, archivo: Path) -> int:
+        """
+        Migración única desde el archivo JSON anterior (lista, más reciente
+        primero). Al terminar lo renombra a .migrado para no repetirla
+        """
+        try:
+            with open(archivo, "r", encoding="utf-8") as f:
+                reportes = json.load(f)
+        except FileNotFoundError:
+            # Otro worker ya la hizo
+            return 0
+        except json.JSONDecodeError:
+            reportes = []
+        migrados = self.importar(reversed(reportes))
+        try:
+            archivo.rename(archivo.with_name(archivo.name + ".migrado"))
+        except FileNotFoundError:
+            pass
+        return migrados
+
+
+def coincide(registro: Dict, filtros: Dict[str, Any]) -> bool:
+    """Filtros de buscar() sobre un reporte (o sus metadatos, con email_dominio en lugar de email)"""
+    if filtros.get("tipo_error") and registro.get("tipo_error") != filtros["tipo_error"]:
+        return False
+    if filtros.get("email_dominio"):
+        dominio = registro["email_dominio"] if "email_dominio" in registro else dominio_email(registro.get("email"))
+        if dominio != filtros["email_dominio"].lower():
+            return False
+    if filtros.get("numero_radicado") and registro.get("numero_radicado") != filtros["numero_radicado"]:
+        return False
+    if filtros.get("con_radicado") is not None and bool(registro.get("numero_radicado")) != filtros["con_radicado"]:
+        return False
+    if filtros.get("cluster_id") and (registro.get("cluster_id") or registro.get("reporte_id")) != filtros["cluster_id"]:
+        return False
+    fecha = registro.get("fecha_reporte") or ""
+    if filtros.get("desde") and fecha < filtros["desde"]:
+        return False
+    if filtros.get("hasta") and fecha >= filtros["hasta"]:
+        return False
+    return True
+
+
+class AlmacenSegmentos(AlmacenReportes):
+    def __init__(self, directorio: Path, max_bytes_segmento: int = 4 * 1024 * 1024):
+        self.directorio = Path(directorio)
+        self.max_bytes_segmento = max_bytes_segmento
+        self._bloqueo = BloqueoArchivo(self.directorio / ".lock")
+        # Contadores en memoria, al día hasta la marca (de posteriores) y la
+        # generación indicadas; contadores.json es solo un punto de control
+        self._contadores: Counter = Counter()
+        self._marca_contadores: Optional[List[int]] = None
+        self._generacion_contadores: Optional[int] = None
+        self._sin_guardar = 0
+
+    # Segmentos ---------------------------------------------------------------
+
+    def _segmentos(self) -> List[Path]:
+        """Segmentos del más antiguo al más reciente"""
+        return sorted(self.directorio.glob("seg-*.jsonl"))
+
+    def _nuevo_segmento(self, anterior: Optional[Path]) -> Path:
+        numero = int(anterior.stem.split("-")[1]) + 1 if anterior else 1
+        ruta = self.directorio / f"seg-{numero:06d}.jsonl"
+        ruta.touch()
+        ruta.with_suffix(".idx").touch()
+        ruta.with_suffix(".min").unlink(missing_ok=True)
+        return ruta
+
+    @staticmethod
+    def _leer_indice(segmento: Path) -> List[int]:
+        try:
+            datos = segmento.with_suffix(".idx").read_bytes()
+        except FileNotFoundError:
+            return []
+        usable = len(datos) - len(datos) % _OFFSET.size
+        return [o for (o,) in _OFFSET.iter_unpack(datos[:usable])]
+
+    @staticmethod
+    def _entradas(segmento: Path) -> int:
+        """Reportes del segmento, por el tamaño de su índice"""
+        try:
+            return segmento.with_suffix(".idx").stat().st_size // _OFFSET.size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _reconstruir_indice(segmento: Path) -> None:
+        offsets = []
+        posicion = 0
+        with open(segmento, "rb") as f:
+            for linea in f:
+                offsets.append(posicion)
+                posicion += len(linea)
+        temporal = segmento.with_suffix(".idx.tmp")
+        temporal.write_bytes(b"".join(_OFFSET.pack(o) for o in offsets))
+        os.replace(temporal, segmento.with_suffix(".idx"))
+
+    def _reparar(self, segmento: Path) -> None:
+        """
+        Recuperación tras una caída: descarta una última línea incompleta y
+        reconstruye el índice si no coincide con el segmento (los datos se
+        escriben antes que el índice, así que el índice nunca va por delante)
+        """
+        contenido = segmento.read_bytes()
+        tamano = contenido.rfind(b"\n") + 1
+        if tamano != len(contenido):
+            with open(segmento, "rb+") as f:
+                f.truncate(tamano)
+
+        idx = segmento.with_suffix(".idx")
+        offsets = self._leer_indice(segmento)
+        if not idx.exists() or idx.stat().st_size % _OFFSET.size:
+            valido = False
+        elif offsets:
+            # La última entrada debe apuntar exactamente a la última línea
+            valido = offsets[-1] < tamano and contenido.find(b"\n", offsets[-1]) + 1 == tamano
+        else:
+            valido = tamano == 0
+        if not valido:
+            self._reconstruir_indice(segmento)
+
+    # Ciclo de vida -----------------------------------------------------------
+
+    def abrir(self) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        with self._bloqueo:
+            # Una compactación registrada se termina; los temporales que queden
+            # son de una que se interrumpió antes de registrarse
+            self._completar_compactacion()
+            for temporal in self.directorio.glob("seg-*.tmp"):
+                temporal.unlink()
+            for segmento in self._segmentos():
+                self._reparar(segmento)
+            self._actualizar_contadores()
+            if self._contadores[("total", "")] != self.contar():
+                # Punto de control por delante de los datos (escrituras sin fsync perdidas)
+                self._reconstruir_contadores()
+
+    def cerrar(self) -> None:
+        with self._bloqueo:
+            if self._generacion_contadores is not None:
+                self._actualizar_contadores()
+                self._guardar_contadores(fsync=True)
+
+    # Contadores --------------------------------------------------------------
+
+    @property
+    def _archivo_contadores(self) -> Path:
+        return self.directorio / "contadores.json"
+
+    def _leer_contadores(self) -> Tuple[Counter, Optional[List[int]], Optional[int]]:
+        """Último punto de control: contadores, marca y generación a las que corresponden"""
+        try:
+            datos = json.loads(self._archivo_contadores.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return Counter(), None, None
+        if "contadores" not in datos:
+            # Formato anterior: solo los contadores, sin marca
+            datos = {"contadores": datos}
+        contadores = Counter({tuple(clave.split("\t", 1)): n for clave, n in datos["contadores"].items()})
+        return contadores, datos.get("marca"), datos.get("generacion")
+
+    def _guardar_contadores(self, fsync: bool = False) -> None:
+        """Punto de control de los contadores en memoria (bajo el bloqueo)"""
+        temporal = self._archivo_contadores.with_suffix(".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({
+                "generacion": self._generacion_contadores,
+                "marca": self._marca_contadores,
+                "contadores": {f"{d}\t{c}": n for (d, c), n in self._contadores.items() if n},
+            }, f, ensure_ascii=False)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(temporal, self._archivo_contadores)
+        self._sin_guardar = 0
+
+    def _actualizar_contadores(self) -> None:
+        """
+        Bajo el bloqueo: suma a los contadores en memoria lo anexado después de su
+        marca, también por otros procesos. Si el mantenimiento cambió la
+        generación, parte del punto de control que dejó; sin punto de control
+        válido, recorre los segmentos desde el principio
+        """
+        # Otro proceso pudo caer a mitad de una compactación
+        self._completar_compactacion()
+        generacion = self.generacion()
+        if generacion != self._generacion_contadores:
+            contadores, marca, guardada = self._leer_contadores()
+            if marca is None or guardada != generacion:
+                # Los reportes retirados por retención ya no están en los segmentos
+                contadores = Counter({k: n for k, n in contadores.items() if k[0] == "retencion"})
+                marca = None
+            self._contadores, self._marca_contadores = contadores, marca
+            self._generacion_contadores = generacion
+        segmentos = self._segmentos()
+        if self._marca_contadores and segmentos and self._marca_contadores == [
+            int(segmentos[-1].stem.split("-")[1]), self._entradas(segmentos[-1])
+        ]:
+            return
+        while True:
+            registros, self._marca_contadores = self.posteriores(self._marca_contadores)
+            if not registros:
+                break
+            self._contadores.update(incrementos_contadores(registros))
+            self._sin_guardar += len(registros)
+        if self._sin_guardar >= CONTADORES_PUNTO_CONTROL:
+            self._guardar_contadores()
+
+    def _reconstruir_contadores(self) -> None:
+        self._contadores = Counter({k: n for k, n in self._contadores.items() if k[0] == "retencion"})
+        self._marca_contadores = None
+        self._actualizar_contadores()
+        self._guardar_contadores(fsync=True)
+
+    def contadores(self, desde_dia: Optional[str] = None) -> Dict[Tuple[str, str], int]:
+        with self._bloqueo:
+            self._actualizar_contadores()
+            return {
+                (dimension, clave): cantidad
+                for (dimension, clave), cantidad in self._contadores.items()
+                if cantidad and not (desde_dia and dimension == "dia" and clave < desde_dia)
+            }
+
+    def vacio(self) -> bool:
+        return not any(self._leer_indice(s) for s in self._segmentos())
+
+    # Escritura ---------------------------------------------------------------
+
+    def agregar(self, registros: Iterable[Dict], fsync: bool = False) -> None:
+        """Anexa los registros al segmento activo en una sola escritura"""
+        with self._bloqueo:
+            self._agregar(registros, fsync)
+
+    def _agregar(self, registros: Iterable[Dict], fsync: bool) -> None:
+        registros = list(registros)
+        # Antes de elegir el segmento activo: otro proceso pudo caer a mitad de una compactación
+        self._completar_compactacion()
+        segmentos = self._segmentos()
+        activo = segmentos[-1] if segmentos else self._nuevo_segmento(None)
+        if activo.stat().st_size >= self.max_bytes_segmento:
+            activo = self._nuevo_segmento(activo)
+        else:
+            # Otro proceso pudo caer a mitad de una escritura
+            with open(activo, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._reparar(activo)
+
+        # Contadores al día con lo anexado por otros procesos antes de este lote
+        self._actualizar_contadores()
+        entradas = self._entradas(activo)
+        inicio = activo.stat().st_size
+        lineas = []
+        offsets = []
+        for registro in registros:
+            linea = (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(inicio)
+            inicio += len(linea)
+            lineas.append(linea)
+        if not lineas:
+            return
+
+        # Primero los datos y después el índice: una caída entre ambos se repara al abrir
+        with open(activo, "ab") as f:
+            f.write(b"".join(lineas))
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        with open(activo.with_suffix(".idx"), "ab") as f:
+            f.write(b"".join(_OFFSET.pack(o) for o in offsets))
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        # Contadores: en memoria; contadores.json se guarda cada
+        # CONTADORES_PUNTO_CONTROL reportes y al cerrar. Tras una caída, abrir()
+        # suma lo anexado después del último punto de control
+        self._contadores.update(incrementos_contadores(registros))
+        self._marca_contadores = [int(activo.stem.split("-")[1]), entradas + len(offsets)]
+        self._sin_guardar += len(offsets)
+        if self._sin_guardar >= CONTADORES_PUNTO_CONTROL:
+            self._guardar_contadores(fsync)
+
+    # Lectura -----------------------------------------------------------------
+
+    def _iterar_recientes(self) -> Iterator[Dict]:
+        """Reportes del más reciente al más antiguo, recorriendo los segmentos hacia atrás"""
+        for segmento in reversed(self._segmentos()):
+            offsets = self._leer_indice(segmento)
+            try:
+                f = open(segmento, "rb")
+            except FileNotFoundError:
+                continue  # Lo retiró una compactación
+            with f:
+                for posicion in reversed(offsets):
+                    f.seek(posicion)
+                    yield json.loads(f.readline())
+
+    def recientes(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Saltar segmentos completos usa solo el tamaño de su índice"""
+        resultado: List[Dict] = []
+        for segmento in reversed(self._segmentos()):
+            if len(resultado) >= limit:
+                break
+            offsets = self._leer_indice(segmento)
+            if offset >= len(offsets):
+                offset -= len(offsets)
+                continue
+            try:
+                f = open(segmento, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                for posicion in reversed(offsets[:len(offsets) - offset]):
+                    f.seek(posicion)
+                    resultado.append(json.loads(f.readline()))
+                    if len(resultado) >= limit:
+                        break
+            offset = 0
+        return resultado
+
+    def buscar(
+        self,
+        filtros: Dict[str, Any],
+        orden: str = "desc",
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Sin índices secundarios: recorre los reportes y filtra (el cursor es un desplazamiento)"""
+        try:
+            saltar = int(decodificar_cursor(cursor)[0]) if cursor else 0
+        except (IndexError, TypeError):
+            raise ValueError("Cursor inválido")
+        pagina: List[Dict] = []
+        coincidencias = 0
+        for registro in self.iterar(filtros, orden):
+            coincidencias += 1
+            if coincidencias <= saltar:
+                continue
+            if len(pagina) == limit:
+                return pagina, codificar_cursor([saltar + limit])
+            pagina.append(registro)
+        return pagina, None
+
+    def iterar(self, filtros: Dict[str, Any], orden: str = "desc", tamano_pagina: int = 1000) -> Iterator[Dict]:
+        # Lectura secuencial de los segmentos: no hace falta paginar
+        fuente = self._iterar_recientes() if orden == "desc" else self.todos()
+        return (registro for registro in fuente if coincide(registro, filtros))
+
+    def todos(self) -> Iterator[Dict]:
+        """Todos los reportes en orden de escritura (más antiguo primero)"""
+        for segmento in self._segmentos():
+            cantidad = len(self._leer_indice(segmento))
+            try:
+                f = open(segmento, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                for _, linea in zip(range(cantidad), f):
+                    yield json.loads(linea)
+
+    def posteriores(self, marca: Any = None, limit: int = 1000) -> Tuple[List[Dict], Any]:
+        # Marca: [número de segmento, entradas ya leídas de ese segmento]
+        numero, leidas = marca or (0, 0)
+        resultado: List[Dict] = []
+        for segmento in self._segmentos():
+            actual = int(segmento.stem.split("-")[1])
+            if actual < numero:
+                continue
+            if actual > numero:
+                # El segmento anterior ya rotó: se leyó completo
+                numero, leidas = actual, 0
+            pendientes = self._leer_indice(segmento)[leidas:leidas + limit - len(resultado)]
+            if pendientes:
+                try:
+                    f = open(segmento, "rb")
+                except FileNotFoundError:
+                    # Lo retiró una compactación (que cambia la generación): la marca
+                    # pasa al segmento siguiente
+                    continue
+                with f:
+                    for posicion in pendientes:
+                        f.seek(posicion)
+                        resultado.append(json.loads(f.readline()))
+                leidas += len(pendientes)
+            if len(resultado) >= limit:
+                break
+        return resultado, [numero, leidas]
+
+    # Mantenimiento -----------------------------------------------------------
+
+    @property
+    def _archivo_generacion(self) -> Path:
+        return self.directorio / "generacion"
+
+    def generacion(self) -> int:
+        try:
+            return int(self._archivo_generacion.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _escribir_segmentos(self, registros: Iterable[Dict], numero: int) -> List[Path]:
+        """
+        Escribe los registros en segmentos temporales (seg-N.jsonl.tmp, invisibles
+        para los lectores) numerados desde `numero`; devuelve los segmentos finales
+        """
+        finales: List[Path] = []
+        datos = indice = None
+        tamano = 0
+
+        def cerrar(*archivos) -> None:
+            for archivo in archivos:
+                if archivo is not None:
+                    archivo.flush()
+                    os.fsync(archivo.fileno())
+                    archivo.close()
+
+        try:
+            for registro in registros:
+                if datos is None or tamano >= self.max_bytes_segmento:
+                    cerrar(datos, indice)
+                    datos = indice = None
+                    final = self.directorio / f"seg-{numero + len(finales):06d}.jsonl"
+                    finales.append(final)
+                    datos = open(final.with_name(final.name + ".tmp"), "wb")
+                    indice = open(final.with_suffix(".idx.tmp"), "wb")
+                    tamano = 0
+                linea = (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+                indice.write(_OFFSET.pack(tamano))
+                datos.write(linea)
+                tamano += len(linea)
+        finally:
+            cerrar(datos, indice)
+        return finales
+
+    def _fecha_minima(self, segmento: Path) -> Optional[str]:
+        """
+        fecha_reporte más antigua del segmento (None si está vacío). Se guarda
+        junto al segmento (seg-N.min) con su cantidad de reportes: solo se vuelve
+        a leer el segmento si desde entonces se le anexaron reportes
+        """
+        archivo = segmento.with_suffix(".min")
+        cantidad = self._entradas(segmento)
+        try:
+            guardado = json.loads(archivo.read_text(encoding="utf-8"))
+            if guardado["entradas"] == cantidad:
+                return guardado["fecha"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            pass
+        fecha = None
+        with open(segmento, "rb") as f:
+            for _, linea in zip(range(cantidad), f):
+                actual = json.loads(linea).get("fecha_reporte") or ""
+                if fecha is None or actual < fecha:
+                    fecha = actual
+        temporal = archivo.with_name(archivo.name + ".tmp")
+        temporal.write_text(json.dumps({"entradas": cantidad, "fecha": fecha}), encoding="utf-8")
+        os.replace(temporal, archivo)
+        return fecha
+
+    def _hay_retirables(self, corte: Optional[str]) -> bool:
+        """Por los contadores por día (sin leer segmentos): si puede haber reportes anteriores al corte"""
+        if not corte:
+            return False
+        con_dia = 0
+        for (dimension, clave), cantidad in self._contadores.items():
+            if dimension == "dia" and cantidad > 0:
+                if clave < corte:
+                    return True
+                con_dia += cantidad
+        # Los reportes sin fecha no tienen contador por día y siempre se retiran
+        return con_dia < self._contadores[("total", "")]
+
+    def _tramos(self, segmentos: List[Path], corte: Optional[str]) -> List[Tuple[List[Path], bool]]:
+        """
+        Segmentos agrupados en tramos consecutivos y si hay que reescribir cada
+        uno: los que tienen reportes anteriores al corte y las rachas de
+        segmentos cerrados por debajo del tamaño máximo que caben en menos
+        """
+        retencion = self._hay_retirables(corte)
+        tramos: List[Tuple[List[Path], bool]] = []
+        racha: List[Path] = []
+        afectada = False
+
+        def cerrar_racha() -> None:
+            tamano = sum(s.stat().st_size for s in racha)
+            if afectada or tamano // self.max_bytes_segmento + 1 < len(racha):
+                tramos.append((list(racha), True))
+            else:
+                tramos.extend(([s], False) for s in racha)
+
+        for posicion, segmento in enumerate(segmentos):
+            activo = posicion == len(segmentos) - 1
+            fecha = self._fecha_minima(segmento) if retencion else None
+            retirar = fecha is not None and fecha < corte
+            pequeno = not activo and segmento.stat().st_size < self.max_bytes_segmento
+            if retirar or pequeno:
+                racha.append(segmento)
+                afectada = afectada or retirar
+                continue
+            if racha:
+                cerrar_racha()
+                racha, afectada = [], False
+            tramos.append(([segmento], False))
+        if racha:
+            cerrar_racha()
+        return tramos
+
+    @staticmethod
+    def _enlazar(origen: Path, destino: Path) -> None:
+        """Enlace duro: el segmento pasa a otro número sin copiar sus datos"""
+        try:
+            os.link(origen, destino)
+        except OSError:
+            # Sistemas de archivos sin enlaces duros
+            shutil.copyfile(origen, destino)
+
+    @property
+    def _archivo_compactacion(self) -> Path:
+        return self.directorio / "compactacion.json"
+
+    def _escribir_generacion(self, generacion: int) -> None:
+        temporal = self._archivo_generacion.with_suffix(".tmp")
+        temporal.write_text(str(generacion))
+        os.replace(temporal, self._archivo_generacion)
+
+    def _publicar(self, intencion: Dict[str, Any]) -> None:
+        """
+        Publica los segmentos nuevos de una compactación y borra los anteriores.
+        Se puede repetir: lo ya publicado o borrado se salta
+        """
+        # Del más reciente al más antiguo: si otro proceso anexa antes de que se
+        # termine una compactación interrumpida, lo hace en el último segmento
+        for nombre in reversed(intencion["nuevos"]):
+            nuevo = self.directorio / nombre
+            # El índice primero: un segmento visible siempre tiene índice
+            for sufijo in (".min", ".idx"):
+                if nuevo.with_suffix(sufijo + ".tmp").exists():
+                    os.replace(nuevo.with_suffix(sufijo + ".tmp"), nuevo.with_suffix(sufijo))
+            if nuevo.with_name(nuevo.name + ".tmp").exists():
+                os.replace(nuevo.with_name(nuevo.name + ".tmp"), nuevo)
+            elif not nuevo.exists():
+                # Todo se retiró: el segmento activo empieza vacío
+                nuevo.with_suffix(".idx").touch()
+                nuevo.touch()
+        for nombre in intencion["anteriores"]:
+            anterior = self.directorio / nombre
+            anterior.unlink(missing_ok=True)
+            anterior.with_suffix(".idx").unlink(missing_ok=True)
+            anterior.with_suffix(".min").unlink(missing_ok=True)
+
+    def _completar_compactacion(self) -> None:
+        """
+        Bajo el bloqueo: termina una compactación que se interrumpió después de
+        registrar su intención (los segmentos nuevos ya estaban completos en
+        disco), para que los reportes no queden dos veces. Si el punto de
+        control de los contadores no llegó a la nueva generación, se recalculan
+        desde los segmentos sumando lo retirado a la retención
+        """
+        try:
+            intencion = json.loads(self._archivo_compactacion.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        self._publicar(intencion)
+        generacion = intencion["generacion"]
+        contadores, _, guardada = self._leer_contadores()
+        if guardada != generacion:
+            self._contadores = Counter({k: n for k, n in contadores.items() if k[0] == "retencion"})
+            self._contadores[tuple(intencion["retencion"])] += intencion["retirados"]
+            self._marca_contadores = None
+            self._generacion_contadores = generacion
+            self._guardar_contadores(fsync=True)
+        if self.generacion() != generacion:
+            self._escribir_generacion(generacion)
+        self._archivo_compactacion.unlink()
+
+    def mantener(self, corte: Optional[str], directorio_archivo: Path, archivar: bool = True) -> Dict[str, Any]:
+        """
+        Reescribe solo los segmentos con reportes que retirar o que conviene
+        fusionar; si no hay ninguno, no toca el almacén. Desde el primer tramo
+        reescrito, los segmentos se publican con números posteriores a los
+        actuales (los que no cambian, enlazados sin copiar) y luego se borran los
+        anteriores; mientras tanto las escrituras esperan el bloqueo y las
+        lecturas ignoran los segmentos que desaparecen. Antes de publicar se
+        registra la intención (compactacion.json): si el proceso se cae, el
+        próximo que tome el bloqueo la termina
+        """
+        with self._bloqueo:
+            segmentos = self._segmentos()
+            sin_cambios = {"retirados": 0, "archivados": 0, "segmentos_antes": len(segmentos),
+                           "segmentos_despues": len(segmentos)}
+            if not segmentos:
+                return sin_cambios
+            self._actualizar_contadores()
+            tramos = self._tramos(segmentos, corte)
+            primero = next((i for i, (_, reescribir) in enumerate(tramos) if reescribir), None)
+            if primero is None:
+                # Nada que retirar ni fusionar: ningún segmento se lee ni se copia
+                return sin_cambios
+            # Los tramos anteriores al primero que cambia conservan sus números
+            intactos = sum(len(grupo) for grupo, _ in tramos[:primero])
+            anteriores = segmentos[intactos:]
+            retirados: Counter = Counter()
+
+            def conservados(grupo: List[Path], archivo: ArchivoMensual) -> Iterator[Dict]:
+                for segmento in grupo:
+                    with open(segmento, "rb") as f:
+                        for _, linea in zip(range(self._entradas(segmento)), f):
+                            registro = json.loads(linea)
+                            if corte and (registro.get("fecha_reporte") or "") < corte:
+                                retirados.update(incrementos_contadores([registro]))
+                                if archivar:
+                                    archivo.agregar(registro)
+                                continue
+                            yield registro
+
+            numero = int(segmentos[-1].stem.split("-")[1]) + 1
+            nuevos: List[Path] = []
+            with ArchivoMensual(directorio_archivo) as archivo:
+                for grupo, reescribir in tramos[primero:]:
+                    if reescribir:
+                        escritos = self._escribir_segmentos(conservados(grupo, archivo), numero + len(nuevos))
+                    else:
+                        escritos = [self.directorio / f"seg-{numero + len(nuevos):06d}.jsonl"]
+                        for sufijo in (".jsonl", ".idx", ".min"):
+                            origen = grupo[0].with_suffix(sufijo)
+                            if origen.exists():
+                                self._enlazar(origen, escritos[0].with_suffix(sufijo + ".tmp"))
+                    nuevos.extend(escritos)
+                archivo.sincronizar()
+            cantidad = retirados[("total", "")]
+            if not nuevos:
+                # Todo se retiró: el segmento activo vuelve a empezar vacío
+                nuevos = [self.directorio / f"seg-{numero:06d}.jsonl"]
+
+            # Desde aquí la compactación queda registrada y siempre se termina:
+            # si el proceso se cae, la termina el próximo que tome el bloqueo
+            generacion = self.generacion() + 1
+            retencion = ("retencion", "archivados" if archivar else "eliminados")
+            intencion = {
+                "generacion": generacion,
+                "nuevos": [n.name for n in nuevos],
+                "anteriores": [a.name for a in anteriores],
+                "retencion": list(retencion),
+                "retirados": cantidad,
+            }
+            temporal = self._archivo_compactacion.with_suffix(".tmp")
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(intencion, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self._archivo_compactacion)
+            self._publicar(intencion)
+
+            self._contadores.subtract(retirados)
+            self._contadores[retencion] += cantidad
+            self._contadores = +self._contadores
+            self._marca_contadores = [int(nuevos[-1].stem.split("-")[1]), self._entradas(nuevos[-1])]
+            self._generacion_contadores = generacion
+            self._guardar_contadores(fsync=True)
+            self._escribir_generacion(generacion)
+            self._archivo_compactacion.unlink()
+            return {
+                "retirados": cantidad,
+                "archivados": cantidad if archivar else 0,
+                "segmentos_antes": len(segmentos),
+                "segmentos_despues": intactos + len(nuevos),
+            }
+
+    def contar(self) -> int:
+        return sum(self._entradas(s) for s in self._segmentos())
+
+    def importar(self, registros: Iterable[Dict]) -> int:
+        # Bajo el bloqueo: con varios workers solo uno importa
+        with self._bloqueo:
+            registros = list(registros)
+            if registros and self.vacio():
+                self._agregar(registros, fsync=True)
+                return len(registros)
+            return 0
+
+
+class AlmacenSQLite(AlmacenReportes):
+    _ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS reportes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reporte_id TEXT NOT NULL UNIQUE,
+            fecha_reporte TEXT NOT NULL,
+            tipo_error TEXT,
+            numero_radicado TEXT,
+            email_dominio TEXT,
+            datos TEXT NOT NULL,
+            cluster_id TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_reportes_fecha ON reportes (fecha_reporte, id);
+        CREATE INDEX IF NOT EXISTS idx_reportes_tipo ON reportes (tipo_error, fecha_reporte, id);
+        CREATE INDEX IF NOT EXISTS idx_reportes_dominio ON reportes (email_dominio, fecha_reporte, id);
+        CREATE INDEX IF NOT EXISTS idx_reportes_radicado ON reportes (numero_radicado);
+        CREATE INDEX IF NOT EXISTS idx_reportes_cluster ON reportes (cluster_id, fecha_reporte, id);
+        CREATE TABLE IF NOT EXISTS contadores (
+            dimension TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            PRIMARY KEY (dimension, clave)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            clave TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    # Recalcula los contadores desde la tabla (bases creadas antes de los contadores)
+    _RECONSTRUIR_CONTADORES = """
+        DELETE FROM contadores WHERE dimension != 'retencion';
+        INSERT INTO contadores SELECT 'total', '', count(*) FROM reportes;
+        INSERT INTO contadores SELECT 'tipo_error', coalesce(tipo_error, 'No especificado'), count(*)
+            FROM reportes GROUP BY 2;
+        INSERT INTO contadores SELECT 'dominio', coalesce(email_dominio, 'Desconocido'), count(*)
+            FROM reportes GROUP BY 2;
+        INSERT INTO contadores SELECT 'radicado', CASE WHEN numero_radicado IS NULL THEN 'sin' ELSE 'con' END, count(*)
+            FROM reportes GROUP BY 2;
+        INSERT INTO contadores SELECT 'dia', substr(fecha_reporte, 1, 10), count(*)
+            FROM reportes WHERE fecha_reporte != '' GROUP BY 2;
+        INSERT INTO contadores SELECT 'duplicados', '', count(*)
+            FROM reportes WHERE json_extract(datos, '$.duplicado_de') IS NOT NULL;
+        INSERT INTO contadores SELECT 'cluster', cluster_id, count(*)
+            FROM reportes WHERE json_extract(datos, '$.duplicado_de') IS NOT NULL GROUP BY 2;
+    """
+
+    def __init__(self, ruta: Path):
+        self.ruta = Path(ruta)
+        # Una conexión por hilo: en modo WAL las lecturas no bloquean a la escritura
+        self._local = threading.local()
+        self._conexiones: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False)
+            conexion.execute("PRAGMA busy_timeout = 30000")
+            self._local.conexion = conexion
+            with self._lock:
+                self._conexiones.append(conexion)
+        return conexion
+
+    def abrir(self) -> None:
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode = WAL")
+        columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(reportes)")}
+        if columnas and "cluster_id" not in columnas:
+            # Bases anteriores a la detección de duplicados: cada reporte es su propio cluster
+            try:
+                conexion.executescript(
+                    "BEGIN IMMEDIATE; ALTER TABLE reportes ADD COLUMN cluster_id TEXT; "
+                    "UPDATE reportes SET cluster_id = reporte_id; COMMIT;"
+                )
+            except sqlite3.OperationalError:
+                # Otro worker agregó la columna primero
+                conexion.rollback()
+        conexion.executescript(self._ESQUEMA)
+        total = conexion.execute("SELECT cantidad FROM contadores WHERE dimension = 'total'").fetchone()
+        if (total[0] if total else 0) != self.contar():
+            conexion.executescript(f"BEGIN IMMEDIATE; {self._RECONSTRUIR_CONTADORES} COMMIT;")
+
+    def cerrar(self) -> None:
+        with self._lock:
+            conexiones, self._conexiones = self._conexiones, []
+        for conexion in conexiones:
+            conexion.close()
+        self._local = threading.local()
+
+    @staticmethod
+    def _fila(registro: Dict) -> Tuple:
+        return (
+            registro["reporte_id"],
+            registro.get("fecha_reporte") or "",
+            registro.get("tipo_error"),
+            registro.get("numero_radicado") or None,
+            dominio_email(registro.get("email")),
+            json.dumps(registro, ensure_ascii=False),
+            registro.get("cluster_id") or registro["reporte_id"],
+        )
+
+    def agregar(self, registros: Iterable[Dict], fsync: bool = False, ignorar_duplicados: bool = False) -> None:
+        """Inserta el lote y actualiza los contadores en la misma transacción"""
+        conexion = self._conexion()
+        # FULL sincroniza el WAL en cada commit; NORMAL solo en los checkpoints
+        conexion.execute(f"PRAGMA synchronous = {'FULL' if fsync else 'NORMAL'}")
+        insertar = (
+            "INSERT INTO reportes (reporte_id, fecha_reporte, tipo_error, numero_radicado, "
+            "email_dominio, datos, cluster_id) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        with conexion:
+            if ignorar_duplicados:
+                insertados = [
+                    r for r in registros
+                    if conexion.execute(insertar.replace("INSERT", "INSERT OR IGNORE", 1), self._fila(r)).rowcount
+                ]
+            else:
+                insertados = list(registros)
+                conexion.executemany(insertar, [self._fila(r) for r in insertados])
+            conexion.executemany(
+                "INSERT INTO contadores (dimension, clave, cantidad) VALUES (?, ?, ?) "
+                "ON CONFLICT (dimension, clave) DO UPDATE SET cantidad = cantidad + excluded.cantidad",
+                [(d, c, n) for (d, c), n in incrementos_contadores(insertados).items()]
+            )
+
+    def importar(self, registros: Iterable[Dict]) -> int:
+        # INSERT OR IGNORE: si dos workers migran a la vez, reporte_id evita duplicados
+        registros = list(registros)
+        if registros and self.vacio():
+            self.agregar(registros, fsync=True, ignorar_duplicados=True)
+            return len(registros)
+        return 0
+
+    def recientes(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        filas = self._conexion().execute(
+            "SELECT datos FROM reportes ORDER BY fecha_reporte DESC, id DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        return [json.loads(datos) for (datos,) in filas]
+
+    def buscar(
+        self,
+        filtros: Dict[str, Any],
+        orden: str = "desc",
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Paginación por cursor (keyset) sobre (fecha_reporte, id): cada página
+        es un recorrido de índice que empieza donde terminó la anterior
+        """
+        condiciones: List[str] = []
+        parametros: List[Any] = []
+        if filtros.get("tipo_error"):
+            condiciones.append("tipo_error = ?")
+            parametros.append(filtros["tipo_error"])
+        if filtros.get("email_dominio"):
+            condiciones.append("email_dominio = ?")
+            parametros.append(filtros["email_dominio"].lower())
+        if filtros.get("numero_radicado"):
+            condiciones.append("numero_radicado = ?")
+            parametros.append(filtros["numero_radicado"])
+        if filtros.get("con_radicado") is not None:
+            condiciones.append("numero_radicado IS NOT NULL" if filtros["con_radicado"] else "numero_radicado IS NULL")
+        if filtros.get("cluster_id"):
+            condiciones.append("cluster_id = ?")
+            parametros.append(filtros["cluster_id"])
+        if filtros.get("desde"):
+            condiciones.append("fecha_reporte >= ?")
+            parametros.append(filtros["desde"])
+        if filtros.get("hasta"):
+            condiciones.append("fecha_reporte < ?")
+            parametros.append(filtros["hasta"])
+
+        descendente = orden == "desc"
+        if cursor:
+            valores = decodificar_cursor(cursor)
+            if len(valores) != 2:
+                raise ValueError("Cursor inválido")
+            fecha, identificador = valores
+            condiciones.append(f"(fecha_reporte, id) {'<' if descendente else '>'} (?, ?)")
+            parametros.extend([fecha, identificador])
+
+        direccion = "DESC" if descendente else "ASC"
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self._conexion().execute(
+            f"SELECT id, fecha_reporte, datos FROM reportes {where} "
+            f"ORDER BY fecha_reporte {direccion}, id {direccion} LIMIT ?",
+            (*parametros, limit + 1)
+        ).fetchall()
+
+        siguiente = None
+        if len(filas) > limit:
+            filas = filas[:limit]
+            siguiente = codificar_cursor([filas[-1][1], filas[-1][0]])
+        return [json.loads(datos) for _, _, datos in filas], siguiente
+
+    def todos(self) -> Iterator[Dict]:
+        cursor = self._conexion().execute("SELECT datos FROM reportes ORDER BY fecha_reporte, id")
+        for (datos,) in cursor:
+            yield json.loads(datos)
+
+    def generacion(self) -> int:
+        fila = self._conexion().execute("SELECT valor FROM meta WHERE clave = 'generacion'").fetchone()
+        return fila[0] if fila else 0
+
+    def mantener(
+        self,
+        corte: Optional[str],
+        directorio_archivo: Path,
+        archivar: bool = True,
+        lote: int = 5000
+    ) -> Dict[str, Any]:
+        """
+        Retira por lotes cortos (recorriendo idx_reportes_fecha) para no frenar a
+        las escrituras: cada lote se archiva y sincroniza antes de borrarlo. Si
+        se interrumpe entre ambos pasos, el lote puede quedar dos veces en el
+        archivo, nunca perderse. Al final libera el WAL y, si sobran páginas, VACUUM
+        """
+        conexion = self._conexion()
+        cantidad = 0
+        with ArchivoMensual(directorio_archivo) as archivo:
+            while corte:
+                filas = conexion.execute(
+                    "SELECT id, datos FROM reportes WHERE fecha_reporte < ? ORDER BY fecha_reporte, id LIMIT ?",
+                    (corte, lote)
+                ).fetchall()
+                if not filas:
+                    break
+                registros = [json.loads(datos) for _, datos in filas]
+                if archivar:
+                    for registro in registros:
+                        archivo.agregar(registro)
+                    archivo.sincronizar()
+                with conexion:
+                    conexion.executemany("DELETE FROM reportes WHERE id = ?", [(i,) for i, _ in filas])
+                    decrementos = [(d, c, -n) for (d, c), n in incrementos_contadores(registros).items()]
+                    decrementos.append(("retencion", "archivados" if archivar else "eliminados", len(filas)))
+                    conexion.executemany(
+                        "INSERT INTO contadores (dimension, clave, cantidad) VALUES (?, ?, ?) "
+                        "ON CONFLICT (dimension, clave) DO UPDATE SET cantidad = cantidad + excluded.cantidad",
+                        decrementos
+                    )
+                    conexion.execute("DELETE FROM contadores WHERE cantidad = 0")
+                    conexion.execute(
+                        "INSERT INTO meta (clave, valor) VALUES ('generacion', 1) "
+                        "ON CONFLICT (clave) DO UPDATE SET valor = valor + 1"
+                    )
+                cantidad += len(filas)
+
+        conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        paginas = conexion.execute("PRAGMA page_count").fetchone()[0]
+        libres = conexion.execute("PRAGMA freelist_count").fetchone()[0]
+        vacuum = False
+        if paginas and libres / paginas > 0.25:
+            try:
+                conexion.execute("VACUUM")
+                vacuum = True
+            except sqlite3.OperationalError:
+                # Otra conexión tiene una lectura abierta: se intentará en la próxima ejecución
+                pass
+        return {
+            "retirados": cantidad,
+            "archivados": cantidad if archivar else 0,
+            "paginas_libres": libres,
+            "vacuum": vacuum,
+        }
+
+    def obtener(self, reporte_ids: List[str]) -> List[Dict]:
+        if not reporte_ids:
+            return []
+        filas = self._conexion().execute(
+            f"SELECT reporte_id, datos FROM reportes WHERE reporte_id IN ({', '.join('?' * len(reporte_ids))})",
+            list(reporte_ids)
+        ).fetchall()
+        encontrados = dict(filas)
+        return [json.loads(encontrados[i]) for i in reporte_ids if i in encontrados]
+
+    def posteriores(self, marca: Any = None, limit: int = 1000) -> Tuple[List[Dict], Any]:
+        # Marca: último id leído; las escrituras en SQLite son serializadas y id solo crece
+        filas = self._conexion().execute(
+            "SELECT id, datos FROM reportes WHERE id > ? ORDER BY id LIMIT ?", (marca or 0, limit)
+        ).fetchall()
+        if not filas:
+            return [], marca
+        return [json.loads(datos) for _, datos in filas], filas[-1][0]
+
+    def contar(self) -> int:
+        return self._conexion().execute("SELECT count(*) FROM reportes").fetchone()[0]
+
+    def contadores(self, desde_dia: Optional[str] = None) -> Dict[Tuple[str, str], int]:
+        filas = self._conexion().execute(
+            "SELECT dimension, clave, cantidad FROM contadores WHERE dimension != 'dia' OR clave >= ?",
+            (desde_dia or "",)
+        ).fetchall()
+        return {(dimension, clave): cantidad for dimension, clave, cantidad in filas}
+
+    def vacio(self) -> bool:
+        return self._conexion().execute("SELECT 1 FROM reportes LIMIT 1").fetchone() is None
+
+
+def crear_almacen(backend: str, directorio: Path, max_bytes_segmento: int, ruta_sqlite: Path) -> AlmacenReportes:
+    if backend == "sqlite":
+        return AlmacenSQLite(ruta_sqlite)
+    if backend == "segmentos":
+        return AlmacenSegmentos(directorio, max_bytes_segmento=max_bytes_segmento)
+    raise ValueError(f"REPORTES_BACKEND inválido: {backend} (use sqlite o segmentos)")
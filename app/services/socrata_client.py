@@ -3,11 +3,17 @@ Cliente para Socrata API
 Consume datos del INVIMA vía Socrata Open Data API usando sodapy
 """
 from sodapy import Socrata
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional
 from app.core.config import settings
+from app.core.tracing import medir
+from app.services.query_stats import estadisticas_consultas
+from app.services.cassette import Cassette
 import asyncio
 from functools import wraps
 import unicodedata
+import threading
+import time
 from datetime import datetime
 
 def async_wrap(func):
@@ -36,26 +42,78 @@ class SocrataClient:
     }
 
     def __init__(self):
-        # Inicializar cliente Socrata
+        # El cliente HTTP (pool de conexiones de sodapy) se construye en abrir()
+        # o en el primer uso, no al importar el módulo
+        self._client = None
+        self._client_lock = threading.Lock()
+        
+        self.dataset_id = settings.SOCRATA_DATASET_ID
+        
+        # Grabación/reproducción de respuestas (SOCRATA_CASSETTE_MODO)
+        self.cassette = None
+        if settings.SOCRATA_CASSETTE_MODO:
+            self.cassette = Cassette(
+                settings.SOCRATA_CASSETTE_RUTA,
+                settings.SOCRATA_CASSETTE_MODO,
+                respetar_latencia=settings.SOCRATA_CASSETTE_LATENCIA
+            )
+    
+    def _crear_cliente(self) -> Socrata:
         # Si hay app_token, username y password, usar autenticación
+        dominio, session_adapter = self._parametros_dominio(settings.SOCRATA_DOMAIN)
         if settings.SOCRATA_APP_TOKEN:
-            self.client = Socrata(
-                settings.SOCRATA_DOMAIN,
+            return Socrata(
+                dominio,
                 settings.SOCRATA_APP_TOKEN,
                 username=settings.SOCRATA_USERNAME if settings.SOCRATA_USERNAME else None,
-                password=settings.SOCRATA_PASSWORD if settings.SOCRATA_PASSWORD else None
+                password=settings.SOCRATA_PASSWORD if settings.SOCRATA_PASSWORD else None,
+                session_adapter=session_adapter
             )
-        else:
-            # Cliente sin autenticación (solo datos públicos)
-            self.client = Socrata(settings.SOCRATA_DOMAIN, None)
-        
-        self.dataset_id = settings.SOCRATA_DATASET_ID
+        # Cliente sin autenticación (solo datos públicos)
+        return Socrata(dominio, None, session_adapter=session_adapter)
+    
+    @property
+    def client(self):
+        """Cliente Socrata, construido en el primer acceso si el lifespan no lo abrió"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._crear_cliente()
+        return self._client
+    
+    @client.setter
+    def client(self, cliente) -> None:
+        # Permite sustituirlo (servidor local en proceso, benchmarks)
+        self._client = cliente
     
-    def __del__(self):
-        """Cerrar cliente al destruir el objeto"""
-        if hasattr(self, 'client'):
-            self.client.close()
+    def abrir(self) -> None:
+        """Construye el cliente HTTP y carga el cassette (lo llama el lifespan)"""
+        self.client
+        if self.cassette is not None and self.cassette.modo == "reproducir":
+            self.cassette.cargar()
     
+    def cerrar(self) -> None:
+        """Cierra la sesión HTTP de forma determinista al apagar la aplicación"""
+        with self._client_lock:
+            cliente, self._client = self._client, None
+        if cliente is not None:
+            cliente.close()
+    
+    @staticmethod
+    def _parametros_dominio(dominio: str):
+        """
+        Permite SOCRATA_DOMAIN con esquema explícito (p. ej. http://localhost:8080
+        para el servidor local de socrata_local); sodapy usa https:// por defecto.
+        """
+        if dominio.startswith("http://"):
+            return dominio[len("http://"):].rstrip("/"), {
+                "prefix": "http://",
+                "adapter": HTTPAdapter()
+            }
+        if dominio.startswith("https://"):
+            return dominio[len("https://"):].rstrip("/"), None
+        return dominio, None
+
     @staticmethod
     def _clean_value(value: Optional[str]) -> Optional[str]:
         """
@@ -179,6 +237,32 @@ class SocrataClient:
         where = " AND ".join(where_clauses)
         return where
     
+    def _obtener(self, query_params: Dict, funcion=None):
+        """
+        Ejecuta la solicitud a Socrata (bloqueante), pasando por el cassette
+        cuando está activo el modo grabar o reproducir
+        """
+        if funcion is None:
+            def funcion():
+                return self.client.get(self.dataset_id, **query_params)
+        if self.cassette is not None:
+            return self.cassette.ejecutar(self.dataset_id, query_params, funcion)
+        return funcion()
+    
+    def obtener_pagina(self, limit: int, offset: int = 0) -> List[Dict]:
+        """
+        Página del dataset completo en orden estable (:id), de forma bloqueante;
+        la usa el snapshot del dataset
+        """
+        return self._obtener({"$limit": limit, "$offset": offset, "$order": ":id"})
+    
+    def obtener_metadata(self) -> Dict:
+        """Metadatos del dataset, de forma bloqueante"""
+        return self._obtener(
+            {"$metadata": True},
+            lambda: self.client.get_metadata(self.dataset_id)
+        )
+    
     async def query(
         self,
         select: Optional[str] = None,
@@ -212,10 +296,23 @@ class SocrataClient:
         
         # Ejecutar consulta de forma asíncrona
         loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            None,
-            lambda: self.client.get(self.dataset_id, **query_params)
-        )
+        detalle_traza = {k: str(v)[:200] for k, v in query_params.items()}
+        inicio = time.perf_counter()
+        error = None
+        try:
+            with medir("socrata", detalle_traza):
+                results = await loop.run_in_executor(
+                    None,
+                    lambda: self._obtener(query_params)
+                )
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # Agregar duración por huella de la consulta y registrar si es lenta
+            estadisticas_consultas.registrar(
+                query_params, (time.perf_counter() - inicio) * 1000, error
+            )
         
         return results
     
@@ -479,35 +576,26 @@ class SocrataClient:
         Obtiene metadatos del dataset
         """
         loop = asyncio.get_event_loop()
-        metadata = await loop.run_in_executor(
-            None,
-            lambda: self.client.get_metadata(self.dataset_id)
-        )
+        with medir("socrata", {"metadata": self.dataset_id}):
+            metadata = await loop.run_in_executor(None, self.obtener_metadata)
         return metadata
     
-    async def obtener_estadisticas_suit(
+    def where_estadisticas_suit(
         self,
         ano: Optional[str] = None,
         clase: Optional[str] = None,
-        palabra_clave: Optional[str] = None
-    ) -> Dict:
+        palabra_clave: Optional[str] = None,
+        solo_invima: bool = True
+    ) -> Optional[str]:
         """
-        HU-INVIMA-002: Estadísticas de trámites del INVIMA en el SUIT
-        Visualización de estadísticas para identificar tendencias y patrones
-        
-        Args:
-            ano: Filtrar por año
-            clase: Filtrar por clase de trámite
-            palabra_clave: Filtrar por palabra clave en nombre del trámite
-        
-        Returns:
-            Estadísticas por año, clase y categoría
+        WHERE de los filtros de HU-INVIMA-002 (año, clase y palabra clave), por
+        defecto solo sobre el INVIMA; None si no hay ninguna condición
         """
-        # Construir WHERE base (solo INVIMA)
-        where_clauses = [f"nombre_de_la_entidad = '{self.INVIMA_ENTITY_NAME}'"]
+        where_clauses = [f"nombre_de_la_entidad = '{self.INVIMA_ENTITY_NAME}'"] if solo_invima else []
         
         if ano:
-            where_clauses.append(f"a_o = '{ano}'")
+            ano_sanitizado = ano.replace("'", "''")
+            where_clauses.append(f"a_o = '{ano_sanitizado}'")
         
         if clase:
             clase_sanitizada = clase.replace("'", "''")
@@ -520,7 +608,27 @@ class SocrataClient:
                 f"upper(nombre_com_n) like '%{kw_sanitizada}%')"
             )
         
-        where = " AND ".join(where_clauses)
+        return " AND ".join(where_clauses) or None
+    
+    async def obtener_estadisticas_suit(
+        self,
+        ano: Optional[str] = None,
+        clase: Optional[str] = None,
+        palabra_clave: Optional[str] = None
+    ) -> Dict:
+        """
+        HU-INVIMA-002: Estadísticas de trámites del INVIMA en el SUIT
+        Visualización de estadísticas para identificar tendencias y patrones
+        
+        Args:
+            ano: Filtrar por año
+            clase: Filtrar por clase de trámite
+            palabra_clave: Filtrar por palabra clave en nombre del trámite
+        
+        Returns:
+            Estadísticas por año, clase y categoría
+        """
+        where = self.where_estadisticas_suit(ano, clase, palabra_clave)
         
         # 1. Estadísticas por año
         try:
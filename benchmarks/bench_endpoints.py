@@ -0,0 +1,370 @@
+"""
+Benchmark de endpoints de la API
+Ejecuta todas las rutas contra un dataset sintético o grabado servido en proceso
+por socrata_local (sin red), y verifica el criterio no funcional de HU-INVIMA-002
+(gráficos en menos de 5 segundos hasta 10.000 registros) y la línea base guardada.
+
+    python -m benchmarks.bench_endpoints                      # 10.000 y 100.000 filas
+    python -m benchmarks.bench_endpoints --filas 10000 --iteraciones 50 --concurrencia 16
+    python -m benchmarks.bench_endpoints --fixture datos/tramites.jsonl.gz
+    python -m benchmarks.bench_endpoints --cassette cassettes/socrata.jsonl.gz --perfil bench.prof
+    python -m benchmarks.bench_endpoints --actualizar-baseline
+
+Cada tamaño de dataset se mide en un subproceso para aislar el pico de memoria (RSS).
+La salida es 1 si alguna ruta responde fuera de 2xx, si se incumple el criterio o
+si hay regresiones frente a la línea base (benchmarks/baseline.json). La línea
+base guarda tiempos absolutos de la máquina donde se generó: se crea en cada
+máquina con --actualizar-baseline y no se versiona.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = Path(__file__).resolve().parent.parent
+BASELINE_POR_DEFECTO = RAIZ / "benchmarks" / "baseline.json"
+
+RUTA_CRITERIO = "estadisticas-suit"
+CRITERIO_MS = 5000
+CRITERIO_FILAS = 10000
+
+REPORTE_PRUEBA = {
+    "nombre": "Usuario Benchmark",
+    "email": "benchmark@example.com",
+    "tipo_error": "Prueba Sistema",
+    "descripcion": "Reporte generado por el benchmark de endpoints",
+    "numero_radicado": "BENCH001",
+}
+
+# nombre, método, ruta, plantilla de la ruta en FastAPI, parámetros y cuerpo.
+# /dashboard/metricas, /tramites/buscar, /tramites/detalle y /public/tablero no
+# están: consultan columnas (estado, fecha_radicacion, numero_radicado) que el
+# dataset SUIT no tiene, y responden 500 tanto en socrata_local como en Socrata
+RUTAS: List[Dict] = [
+    {"nombre": "raiz", "ruta": "/"},
+    {"nombre": "health", "ruta": "/health"},
+    {"nombre": "estadisticas-suit", "ruta": "/api/v1/dashboard/estadisticas-suit"},
+    {"nombre": "estadisticas-suit-filtrada", "ruta": "/api/v1/dashboard/estadisticas-suit",
+     "params": {"ano": "2020", "palabra_clave": "sanitario"}},
+    {"nombre": "estadisticas-suit-cubo", "ruta": "/api/v1/dashboard/estadisticas-suit/cubo"},
+    {"nombre": "estadisticas-suit-excel", "ruta": "/api/v1/dashboard/estadisticas-suit/export.xlsx"},
+    {"nombre": "estadisticas", "ruta": "/api/v1/dashboard/estadisticas"},
+    {"nombre": "tramites-suit", "ruta": "/api/v1/tramites/suit",
+     "params": {"texto": "registro", "categorias": ["medicamentos"], "limit": 20}},
+    {"nombre": "tramites-campos", "ruta": "/api/v1/tramites/campos"},
+    {"nombre": "version", "ruta": "/api/v1/public/version"},
+    {"nombre": "perfil", "ruta": "/api/v1/public/perfil"},
+    {"nombre": "datos-abiertos-json", "ruta": "/api/v1/public/datos-abiertos",
+     "params": {"formato": "json", "limit": 1000}},
+    {"nombre": "datos-abiertos-csv", "ruta": "/api/v1/public/datos-abiertos",
+     "params": {"formato": "csv", "limit": 1000}},
+    {"nombre": "datos-abiertos-completo", "ruta": "/api/v1/public/datos-abiertos/completo.csv",
+     "plantilla": "/api/v1/public/datos-abiertos/completo.{formato}"},
+    {"nombre": "exportaciones-enviar", "metodo": "POST", "ruta": "/api/v1/public/exportaciones",
+     "json": {"formato": "csv", "limite": 1000}},
+    {"nombre": "reportes-crear", "metodo": "POST", "ruta": "/api/v1/reportes/crear", "json": REPORTE_PRUEBA},
+    {"nombre": "reportes-crear-lote", "metodo": "POST", "ruta": "/api/v1/reportes/crear-lote",
+     "json": [REPORTE_PRUEBA] * 10},
+    {"nombre": "reportes-listar", "ruta": "/api/v1/reportes/listar"},
+    {"nombre": "reportes-estadisticas", "ruta": "/api/v1/reportes/estadisticas"},
+    {"nombre": "reportes-exportar", "ruta": "/api/v1/reportes/exportar", "params": {"formato": "csv"}},
+    {"nombre": "admin-consultas-lentas", "ruta": "/api/v1/admin/consultas-lentas"},
+    {"nombre": "admin-arranque", "ruta": "/api/v1/admin/arranque"},
+]
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+# ---------------------------------------------------------------------------
+# Medición (se ejecuta en el subproceso)
+# ---------------------------------------------------------------------------
+
+async def _solicitar(cliente, ruta: Dict):
+    return await cliente.request(
+        ruta.get("metodo", "GET"), ruta["ruta"], params=ruta.get("params"), json=ruta.get("json")
+    )
+
+
+async def _medir_ruta(cliente, ruta: Dict, iteraciones: int, concurrencia: int) -> Dict:
+    await _solicitar(cliente, ruta)  # calentamiento
+
+    # Latencia: solicitudes secuenciales
+    latencias = []
+    estados: Dict[int, int] = {}
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        respuesta = await _solicitar(cliente, ruta)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+
+    # Rendimiento: `concurrencia` clientes simultáneos
+    pendientes = iteraciones * concurrencia
+    latencias_carga: List[float] = []
+
+    async def cliente_concurrente():
+        nonlocal pendientes
+        while pendientes > 0:
+            pendientes -= 1
+            inicio = time.perf_counter()
+            respuesta = await _solicitar(cliente, ruta)
+            latencias_carga.append((time.perf_counter() - inicio) * 1000)
+            estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+
+    inicio_carga = time.perf_counter()
+    await asyncio.gather(*(cliente_concurrente() for _ in range(concurrencia)))
+    duracion_carga = time.perf_counter() - inicio_carga
+
+    return {
+        "p50_ms": round(percentil(latencias, 50), 2),
+        "p95_ms": round(percentil(latencias, 95), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+        "carga_p95_ms": round(percentil(latencias_carga, 95), 2),
+        "rps": round(len(latencias_carga) / duracion_carga, 2) if duracion_carga else 0.0,
+        "estados": {str(k): v for k, v in sorted(estados.items())},
+    }
+
+
+def medir_dataset(
+    filas: int,
+    fixture: Optional[str],
+    iteraciones: int,
+    concurrencia: int,
+    latencia_ms: float,
+    solo: Optional[List[str]] = None,
+    cassette: Optional[str] = None,
+    perfil: Optional[str] = None,
+) -> Dict:
+    """
+    Mide todas las rutas con el backend apuntando a un dataset en proceso o,
+    con `cassette`, reproduciendo respuestas reales grabadas
+    """
+    import httpx
+
+    # Los reportes y logs del benchmark se escriben en un directorio temporal
+    sys.path.insert(0, str(RAIZ))
+    os.chdir(tempfile.mkdtemp(prefix="bench_invima_"))
+    # Como en producción (gunicorn.conf.py): el snapshot activado
+    os.environ.setdefault("SNAPSHOT_HABILITADO", "true")
+
+    inicio_import = time.perf_counter()
+    from app.main import app
+    import_ms = (time.perf_counter() - inicio_import) * 1000
+
+    from fastapi.routing import APIRoute
+    from app.core.config import settings
+    from app.core.recursos import recursos
+    from app.services.socrata_client import socrata_client
+    from socrata_local import ClienteLocal, MotorSoQL, obtener_filas
+
+    if cassette:
+        from app.services.cassette import Cassette
+        datos = []
+        socrata_client.cassette = Cassette(cassette, "reproducir", respetar_latencia=latencia_ms > 0)
+    else:
+        datos = obtener_filas(fixture, filas)
+        socrata_client.client = ClienteLocal(MotorSoQL(datos), settings.SOCRATA_DATASET_ID, latencia_ms)
+
+    rutas = [r for r in RUTAS if not solo or r["nombre"] in solo]
+    cubiertas = {r.get("plantilla", r["ruta"]) for r in RUTAS}
+    sin_cubrir = sorted(
+        r.path for r in app.routes if isinstance(r, APIRoute) and r.path not in cubiertas
+    )
+
+    arranque: Dict = {}
+
+    async def medir_todas():
+        # El lifespan abre los recursos (clientes, almacenes) como en producción
+        inicio_arranque = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            arranque["arranque_ms"] = round((time.perf_counter() - inicio_arranque) * 1000, 1)
+            arranque["recursos_ms"] = recursos.estado()["recursos_ms"]
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=None) as cliente:
+                return {r["nombre"]: await _medir_ruta(cliente, r, iteraciones, concurrencia) for r in rutas}
+
+    if perfil:
+        import cProfile
+        perfilador = cProfile.Profile()
+        resultados = perfilador.runcall(asyncio.run, medir_todas())
+        perfilador.dump_stats(perfil)
+    else:
+        resultados = asyncio.run(medir_todas())
+    # ru_maxrss está en KB en Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "filas": len(datos),
+        "import_ms": round(import_ms, 1),
+        **arranque,
+        "rss_pico_mb": round(rss_mb, 1),
+        "rutas": resultados,
+        "rutas_sin_cubrir": sin_cubrir,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Orquestación, criterio y línea base
+# ---------------------------------------------------------------------------
+
+def _ejecutar_subproceso(filas: int, args) -> Dict:
+    comando = [
+        sys.executable, "-m", "benchmarks.bench_endpoints", "--_hijo", str(filas),
+        "--iteraciones", str(args.iteraciones), "--concurrencia", str(args.concurrencia),
+        "--latencia-ms", str(args.latencia_ms),
+    ]
+    if args.fixture:
+        comando += ["--fixture", str(Path(args.fixture).resolve())]
+    if args.cassette:
+        comando += ["--cassette", str(Path(args.cassette).resolve())]
+    if args.perfil:
+        comando += ["--perfil", str(Path(args.perfil).resolve())]
+    if args.rutas:
+        comando += ["--rutas", *args.rutas]
+    salida = subprocess.run(comando, cwd=RAIZ, capture_output=True, text=True)
+    if salida.returncode != 0:
+        sys.stderr.write(salida.stderr)
+        raise SystemExit(f"Falló la medición con {filas} filas")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _imprimir(resultado: Dict) -> None:
+    print(f"\n== {resultado['filas']:,} filas | import {resultado['import_ms']:.0f} ms | "
+          f"arranque {resultado['arranque_ms']:.0f} ms | RSS pico {resultado['rss_pico_mb']:.0f} MB ==")
+    if resultado.get("recursos_ms"):
+        print("Recursos: " + ", ".join(f"{n} {ms:.0f} ms" for n, ms in resultado["recursos_ms"].items()))
+    print(f"{'ruta':32} {'p50':>9} {'p95':>9} {'p99':>9} {'p95 carga':>10} {'req/s':>9}  estados")
+    for nombre, r in resultado["rutas"].items():
+        print(f"{nombre:32} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{r['carga_p95_ms']:>10.1f} {r['rps']:>9.1f}  {r['estados']}")
+    if resultado["rutas_sin_cubrir"]:
+        print("Rutas sin cubrir por el benchmark: " + ", ".join(resultado["rutas_sin_cubrir"]))
+
+
+def rutas_con_error(resultados: Dict[str, Dict]) -> List[str]:
+    """Rutas con respuestas fuera de 2xx: sus tiempos miden páginas de error, no el endpoint"""
+    return [
+        f"[{clave} filas] {nombre} respondió {ruta['estados']}"
+        for clave, resultado in resultados.items()
+        for nombre, ruta in resultado["rutas"].items()
+        if any(not estado.startswith("2") for estado in ruta["estados"])
+    ]
+
+
+def verificar_criterio(resultados: Dict[str, Dict]) -> List[str]:
+    """HU-INVIMA-002: estadísticas en menos de 5 s hasta 10.000 registros"""
+    fallos = []
+    for resultado in resultados.values():
+        ruta = resultado["rutas"].get(RUTA_CRITERIO)
+        if ruta is None or resultado["filas"] > CRITERIO_FILAS:
+            continue
+        if ruta["p95_ms"] >= CRITERIO_MS:
+            fallos.append(
+                f"{RUTA_CRITERIO} con {resultado['filas']:,} filas: p95 {ruta['p95_ms']:.0f} ms >= {CRITERIO_MS} ms"
+            )
+    return fallos
+
+
+def comparar_baseline(resultados: Dict[str, Dict], baseline: Dict, tolerancia: float, margen_ms: float) -> List[str]:
+    """Regresiones de p95, req/s, RSS y tiempos de import y arranque frente a la línea base"""
+    regresiones = []
+    for clave, actual in resultados.items():
+        base = baseline.get(clave)
+        if not base:
+            continue
+        for metrica in ("rss_pico_mb", "import_ms", "arranque_ms"):
+            if metrica in base and actual[metrica] > base[metrica] * (1 + tolerancia) + (margen_ms if metrica.endswith("_ms") else 0):
+                regresiones.append(f"[{clave} filas] {metrica}: {actual[metrica]} > {base[metrica]}")
+        for nombre, ruta in actual["rutas"].items():
+            ruta_base = base["rutas"].get(nombre)
+            if not ruta_base:
+                continue
+            if ruta["p95_ms"] > ruta_base["p95_ms"] * (1 + tolerancia) + margen_ms:
+                regresiones.append(
+                    f"[{clave} filas] {nombre} p95: {ruta['p95_ms']:.1f} ms > {ruta_base['p95_ms']:.1f} ms"
+                )
+            if ruta["rps"] < ruta_base["rps"] * (1 - tolerancia):
+                regresiones.append(
+                    f"[{clave} filas] {nombre} req/s: {ruta['rps']:.1f} < {ruta_base['rps']:.1f}"
+                )
+    return regresiones
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints sin red")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10000, 100000],
+                        help="Tamaños de dataset sintético a medir")
+    parser.add_argument("--fixture", help="Dataset grabado (.json, .jsonl, .csv, opcionalmente .gz) en lugar del sintético")
+    parser.add_argument("--cassette", help="Reproducir respuestas reales grabadas (SOCRATA_CASSETTE_MODO=grabar)")
+    parser.add_argument("--perfil", help="Guardar un perfil cProfile de la medición en este archivo")
+    parser.add_argument("--iteraciones", type=int, default=20, help="Solicitudes secuenciales por ruta")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Clientes simultáneos en la prueba de carga")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia simulada por consulta a Socrata")
+    parser.add_argument("--rutas", nargs="+", help="Medir solo estas rutas (por nombre)")
+    parser.add_argument("--baseline", default=str(BASELINE_POR_DEFECTO))
+    parser.add_argument("--actualizar-baseline", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Degradación relativa permitida (0.25 = 25%%)")
+    parser.add_argument("--margen-ms", type=float, default=5.0, help="Degradación absoluta ignorada por ruido")
+    parser.add_argument("--salida", help="Guardar los resultados en este archivo JSON")
+    parser.add_argument("--_hijo", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._hijo is not None:
+        resultado = medir_dataset(
+            args._hijo, args.fixture, args.iteraciones, args.concurrencia, args.latencia_ms,
+            args.rutas, args.cassette, args.perfil
+        )
+        print(json.dumps(resultado))
+        return
+
+    grabado = args.fixture or args.cassette
+    tamanos = [0] if grabado else args.filas
+    resultados: Dict[str, Dict] = {}
+    for filas in tamanos:
+        resultado = _ejecutar_subproceso(filas, args)
+        clave = f"grabado:{Path(grabado).name}" if grabado else str(filas)
+        resultados[clave] = resultado
+        _imprimir(resultado)
+
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+
+    errores = rutas_con_error(resultados)
+    fallos = errores + verificar_criterio(resultados)
+    ruta_baseline = Path(args.baseline)
+    if args.actualizar_baseline and errores:
+        print("\nNo se actualiza la línea base: hay rutas con errores")
+    elif args.actualizar_baseline:
+        baseline = json.loads(ruta_baseline.read_text(encoding="utf-8")) if ruta_baseline.exists() else {}
+        baseline.update(resultados)
+        ruta_baseline.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"\nLínea base actualizada en {ruta_baseline}")
+    elif ruta_baseline.exists():
+        baseline = json.loads(ruta_baseline.read_text(encoding="utf-8"))
+        fallos += comparar_baseline(resultados, baseline, args.tolerancia, args.margen_ms)
+    else:
+        print(f"\nSin línea base en {ruta_baseline}; use --actualizar-baseline para crearla")
+
+    if fallos:
+        print("\n❌ Benchmark fallido:")
+        for fallo in fallos:
+            print(f"   - {fallo}")
+        raise SystemExit(1)
+    print("\n✅ Criterio <5 s (10.000 registros) cumplido, sin errores y sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark de render de las páginas de Streamlit
+Ejecuta Estadísticas y Tablero Público con streamlit.testing (AppTest) contra el
+backend real servido por uvicorn en un hilo, con el dataset sintético de
+socrata_local (sin red), y mide cuánto tarda cada rerun del script:
+
+    frio      primera visita, sin figuras en caché (datos ya descargados)
+    cache     rerun sin cambios en los datos (un botón, un expander)
+    filtro    cambio de año: datos nuevos, figuras nuevas
+    regreso   vuelta al filtro anterior: datos y figuras ya en caché
+
+    python -m benchmarks.bench_paginas
+    python -m benchmarks.bench_paginas --filas 100000 --iteraciones 20 --paginas Estadisticas
+"""
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_endpoints import percentil
+
+RAIZ = Path(__file__).resolve().parent.parent
+STREAMLIT_APP = RAIZ / "streamlit_app"
+PAGINAS = ["Estadisticas", "Tablero_Publico"]
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_backend(filas: int):
+    """FastAPI con el dataset sintético en un hilo; devuelve el servidor de uvicorn"""
+    import uvicorn
+
+    sys.path.insert(0, str(RAIZ))
+    os.chdir(tempfile.mkdtemp(prefix="bench_paginas_"))
+    from app.main import app
+    from app.core.config import settings
+    from app.services.socrata_client import socrata_client
+    from socrata_local import ClienteLocal, MotorSoQL, obtener_filas
+
+    socrata_client.client = ClienteLocal(MotorSoQL(obtener_filas(None, filas)), settings.SOCRATA_DATASET_ID)
+    puerto = _puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    # cliente_api lee la URL al importarse
+    os.environ["FASTAPI_URL"] = f"http://127.0.0.1:{puerto}"
+    return servidor, hilo
+
+
+def _ejecutar(prueba) -> float:
+    inicio = time.perf_counter()
+    prueba.run(timeout=60)
+    ms = (time.perf_counter() - inicio) * 1000
+    if prueba.exception:
+        raise SystemExit(f"La página falló: {prueba.exception[0].value}")
+    return ms
+
+
+def medir_pagina(pagina: str, iteraciones: int) -> Dict[str, Dict]:
+    from streamlit.testing.v1 import AppTest
+    import figuras
+
+    tiempos: Dict[str, List[float]] = {"frio": [], "cache": [], "filtro": [], "regreso": []}
+    prueba = AppTest.from_file(str(STREAMLIT_APP / "pages" / f"{pagina}.py"), default_timeout=60)
+    _ejecutar(prueba)  # calentamiento: descarga el cubo y la versión del dataset
+    anos = [a for a in prueba.sidebar.selectbox[0].options if a != "Todos"]
+    if not prueba.get("plotly_chart"):
+        raise SystemExit(f"{pagina} no dibujó ningún gráfico: ¿responde el backend?")
+    for i in range(iteraciones):
+        figuras._figura.clear()
+        tiempos["frio"].append(_ejecutar(prueba))
+        tiempos["cache"].append(_ejecutar(prueba))
+        prueba.sidebar.selectbox[0].set_value(anos[i % len(anos)])
+        tiempos["filtro"].append(_ejecutar(prueba))
+        prueba.sidebar.selectbox[0].set_value("Todos")
+        tiempos["regreso"].append(_ejecutar(prueba))
+    return {
+        escenario: {"p50_ms": round(percentil(valores, 50), 1), "p95_ms": round(percentil(valores, 95), 1)}
+        for escenario, valores in tiempos.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de render de páginas de Streamlit")
+    parser.add_argument("--filas", type=int, default=10000, help="Tamaño del dataset sintético")
+    parser.add_argument("--iteraciones", type=int, default=10, help="Repeticiones de cada escenario")
+    parser.add_argument("--paginas", nargs="+", default=PAGINAS, choices=PAGINAS)
+    parser.add_argument("--salida", help="Guardar los resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    servidor, hilo = iniciar_backend(args.filas)
+    sys.path.insert(0, str(STREAMLIT_APP))
+    try:
+        resultados = {pagina: medir_pagina(pagina, args.iteraciones) for pagina in args.paginas}
+    finally:
+        # Se espera el apagado para que el lifespan cierre los recursos
+        servidor.should_exit = True
+        hilo.join()
+
+    print(f"\n== Render de páginas | {args.filas:,} filas | {args.iteraciones} iteraciones ==")
+    print(f"{'página':18} {'escenario':10} {'p50':>9} {'p95':>9}")
+    for pagina, escenarios in resultados.items():
+        for escenario, r in escenarios.items():
+            print(f"{pagina:18} {escenario:10} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
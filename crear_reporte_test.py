@@ -6,15 +6,19 @@ from datetime import datetime
 
 API_URL = "http://localhost:8000"
 
-def crear_reporte_prueba(numero):
-    """Crea un reporte de prueba"""
-    reporte = {
+def reporte_prueba(numero):
+    """Datos de un reporte de prueba"""
+    return {
         "nombre": f"Usuario Test {numero}",
         "email": f"test{numero}@example.com",
         "tipo_error": ["Prueba Sistema", "Error de Sistema", "Información Incorrecta"][numero % 3],
         "descripcion": f"Reporte de prueba número {numero} - {datetime.now().strftime('%H:%M:%S')}",
         "numero_radicado": f"TEST{numero:03d}" if numero % 2 == 0 else None
     }
+
+def crear_reporte_prueba(numero):
+    """Crea un reporte de prueba"""
+    reporte = reporte_prueba(numero)
     
     try:
         response = requests.post(
@@ -35,19 +39,44 @@ def crear_reporte_prueba(numero):
         print(f"❌ Error: {str(e)}")
         return False
 
+def crear_lote_prueba(cantidad):
+    """Crea todos los reportes con una sola solicitud a /crear-lote"""
+    try:
+        response = requests.post(
+            f"{API_URL}/api/v1/reportes/crear-lote",
+            json=[reporte_prueba(i) for i in range(1, cantidad + 1)],
+            timeout=60
+        )
+        response.raise_for_status()
+        data = response.json()
+        print(f"✅ {data['message']}")
+        for resultado in data["resultados"]:
+            if not resultado["success"]:
+                print(f"❌ Error en reporte {resultado['indice'] + 1}: {resultado['errores']}")
+        return data["rechazados"] == 0
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return False
+
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1:
-        cantidad = int(sys.argv[1])
+    # Uso: python crear_reporte_test.py [cantidad] [--lote]
+    lote = "--lote" in sys.argv
+    argumentos = [a for a in sys.argv[1:] if a != "--lote"]
+    if argumentos:
+        cantidad = int(argumentos[0])
     else:
         cantidad = 1
     
     print(f"Creando {cantidad} reporte(s) de prueba...")
     print()
     
-    for i in range(1, cantidad + 1):
-        crear_reporte_prueba(i)
+    if lote:
+        crear_lote_prueba(cantidad)
+    else:
+        for i in range(1, cantidad + 1):
+            crear_reporte_prueba(i)
     
     print()
     print(f"✅ Proceso completado. Creados {cantidad} reportes.")
@@ -0,0 +1,46 @@
+"""
+Configuración de Gunicorn para producción
+N workers de uvicorn pre-forkeados. Con preload_app el proceso maestro importa la
+aplicación una vez (el import no abre recursos) y, antes de crear los workers,
+descarga el snapshot del dataset; cada worker lo mapea en memoria en su lifespan,
+de modo que los datos de solo lectura se comparten entre procesos.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+"""
+import multiprocessing
+import os
+
+# Producción: snapshot activado salvo que se desactive explícitamente (los workers
+# heredan el entorno del maestro)
+os.environ.setdefault("SNAPSHOT_HABILITADO", "true")
+
+bind = f"{os.getenv('FASTAPI_HOST', '0.0.0.0')}:{os.getenv('FASTAPI_PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Reciclar workers de forma escalonada para acotar fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    """Descarga el snapshot una sola vez, antes de crear los workers"""
+    from app.core.config import settings
+    from app.services.dataset_snapshot import dataset_snapshot
+    from app.services.socrata_client import socrata_client
+
+    if not settings.SNAPSHOT_HABILITADO:
+        return
+    try:
+        ruta = dataset_snapshot.asegurar()
+        server.log.info("Snapshot del dataset listo: %s", ruta)
+    except Exception as e:
+        server.log.warning("Sin snapshot del dataset al arrancar: %s", e)
+    finally:
+        # La descarga abrió la sesión HTTP en el maestro: cerrarla antes del fork
+        # para que cada worker cree la suya en lugar de compartir sus sockets
+        socrata_client.cerrar()
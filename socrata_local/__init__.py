@@ -0,0 +1,8 @@
+"""
+Servidor Socrata local
+Sustituto offline de www.datos.gov.co que implementa el subconjunto de SoQL
+usado por app.services.socrata_client
+"""
+from socrata_local.soql import MotorSoQL, SoQLError
+from socrata_local.fixtures import cargar_fixture, generar_filas, obtener_filas
+from socrata_local.cliente import ClienteLocal
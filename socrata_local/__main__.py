@@ -0,0 +1,46 @@
+"""
+Ejecuta el servidor Socrata local
+
+    python -m socrata_local --puerto 8080 --filas 10000
+    python -m socrata_local --fixture datos/tramites.jsonl.gz --latencia-ms 150 --tasa-error 0.05
+
+Luego apunte el backend con SOCRATA_DOMAIN=http://localhost:8080
+"""
+import argparse
+
+import uvicorn
+
+from socrata_local.fixtures import obtener_filas
+from socrata_local.server import crear_app
+from socrata_local.soql import MotorSoQL
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor SODA local para desarrollo y pruebas de carga")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--dataset", default="48fq-mxnm", help="Identificador del dataset publicado")
+    parser.add_argument("--fixture", help="Archivo .json, .jsonl o .csv (admite .gz); sin él se generan filas sintéticas")
+    parser.add_argument("--filas", type=int, default=10000, help="Filas sintéticas cuando no hay fixture")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Retardo fijo por respuesta")
+    parser.add_argument("--variacion-ms", type=float, default=0.0, help="Retardo aleatorio adicional máximo")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de responder 500 (0-1)")
+    args = parser.parse_args()
+
+    filas = obtener_filas(args.fixture, args.filas, args.semilla)
+    motor = MotorSoQL(filas)
+    app = crear_app(
+        motor,
+        dataset_id=args.dataset,
+        latencia_ms=args.latencia_ms,
+        variacion_ms=args.variacion_ms,
+        tasa_error=args.tasa_error,
+        semilla=args.semilla,
+    )
+    print(f"Socrata local: {len(filas):,} filas en http://{args.host}:{args.puerto}/resource/{args.dataset}.json")
+    uvicorn.run(app, host=args.host, port=args.puerto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Cliente Socrata en proceso
+Implementa la interfaz de sodapy.Socrata que usa SocrataClient (get,
+get_metadata, close) directamente sobre un MotorSoQL, sin HTTP
+"""
+from typing import Dict, List
+import time
+
+from socrata_local.soql import MotorSoQL
+
+_PARAMETROS_SODAPY = {"select", "where", "group", "order", "limit", "offset"}
+
+
+class ClienteLocal:
+    def __init__(self, motor: MotorSoQL, dataset_id: str = "48fq-mxnm", latencia_ms: float = 0.0):
+        self.motor = motor
+        self.dataset_id = dataset_id
+        # Retardo simulado de red por consulta (bloquea el hilo, como sodapy)
+        self.latencia_ms = latencia_ms
+
+    def get(self, dataset_identifier: str, **kwargs) -> List[Dict]:
+        if dataset_identifier != self.dataset_id:
+            raise ValueError(f"Dataset {dataset_identifier} no existe")
+        # sodapy acepta select=..., where=... además de los nombres $select, $where
+        parametros = {}
+        for clave, valor in kwargs.items():
+            if clave in _PARAMETROS_SODAPY:
+                clave = f"${clave}"
+            parametros[clave] = valor
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        return self.motor.consultar(parametros)
+
+    def get_metadata(self, dataset_identifier: str) -> Dict:
+        return {
+            "id": dataset_identifier,
+            "rowsUpdatedAt": self.motor.version,
+            "columns": [{"fieldName": c, "dataTypeName": "text"} for c in sorted(self.motor.columnas)],
+        }
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,116 @@
+"""
+Datos de prueba para el servidor Socrata local
+Carga un dataset desde archivo (JSON, JSON Lines o CSV, opcionalmente .gz) o
+genera filas sintéticas con la misma forma que el catálogo SUIT del INVIMA
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import csv
+import gzip
+import io
+import json
+import random
+
+ENTIDAD_INVIMA = "INSTITUTO NACIONAL DE VIGILANCIA DE MEDICAMENTOS Y ALIMENTOS"
+OTRAS_ENTIDADES = [
+    "MINISTERIO DE SALUD Y PROTECCION SOCIAL",
+    "INSTITUTO COLOMBIANO AGROPECUARIO",
+    "SUPERINTENDENCIA NACIONAL DE SALUD",
+]
+
+_ACCIONES = [
+    "Registro sanitario", "Renovación del registro sanitario", "Modificación del registro sanitario",
+    "Permiso sanitario", "Notificación sanitaria", "Certificación", "Licencia sanitaria",
+    "Autorización de importación", "Concepto sanitario", "Inscripción",
+]
+_OBJETOS = [
+    "de medicamentos de síntesis química", "de medicamentos biológicos", "de productos farmacéuticos",
+    "de alimentos procesados", "de bebidas alcohólicas", "de suplementos nutricionales",
+    "de productos cosméticos", "de productos de higiene personal", "de perfumes y maquillaje",
+    "de dispositivos médicos", "de equipo médico biomédico", "de reactivos de diagnóstico in vitro",
+    "de buenas prácticas de manufactura BPM", "de visita de inspección", "de auditoría sanitaria",
+]
+_CLASES = ["Trámite", "Otro procedimiento administrativo", "Consulta de acceso a información"]
+_RESULTADOS = ["Resolución", "Certificado", "Registro", "Concepto técnico", "Oficio"]
+_ACCIONES_CONDICION = ["Presentar", "Radicar", "Pagar", "Adjuntar", "Diligenciar"]
+_DOCUMENTOS = [
+    ("Formulario de solicitud", "Formulario"), ("Certificado de existencia", "Certificado"),
+    ("Estudios de estabilidad", "Documento técnico"), ("Comprobante de pago", "Soporte"),
+    ("Ficha técnica del producto", "Documento técnico"),
+]
+
+
+def generar_filas(cantidad: int, semilla: int = 42, proporcion_invima: float = 0.9) -> List[Dict]:
+    """
+    Genera `cantidad` filas sintéticas: cada trámite (n_mero_unico) aporta
+    varias filas, una por paso y condición, como en el dataset real
+    """
+    aleatorio = random.Random(semilla)
+    filas: List[Dict] = []
+    numero = 10000
+    while len(filas) < cantidad:
+        numero += 1
+        accion = aleatorio.choice(_ACCIONES)
+        objeto = aleatorio.choice(_OBJETOS)
+        entidad = ENTIDAD_INVIMA if aleatorio.random() < proporcion_invima else aleatorio.choice(OTRAS_ENTIDADES)
+        ano = str(aleatorio.randint(2012, 2024))
+        fecha = f"{aleatorio.randint(1, 28):02d}/{aleatorio.randint(1, 12):02d}/{ano}"
+        base = {
+            "nombre_de_la_entidad": entidad,
+            "n_mero_unico": str(numero),
+            "nombre_del_tr_mite_u_otro": f"{accion} {objeto}".upper(),
+            "nombre_com_n": f"{accion} {objeto}",
+            "prop_sito_del_tr_mite_u_otro": f"Obtener {accion.lower()} {objeto} ante la entidad",
+            "nombre_resultado": aleatorio.choice(_RESULTADOS),
+            "clase": aleatorio.choice(_CLASES),
+            "fecha_de_actualizaci_n": fecha,
+            "a_o": ano,
+        }
+        for paso in range(1, aleatorio.randint(2, 5) + 1):
+            for condicion in range(1, aleatorio.randint(1, 3) + 1):
+                documento, tipo = aleatorio.choice(_DOCUMENTOS)
+                fila = dict(base)
+                fila.update({
+                    "orden_paso": str(paso),
+                    "descripcion_paso": f"Paso {paso}: {aleatorio.choice(_ACCIONES_CONDICION).lower()} la documentación",
+                    "orden_condicion": str(condicion),
+                    "tipo_accion_condicion": aleatorio.choice(_ACCIONES_CONDICION),
+                    "documento_nombre": documento,
+                    "documento_tipo": tipo,
+                })
+                if aleatorio.random() < 0.3:
+                    fila["descripcion_del_pago"] = f"Tarifa {aleatorio.randint(1, 900) * 1000} COP"
+                filas.append(fila)
+                if len(filas) >= cantidad:
+                    return filas
+    return filas
+
+
+def _abrir_texto(ruta: Path) -> io.TextIOBase:
+    if ruta.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(ruta, "rb"), encoding="utf-8")
+    return open(ruta, "r", encoding="utf-8")
+
+
+def cargar_fixture(ruta: str) -> List[Dict]:
+    """Carga filas desde .json (lista), .jsonl/.ndjson o .csv, con o sin .gz"""
+    archivo = Path(ruta)
+    extension = archivo.suffixes[-2] if archivo.suffix == ".gz" and len(archivo.suffixes) > 1 else archivo.suffix
+    with _abrir_texto(archivo) as f:
+        if extension == ".json":
+            filas = json.load(f)
+        elif extension in (".jsonl", ".ndjson"):
+            filas = [json.loads(linea) for linea in f if linea.strip()]
+        elif extension == ".csv":
+            filas = list(csv.DictReader(f))
+        else:
+            raise ValueError(f"Formato de fixture no soportado: {archivo.name}")
+    # Socrata omite los campos nulos
+    return [{k: v for k, v in fila.items() if v not in (None, "")} for fila in filas]
+
+
+def obtener_filas(fixture: Optional[str] = None, filas_sinteticas: int = 10000, semilla: int = 42) -> List[Dict]:
+    """Filas del fixture indicado o, si no hay, filas sintéticas"""
+    if fixture:
+        return cargar_fixture(fixture)
+    return generar_filas(filas_sinteticas, semilla=semilla)
@@ -0,0 +1,84 @@
+"""
+Servidor SODA local
+Expone /resource/{dataset}.json y /api/views/{dataset}.json sobre un MotorSoQL,
+con latencia y errores inyectables para pruebas de carga y desarrollo sin red
+"""
+from typing import Optional
+import asyncio
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from socrata_local.soql import MotorSoQL, SoQLError
+
+
+def crear_app(
+    motor: MotorSoQL,
+    dataset_id: str = "48fq-mxnm",
+    latencia_ms: float = 0.0,
+    variacion_ms: float = 0.0,
+    tasa_error: float = 0.0,
+    semilla: Optional[int] = None,
+) -> FastAPI:
+    """
+    Crea la aplicación del servidor local.
+
+    Args:
+        motor: Dataset en memoria que responde las consultas
+        dataset_id: Identificador que se publica (el resto responde 404)
+        latencia_ms: Retardo fijo añadido a cada respuesta
+        variacion_ms: Retardo aleatorio adicional entre 0 y este valor
+        tasa_error: Probabilidad (0-1) de responder 500 en /resource
+        semilla: Semilla para reproducir la secuencia de latencias y errores
+    """
+    app = FastAPI(title="Socrata local", description="Servidor SODA de pruebas para el Dashboard INVIMA")
+    aleatorio = random.Random(semilla)
+
+    def no_encontrado(identificador: str) -> JSONResponse:
+        return JSONResponse(
+            status_code=404,
+            content={"code": "not_found", "error": True, "message": f"Dataset {identificador} no existe"},
+        )
+
+    async def simular_red() -> None:
+        retardo = latencia_ms + (aleatorio.uniform(0, variacion_ms) if variacion_ms else 0)
+        if retardo > 0:
+            await asyncio.sleep(retardo / 1000)
+
+    @app.get("/resource/{identificador}.json")
+    async def recurso(identificador: str, request: Request):
+        if identificador != dataset_id:
+            return no_encontrado(identificador)
+        await simular_red()
+        if tasa_error and aleatorio.random() < tasa_error:
+            return JSONResponse(
+                status_code=500,
+                content={"code": "internal_error", "error": True, "message": "Error inyectado por el servidor local"},
+            )
+        try:
+            filas = await run_in_threadpool(motor.consultar, dict(request.query_params))
+        except SoQLError as e:
+            return JSONResponse(
+                status_code=400,
+                content={"code": e.codigo, "error": True, "message": str(e)},
+            )
+        return JSONResponse(content=filas)
+
+    @app.get("/api/views/{identificador}.json")
+    async def metadatos(identificador: str):
+        if identificador != dataset_id:
+            return no_encontrado(identificador)
+        await simular_red()
+        return {
+            "id": dataset_id,
+            "name": "Catálogo de trámites SUIT (servidor local)",
+            "rowsUpdatedAt": motor.version,
+            "columns": [
+                {"fieldName": columna, "dataTypeName": "text"}
+                for columna in sorted(motor.columnas)
+            ],
+        }
+
+    return app
@@ -0,0 +1,597 @@
+"""
+Motor SoQL en memoria
+Implementa el subconjunto de SoQL que usa SocrataClient sobre una lista de filas:
+$select (count(*), count(distinct), max/min/sum/avg, DISTINCT, alias),
+$where (=, !=, <, >, like, upper/lower, in, between, is null, AND/OR/NOT),
+$group, $order, $limit y $offset
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import re
+import threading
+
+AGREGADOS = {"count", "max", "min", "sum", "avg"}
+FUNCIONES = {"upper", "lower", "date_trunc_y", "date_trunc_ym", "date_trunc_ymd"}
+PALABRAS_RESERVADAS = {
+    "and", "or", "not", "like", "in", "between", "is", "null", "as",
+    "distinct", "asc", "desc", "true", "false",
+}
+
+_TOKEN = re.compile(r"""
+    (?P<espacio>\s+)
+  | (?P<texto>'(?:[^']|'')*')
+  | (?P<numero>\d+(?:\.\d+)?)
+  | (?P<identificador>[A-Za-z_:@][A-Za-z0-9_]*)
+  | (?P<operador><=|>=|!=|<>|=|<|>|\(|\)|,|\*|\|\|)
+""", re.VERBOSE)
+
+
+class SoQLError(Exception):
+    """Consulta SoQL inválida o no soportada (equivale a un 400 de Socrata)"""
+
+    def __init__(self, mensaje: str, codigo: str = "query.compiler.malformed"):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+# ---------------------------------------------------------------------------
+# Análisis léxico y sintáctico
+# ---------------------------------------------------------------------------
+
+def tokenizar(texto: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    posicion = 0
+    while posicion < len(texto):
+        coincidencia = _TOKEN.match(texto, posicion)
+        if not coincidencia:
+            raise SoQLError(f"Carácter inesperado en la posición {posicion}: {texto[posicion:posicion + 20]!r}")
+        posicion = coincidencia.end()
+        tipo = coincidencia.lastgroup
+        valor = coincidencia.group()
+        if tipo == "espacio":
+            continue
+        if tipo == "texto":
+            tokens.append(("texto", valor[1:-1].replace("''", "'")))
+        elif tipo == "numero":
+            tokens.append(("numero", float(valor) if "." in valor else int(valor)))
+        elif tipo == "identificador":
+            if valor.lower() in PALABRAS_RESERVADAS:
+                tokens.append(("palabra", valor.lower()))
+            else:
+                tokens.append(("identificador", valor))
+        else:
+            tokens.append(("operador", valor))
+    return tokens
+
+
+class _Parser:
+    """
+    Analizador descendente recursivo. Produce nodos en forma de tuplas:
+    ("col", nombre), ("lit", valor), ("fn", nombre, args, distinct), ("estrella",),
+    ("cmp", op, izq, der), ("like", expr, patron, negado), ("in", expr, valores, negado),
+    ("between", expr, desde, hasta, negado), ("null", expr, negado),
+    ("and", izq, der), ("or", izq, der), ("not", expr)
+    """
+
+    def __init__(self, texto: str):
+        self.tokens = tokenizar(texto)
+        self.posicion = 0
+
+    # Utilidades ------------------------------------------------------------
+    def _actual(self) -> Optional[Tuple[str, Any]]:
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else None
+
+    def _es(self, tipo: str, valor: Any = None) -> bool:
+        token = self._actual()
+        return token is not None and token[0] == tipo and (valor is None or token[1] == valor)
+
+    def _consumir(self, tipo: str, valor: Any = None) -> Tuple[str, Any]:
+        if not self._es(tipo, valor):
+            esperado = valor if valor is not None else tipo
+            raise SoQLError(f"Se esperaba {esperado!r} y se encontró {self._actual()!r}")
+        token = self.tokens[self.posicion]
+        self.posicion += 1
+        return token
+
+    def _aceptar(self, tipo: str, valor: Any = None) -> bool:
+        if self._es(tipo, valor):
+            self.posicion += 1
+            return True
+        return False
+
+    def fin(self) -> bool:
+        return self.posicion >= len(self.tokens)
+
+    def exigir_fin(self) -> None:
+        if not self.fin():
+            raise SoQLError(f"Texto inesperado: {self._actual()!r}")
+
+    # Gramática -------------------------------------------------------------
+    def expresion(self):
+        return self._o()
+
+    def _o(self):
+        nodo = self._y()
+        while self._aceptar("palabra", "or"):
+            nodo = ("or", nodo, self._y())
+        return nodo
+
+    def _y(self):
+        nodo = self._no()
+        while self._aceptar("palabra", "and"):
+            nodo = ("and", nodo, self._no())
+        return nodo
+
+    def _no(self):
+        if self._aceptar("palabra", "not"):
+            return ("not", self._no())
+        return self._comparacion()
+
+    def _comparacion(self):
+        izquierda = self._operando()
+        if self._es("operador") and self._actual()[1] in ("=", "!=", "<>", "<", ">", "<=", ">="):
+            operador = self._consumir("operador")[1]
+            return ("cmp", "!=" if operador == "<>" else operador, izquierda, self._operando())
+
+        negado = self._aceptar("palabra", "not")
+        if self._aceptar("palabra", "like"):
+            return ("like", izquierda, self._operando(), negado)
+        if self._aceptar("palabra", "in"):
+            self._consumir("operador", "(")
+            valores = [self._operando()]
+            while self._aceptar("operador", ","):
+                valores.append(self._operando())
+            self._consumir("operador", ")")
+            return ("in", izquierda, valores, negado)
+        if self._aceptar("palabra", "between"):
+            desde = self._operando()
+            self._consumir("palabra", "and")
+            return ("between", izquierda, desde, self._operando(), negado)
+        if negado:
+            raise SoQLError("NOT debe preceder a LIKE, IN o BETWEEN")
+        if self._aceptar("palabra", "is"):
+            negado = self._aceptar("palabra", "not")
+            self._consumir("palabra", "null")
+            return ("null", izquierda, negado)
+        return izquierda
+
+    def _operando(self):
+        if self._aceptar("operador", "("):
+            nodo = self.expresion()
+            self._consumir("operador", ")")
+            return nodo
+        if self._es("texto") or self._es("numero"):
+            return ("lit", self._consumir(self._actual()[0])[1])
+        if self._aceptar("palabra", "null"):
+            return ("lit", None)
+        if self._es("palabra", "true") or self._es("palabra", "false"):
+            return ("lit", self._consumir("palabra")[1] == "true")
+        if self._aceptar("operador", "*"):
+            return ("estrella",)
+        if self._es("identificador"):
+            nombre = self._consumir("identificador")[1]
+            if self._aceptar("operador", "("):
+                funcion = nombre.lower()
+                if funcion not in AGREGADOS and funcion not in FUNCIONES:
+                    raise SoQLError(f"Función no soportada: {nombre}", "query.soql.no-such-function")
+                distinct = self._aceptar("palabra", "distinct")
+                argumentos = []
+                if not self._es("operador", ")"):
+                    argumentos.append(self.expresion())
+                    while self._aceptar("operador", ","):
+                        argumentos.append(self.expresion())
+                self._consumir("operador", ")")
+                return ("fn", funcion, argumentos, distinct)
+            return ("col", nombre)
+        raise SoQLError(f"Expresión inesperada: {self._actual()!r}")
+
+    def lista_select(self) -> Tuple[bool, List[Tuple[Any, Optional[str]]]]:
+        distinct = self._aceptar("palabra", "distinct")
+        elementos = []
+        while True:
+            nodo = self.expresion()
+            alias = None
+            if self._aceptar("palabra", "as"):
+                alias = self._consumir("identificador")[1]
+            elementos.append((nodo, alias))
+            if not self._aceptar("operador", ","):
+                break
+        self.exigir_fin()
+        return distinct, elementos
+
+    def lista_expresiones(self) -> List[Any]:
+        elementos = [self.expresion()]
+        while self._aceptar("operador", ","):
+            elementos.append(self.expresion())
+        self.exigir_fin()
+        return elementos
+
+    def lista_orden(self) -> List[Tuple[Any, bool]]:
+        elementos = []
+        while True:
+            nodo = self.expresion()
+            descendente = False
+            if self._aceptar("palabra", "desc"):
+                descendente = True
+            else:
+                self._aceptar("palabra", "asc")
+            elementos.append((nodo, descendente))
+            if not self._aceptar("operador", ","):
+                break
+        self.exigir_fin()
+        return elementos
+
+
+# ---------------------------------------------------------------------------
+# Compilación a funciones de Python
+# ---------------------------------------------------------------------------
+
+def _numero(valor: Any) -> Optional[float]:
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return valor
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comparables(izquierda: Any, derecha: Any) -> Tuple[Any, Any]:
+    """Compara como números si alguno de los lados es numérico"""
+    if isinstance(izquierda, (int, float)) or isinstance(derecha, (int, float)):
+        a, b = _numero(izquierda), _numero(derecha)
+        if a is not None and b is not None:
+            return a, b
+    return str(izquierda), str(derecha)
+
+
+_COMPARADORES = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def _patron_like(patron: str) -> "re.Pattern":
+    partes = []
+    for caracter in patron:
+        if caracter == "%":
+            partes.append(".*")
+        elif caracter == "_":
+            partes.append(".")
+        else:
+            partes.append(re.escape(caracter))
+    return re.compile("".join(partes), re.DOTALL)
+
+
+def _truncar_fecha(valor: Any, longitud: int) -> Optional[str]:
+    """date_trunc_* sobre fechas ISO (YYYY-MM-DDTHH:MM:SS)"""
+    if not valor or len(str(valor)) < longitud:
+        return None
+    base = str(valor)[:longitud]
+    relleno = "0000-01-01"[longitud:] if longitud < 10 else ""
+    return f"{base}{relleno}T00:00:00.000"
+
+
+class _Compilador:
+    def __init__(self, columnas: Optional[set], alias: Optional[set] = None):
+        self.columnas = columnas
+        self.alias = alias or set()
+
+    def compilar(self, nodo) -> Callable[[Dict], Any]:
+        tipo = nodo[0]
+        if tipo == "lit":
+            valor = nodo[1]
+            return lambda fila: valor
+        if tipo == "col":
+            nombre = nodo[1]
+            if nombre == ":id":
+                # Las filas conservan el orden de carga, que hace de :id; un valor
+                # constante deja ese orden intacto (el ordenamiento es estable)
+                return lambda fila: None
+            if self.columnas is not None and nombre not in self.columnas and nombre not in self.alias:
+                raise SoQLError(f"No such column: {nombre}", "query.soql.no-such-column")
+            return lambda fila: fila.get(nombre)
+        if tipo == "fn":
+            return self._funcion(nodo)
+        if tipo == "cmp":
+            comparar = _COMPARADORES[nodo[1]]
+            izquierda, derecha = self.compilar(nodo[2]), self.compilar(nodo[3])
+
+            def comparacion(fila):
+                a, b = izquierda(fila), derecha(fila)
+                if a is None or b is None:
+                    return False
+                return comparar(*_comparables(a, b))
+            return comparacion
+        if tipo == "like":
+            expresion, negado = self.compilar(nodo[1]), nodo[3]
+            if nodo[2][0] != "lit":
+                raise SoQLError("LIKE solo admite patrones literales")
+            regex = _patron_like(str(nodo[2][1]))
+
+            def like(fila):
+                valor = expresion(fila)
+                if valor is None:
+                    return False
+                return (regex.fullmatch(str(valor)) is not None) != negado
+            return like
+        if tipo == "in":
+            expresion, negado = self.compilar(nodo[1]), nodo[3]
+            if any(valor[0] != "lit" for valor in nodo[2]):
+                raise SoQLError("IN solo admite valores literales")
+            valores = {str(valor[1]) for valor in nodo[2]}
+
+            def pertenece(fila):
+                valor = expresion(fila)
+                if valor is None:
+                    return False
+                return (str(valor) in valores) != negado
+            return pertenece
+        if tipo == "between":
+            expresion = self.compilar(nodo[1])
+            desde, hasta, negado = self.compilar(nodo[2]), self.compilar(nodo[3]), nodo[4]
+
+            def entre(fila):
+                valor = expresion(fila)
+                if valor is None:
+                    return False
+                a, b = _comparables(valor, desde(fila))
+                c, d = _comparables(valor, hasta(fila))
+                return (a >= b and c <= d) != negado
+            return entre
+        if tipo == "null":
+            expresion, negado = self.compilar(nodo[1]), nodo[2]
+            return lambda fila: (expresion(fila) is None) != negado
+        if tipo == "and":
+            izquierda, derecha = self.compilar(nodo[1]), self.compilar(nodo[2])
+            return lambda fila: bool(izquierda(fila)) and bool(derecha(fila))
+        if tipo == "or":
+            izquierda, derecha = self.compilar(nodo[1]), self.compilar(nodo[2])
+            return lambda fila: bool(izquierda(fila)) or bool(derecha(fila))
+        if tipo == "not":
+            expresion = self.compilar(nodo[1])
+            return lambda fila: not expresion(fila)
+        if tipo == "estrella":
+            raise SoQLError("'*' solo puede usarse en $select o en count(*)")
+        raise SoQLError(f"Nodo no soportado: {tipo}")
+
+    def _funcion(self, nodo) -> Callable[[Dict], Any]:
+        funcion, argumentos = nodo[1], nodo[2]
+        if funcion in AGREGADOS:
+            raise SoQLError(f"La función de agregación {funcion} no se permite en este contexto")
+        if len(argumentos) != 1:
+            raise SoQLError(f"{funcion} recibe exactamente un argumento")
+        argumento = self.compilar(argumentos[0])
+        if funcion == "upper":
+            return lambda fila: None if argumento(fila) is None else str(argumento(fila)).upper()
+        if funcion == "lower":
+            return lambda fila: None if argumento(fila) is None else str(argumento(fila)).lower()
+        longitud = {"date_trunc_y": 4, "date_trunc_ym": 7, "date_trunc_ymd": 10}[funcion]
+        return lambda fila: _truncar_fecha(argumento(fila), longitud)
+
+    def agregado(self, nodo) -> Callable[[List[Dict]], Any]:
+        """Compila count/max/min/sum/avg para evaluarse sobre las filas de un grupo"""
+        funcion, argumentos, distinct = nodo[1], nodo[2], nodo[3]
+        if len(argumentos) != 1:
+            raise SoQLError(f"{funcion} recibe exactamente un argumento")
+        if argumentos[0][0] == "estrella":
+            if funcion != "count":
+                raise SoQLError(f"{funcion}(*) no es válido")
+            return len
+        argumento = self.compilar(argumentos[0])
+
+        def valores(filas):
+            extraidos = [v for v in (argumento(fila) for fila in filas) if v is not None]
+            return list(dict.fromkeys(extraidos)) if distinct else extraidos
+
+        if funcion == "count":
+            return lambda filas: len(valores(filas))
+        if funcion in ("max", "min"):
+            elegir = max if funcion == "max" else min
+
+            def extremo(filas):
+                datos = valores(filas)
+                if not datos:
+                    return None
+                numeros = [_numero(v) for v in datos]
+                if all(n is not None for n in numeros) and not all(isinstance(v, str) for v in datos):
+                    return elegir(numeros)
+                return elegir(str(v) for v in datos)
+            return extremo
+
+        def numerico(filas):
+            numeros = [n for n in (_numero(v) for v in valores(filas)) if n is not None]
+            if not numeros:
+                return None
+            return sum(numeros) if funcion == "sum" else sum(numeros) / len(numeros)
+        return numerico
+
+
+def _es_agregado(nodo) -> bool:
+    return nodo[0] == "fn" and nodo[1] in AGREGADOS
+
+
+def _nombre_por_defecto(nodo) -> str:
+    if nodo[0] == "col":
+        return nodo[1]
+    if nodo[0] == "fn":
+        argumentos = [a for a in nodo[2] if a[0] == "col"]
+        return f"{nodo[1]}_{argumentos[0][1]}" if argumentos else nodo[1]
+    return "valor"
+
+
+def _formatear(valor: Any) -> Any:
+    """Socrata devuelve los valores como texto en JSON"""
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    return valor
+
+
+def _clave_orden(valor: Any, descendente: bool) -> Tuple:
+    # Los nulos quedan al final en ambos sentidos
+    nulo = valor is None
+    if nulo:
+        return (not descendente, 0, "")
+    numero = valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else None
+    if numero is not None:
+        return (descendente, 0, numero)
+    return (descendente, 1, str(valor))
+
+
+# ---------------------------------------------------------------------------
+# Consulta compilada y motor
+# ---------------------------------------------------------------------------
+
+class ConsultaCompilada:
+    """Consulta SoQL lista para ejecutarse sobre cualquier lista de filas"""
+
+    def __init__(self, parametros: Dict[str, Any], columnas: Optional[set] = None):
+        self.limite = int(parametros.get("$limit", 1000))
+        self.desplazamiento = int(parametros.get("$offset", 0))
+
+        # $select
+        self.distinct = False
+        self.elementos: List[Tuple[str, Any]] = []
+        self.todas = True
+        if parametros.get("$select") and parametros["$select"].strip() != "*":
+            self.todas = False
+            self.distinct, elementos = _Parser(parametros["$select"]).lista_select()
+            for nodo, alias in elementos:
+                if nodo[0] == "estrella":
+                    raise SoQLError("'*' no puede combinarse con otras columnas")
+                self.elementos.append((alias or _nombre_por_defecto(nodo), nodo))
+        alias = {nombre for nombre, _ in self.elementos}
+        compilador = _Compilador(columnas, alias)
+        compilador_filas = _Compilador(columnas)
+
+        # $where y filtros simples columna=valor
+        condiciones = []
+        if parametros.get("$where"):
+            parser = _Parser(parametros["$where"])
+            nodo = parser.expresion()
+            parser.exigir_fin()
+            condiciones.append(compilador_filas.compilar(nodo))
+        for clave, valor in parametros.items():
+            if not clave.startswith("$"):
+                condiciones.append(compilador_filas.compilar(("cmp", "=", ("col", clave), ("lit", valor))))
+        self.filtro = (lambda fila: all(c(fila) for c in condiciones)) if condiciones else None
+
+        # Proyección: expresiones simples y agregaciones
+        self.agrupado = any(_es_agregado(nodo) for _, nodo in self.elementos) or bool(parametros.get("$group"))
+        self.proyecciones: List[Tuple[str, bool, Callable]] = []
+        for nombre, nodo in self.elementos:
+            if _es_agregado(nodo):
+                self.proyecciones.append((nombre, True, compilador_filas.agregado(nodo)))
+            else:
+                self.proyecciones.append((nombre, False, compilador_filas.compilar(nodo)))
+
+        # $group: los alias del select se resuelven a su expresión
+        self.grupo: List[Callable] = []
+        if parametros.get("$group"):
+            expresiones = dict(self.elementos)
+            for nodo in _Parser(parametros["$group"]).lista_expresiones():
+                if nodo[0] == "col" and nodo[1] in expresiones:
+                    nodo = expresiones[nodo[1]]
+                    if _es_agregado(nodo):
+                        raise SoQLError(f"No se puede agrupar por la agregación {nodo[1]}")
+                self.grupo.append(compilador_filas.compilar(nodo))
+            if self.todas:
+                raise SoQLError("$group requiere un $select explícito")
+
+        # $order: se evalúa sobre la fila de salida combinada con la fila origen
+        self.orden: List[Tuple[Callable, bool]] = []
+        if parametros.get("$order"):
+            for nodo, descendente in _Parser(parametros["$order"]).lista_orden():
+                self.orden.append((compilador.compilar(nodo), descendente))
+
+    def ejecutar(self, filas: Iterable[Dict]) -> List[Dict]:
+        seleccionadas = [f for f in filas if self.filtro(f)] if self.filtro else list(filas)
+
+        if self.agrupado:
+            grupos: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+            if self.grupo:
+                for fila in seleccionadas:
+                    clave = tuple(expresion(fila) for expresion in self.grupo)
+                    grupos.setdefault(clave, []).append(fila)
+            else:
+                grupos[()] = seleccionadas
+            resultados = []
+            for filas_grupo in grupos.values():
+                primera = filas_grupo[0] if filas_grupo else {}
+                salida = {
+                    nombre: (calcular(filas_grupo) if es_agregado else calcular(primera))
+                    for nombre, es_agregado, calcular in self.proyecciones
+                }
+                resultados.append((salida, {**primera, **salida}))
+        elif self.todas:
+            resultados = [(dict(fila), fila) for fila in seleccionadas]
+        else:
+            resultados = []
+            for fila in seleccionadas:
+                salida = {nombre: calcular(fila) for nombre, _, calcular in self.proyecciones}
+                resultados.append((salida, {**fila, **salida}))
+
+        if self.distinct:
+            vistos = set()
+            unicos = []
+            for salida, contexto in resultados:
+                clave = tuple(salida.items())
+                if clave not in vistos:
+                    vistos.add(clave)
+                    unicos.append((salida, contexto))
+            resultados = unicos
+
+        # Orden estable aplicando las claves de la última a la primera
+        for expresion, descendente in reversed(self.orden):
+            resultados.sort(
+                key=lambda par: _clave_orden(expresion(par[1]), descendente),
+                reverse=descendente,
+            )
+
+        pagina = resultados[self.desplazamiento:self.desplazamiento + self.limite]
+        return [
+            {clave: _formatear(valor) for clave, valor in salida.items() if valor is not None}
+            for salida, _ in pagina
+        ]
+
+
+class MotorSoQL:
+    """Dataset en memoria con caché de consultas compiladas"""
+
+    def __init__(self, filas: List[Dict], version: Optional[str] = None, tamano_cache: int = 256):
+        self.filas = filas
+        self.columnas = set()
+        for fila in filas:
+            self.columnas.update(fila.keys())
+        self.version = version or str(len(filas))
+        self._compiladas: "OrderedDict[str, ConsultaCompilada]" = OrderedDict()
+        self._tamano_cache = tamano_cache
+        self._lock = threading.Lock()
+
+    def compilar(self, parametros: Dict[str, Any]) -> ConsultaCompilada:
+        clave = repr(sorted((k, str(v)) for k, v in parametros.items()))
+        with self._lock:
+            consulta = self._compiladas.get(clave)
+            if consulta is not None:
+                self._compiladas.move_to_end(clave)
+                return consulta
+        consulta = ConsultaCompilada(parametros, self.columnas)
+        with self._lock:
+            self._compiladas[clave] = consulta
+            if len(self._compiladas) > self._tamano_cache:
+                self._compiladas.popitem(last=False)
+        return consulta
+
+    def consultar(self, parametros: Dict[str, Any]) -> List[Dict]:
+        """Ejecuta una consulta con parámetros SODA ($select, $where, ...)"""
+        parametros = {k: v for k, v in parametros.items() if v is not None and k != "$$exclude_system_fields"}
+        return self.compilar(parametros).ejecutar(self.filas)
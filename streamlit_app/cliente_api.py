@@ -0,0 +1,261 @@
+"""
+Cliente HTTP compartido del frontend
+Una sola sesión de requests por proceso de Streamlit (st.cache_resource): las
+conexiones keep-alive se reutilizan entre páginas, sesiones y reruns en lugar de
+abrir una conexión TCP nueva por cada interacción. Los errores transitorios se
+reintentan con espera exponencial y los GET se revalidan con If-None-Match: si
+el backend responde 304 se reutiliza el cuerpo ya recibido. Los GET idénticos
+que están en curso se comparten, así un rerun que pide lo mismo que el anterior
+espera esa respuesta en vez de repetir la consulta
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+import copy
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from cubo import Cubo
+from diagnostico import CABECERAS_DIAGNOSTICO, extraer_diagnostico
+
+FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
+# URL de la API vista desde el navegador (las descargas van directo al backend)
+FASTAPI_PUBLIC_URL = os.getenv("FASTAPI_PUBLIC_URL", FASTAPI_URL)
+
+API_STATS_SUIT = "/api/v1/dashboard/estadisticas-suit"
+API_CUBO_SUIT = "/api/v1/dashboard/estadisticas-suit/cubo"
+API_VERSION = "/api/v1/public/version"
+
+# Segundos para conectar y para leer la respuesta
+TIEMPO_CONEXION = 3.05
+TIEMPO_LECTURA = 30
+# Respuestas con ETag que se guardan para revalidarlas
+RESPUESTAS_GUARDADAS = 256
+# Cada cuánto se pregunta al backend por la versión del dataset
+SEGUNDOS_VERSION = 60
+# Respuestas tabulares en Arrow (los endpoints que lo admiten negocian por Accept)
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+# Cabeceras del cuerpo: un 304 no las trae y se conservan las de la respuesta guardada
+_CABECERAS_CUERPO = {"content-type", "content-length", "content-encoding", "transfer-encoding"}
+
+
+def _normalizar(valores: Optional[Dict]) -> Tuple:
+    return tuple(sorted(
+        (k, tuple(v) if isinstance(v, list) else v) for k, v in (valores or {}).items()
+    ))
+
+
+class ClienteAPI:
+    def __init__(self, base_url: str, conexiones: int = 20, reintentos: int = 3, espera: float = 0.5):
+        """
+        Args:
+            base_url: URL del backend FastAPI
+            conexiones: Conexiones keep-alive que conserva el pool
+            reintentos: Reintentos ante errores de conexión y respuestas 502/503/504
+            espera: Factor de espera exponencial entre reintentos (0.5s, 1s, 2s...)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.sesion = requests.Session()
+        reintento = Retry(
+            total=reintentos,
+            backoff_factor=espera,
+            status_forcelist=(502, 503, 504),
+            # Los POST no se repiten: crear un reporte dos veces no es idempotente
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=conexiones, max_retries=reintento)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+        self._lock = threading.Lock()
+        self._en_curso: Dict[Tuple, Future] = {}
+        self._guardadas: "OrderedDict[Tuple, requests.Response]" = OrderedDict()
+
+    def url(self, ruta: str) -> str:
+        return ruta if ruta.startswith("http") else f"{self.base_url}{ruta}"
+
+    def get(
+        self,
+        ruta: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+    ) -> requests.Response:
+        """
+        GET con revalidación y deduplicación. La respuesta puede compartirse con
+        otros llamadores: se lee, no se modifica. raise_for_status queda a cargo
+        de quien llama, como con requests.get
+        """
+        url = self.url(ruta)
+        clave = (url, _normalizar(params), _normalizar(headers))
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self._en_curso[clave] = Future()
+        if not propio:
+            return futuro.result()
+        try:
+            respuesta = self._get_condicional(clave, url, params, headers, timeout)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+        futuro.set_result(respuesta)
+        return respuesta
+
+    def _get_condicional(self, clave, url, params, headers, timeout) -> requests.Response:
+        cabeceras = dict(headers or {})
+        with self._lock:
+            guardada = self._guardadas.get(clave)
+        if guardada is not None:
+            cabeceras["If-None-Match"] = guardada.headers["ETag"]
+        respuesta = self.sesion.get(
+            url, params=params, headers=cabeceras, timeout=timeout or (TIEMPO_CONEXION, TIEMPO_LECTURA)
+        )
+        if respuesta.status_code == 304 and guardada is not None:
+            # Mismo cuerpo, con las cabeceras nuevas (Server-Timing de esta solicitud)
+            revalidada = copy.copy(guardada)
+            revalidada.headers = CaseInsensitiveDict(guardada.headers)
+            revalidada.headers.update(
+                {k: v for k, v in respuesta.headers.items() if k.lower() not in _CABECERAS_CUERPO}
+            )
+            respuesta = revalidada
+        if respuesta.status_code == 200 and respuesta.headers.get("ETag"):
+            with self._lock:
+                self._guardadas[clave] = respuesta
+                self._guardadas.move_to_end(clave)
+                while len(self._guardadas) > RESPUESTAS_GUARDADAS:
+                    self._guardadas.popitem(last=False)
+        return respuesta
+
+    def get_arrow(
+        self,
+        ruta: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[pa.Table, Dict, requests.Response]:
+        """
+        GET que pide el stream IPC de Arrow. Devuelve la tabla, los metadatos
+        de la respuesta y la respuesta (para el diagnóstico)
+        """
+        cabeceras = {**(headers or {}), "Accept": ARROW_STREAM}
+        response = self.get(ruta, params=params, headers=cabeceras, timeout=timeout)
+        response.raise_for_status()
+        if not response.headers.get("Content-Type", "").startswith(ARROW_STREAM):
+            raise ValueError(f"{ruta} no respondió en formato Arrow")
+        tabla, metadatos = leer_arrow(response.content)
+        return tabla, metadatos, response
+
+    def post(self, ruta: str, json=None, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        return self.sesion.post(
+            self.url(ruta), json=json, timeout=timeout or (TIEMPO_CONEXION, TIEMPO_LECTURA), **kwargs
+        )
+
+
+def leer_arrow(cuerpo: bytes) -> Tuple[pa.Table, Dict]:
+    """Tabla y metadatos de un stream IPC; sin compresión, los buffers apuntan al cuerpo recibido"""
+    tabla = pa.ipc.open_stream(pa.py_buffer(cuerpo)).read_all()
+    metadatos = json.loads((tabla.schema.metadata or {}).get(b"invima", b"{}"))
+    return tabla, metadatos
+
+
+def como_dataframe(tabla: pa.Table) -> pd.DataFrame:
+    """DataFrame con columnas respaldadas por Arrow: tipado y sin convertir a objetos de Python"""
+    return tabla.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+@st.cache_resource
+def obtener_cliente() -> ClienteAPI:
+    """Cliente único del proceso, compartido por todas las páginas y sesiones"""
+    return ClienteAPI(FASTAPI_URL)
+
+
+# Versión del dataset ---------------------------------------------------------
+#
+# Las cargas reciben la versión publicada del dataset como argumento, de modo
+# que forma parte de su clave de caché: cuando el backend anuncia una versión
+# nueva, las entradas de la anterior dejan de usarse (y caducan por TTL) sin
+# vaciar la caché de las demás páginas ni de los demás usuarios. Los botones de
+# recarga solo limpian version_dataset, una entrada diminuta
+
+@st.cache_data(ttl=SEGUNDOS_VERSION, show_spinner=False)
+def version_dataset() -> Optional[str]:
+    response = obtener_cliente().get(API_VERSION, timeout=(TIEMPO_CONEXION, 10))
+    response.raise_for_status()
+    return response.json().get("version")
+
+
+def version_actual() -> Optional[str]:
+    """Versión publicada, o None si el backend no responde (no se guarda en caché)"""
+    try:
+        return version_dataset()
+    except Exception:
+        return None
+
+
+# Cargas compartidas por Estadísticas y Tablero Público ----------------------
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def cargar_estadisticas(
+    ano: Optional[str] = None,
+    clase: Optional[str] = None,
+    kw: Optional[str] = None,
+    version: Optional[str] = None,
+):
+    """
+    Estadísticas SUIT con filtros y el diagnóstico de tiempos. Definida aquí (y
+    no en cada página) para que ambas páginas compartan la misma entrada de
+    caché. `version` solo forma parte de la clave
+    """
+    params = {}
+    if ano and ano != "Todos":
+        params["ano"] = ano
+    if clase and clase != "Todas":
+        params["clase"] = clase
+    if kw:
+        params["palabra_clave"] = kw
+    response = obtener_cliente().get(API_STATS_SUIT, params=params, headers=CABECERAS_DIAGNOSTICO)
+    response.raise_for_status()
+    return response.json(), extraer_diagnostico(response)
+
+
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def cargar_cubo(version: Optional[str] = None) -> Tuple[Cubo, Dict]:
+    """Cubo compacto de la versión del dataset: se descarga una vez y los filtros se aplican en local"""
+    tabla, metadatos, response = obtener_cliente().get_arrow(API_CUBO_SUIT, headers=CABECERAS_DIAGNOSTICO)
+    return Cubo.desde_arrow(tabla, metadatos), extraer_diagnostico(response)
+
+
+def obtener_estadisticas(
+    ano: Optional[str] = None,
+    clase: Optional[str] = None,
+    kw: Optional[str] = None,
+    version: Optional[str] = None,
+):
+    """
+    Estadísticas SUIT calculadas sobre el cubo, sin consultar la API al cambiar
+    de filtro. Si el backend no entrega el cubo, se piden a /estadisticas-suit
+    """
+    try:
+        cubo, diagnostico = cargar_cubo(version)
+    except Exception:
+        return cargar_estadisticas(ano, clase, kw, version)
+    return cubo.estadisticas(ano, clase, kw), diagnostico
+
+
+def cargar_datos_filtros(version: Optional[str] = None) -> Dict:
+    """Opciones de los filtros: salen de las estadísticas sin filtros, ya en caché"""
+    return obtener_estadisticas(version=version)[0]
@@ -0,0 +1,147 @@
+"""
+Estadísticas SUIT calculadas en el cliente
+El backend entrega una vez por versión del dataset un cubo compacto (conteos por
+año, clase y nombre del trámite, con las dimensiones codificadas como
+diccionario). Aquí se filtra y agrega con NumPy sobre los códigos, con el mismo
+resultado que /estadisticas-suit, así que cambiar un filtro no consulta la API
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+DIMENSIONES = ("ano", "clase", "nombre", "nombre_comun")
+
+
+class Cubo:
+    def __init__(
+        self,
+        version: Optional[str],
+        categorias: List[str],
+        dimensiones: Dict[str, np.ndarray],
+        codigos: Dict[str, np.ndarray],
+        categoria: np.ndarray,
+        cantidad: np.ndarray,
+    ):
+        self.version = version
+        self.categorias = categorias
+        self.dimensiones = dimensiones
+        self.codigos = codigos
+        self.categoria = categoria
+        self.cantidad = cantidad
+
+    @classmethod
+    def desde_json(cls, payload: Dict) -> "Cubo":
+        return cls(
+            payload.get("version"),
+            payload["categorias"],
+            {nombre: np.array(payload["dimensiones"][nombre], dtype=object) for nombre in DIMENSIONES},
+            {nombre: np.asarray(payload["codigos"][nombre], dtype=np.int32) for nombre in DIMENSIONES},
+            np.asarray(payload["categoria"], dtype=np.int64),
+            np.asarray(payload["cantidad"], dtype=np.int64),
+        )
+
+    @classmethod
+    def desde_arrow(cls, tabla: pa.Table, metadatos: Dict) -> "Cubo":
+        """Los códigos y conteos son vistas sobre los buffers de Arrow, sin copiar"""
+        if not tabla.num_rows:
+            return cls(
+                metadatos.get("version"), metadatos["categorias"],
+                {nombre: np.empty(0, dtype=object) for nombre in DIMENSIONES},
+                {nombre: np.empty(0, dtype=np.int32) for nombre in DIMENSIONES},
+                np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            )
+        tabla = tabla.unify_dictionaries().combine_chunks()
+        columnas = {nombre: tabla[nombre].chunk(0) for nombre in DIMENSIONES}
+        return cls(
+            metadatos.get("version"),
+            metadatos["categorias"],
+            {nombre: columna.dictionary.to_numpy(zero_copy_only=False) for nombre, columna in columnas.items()},
+            {nombre: columna.indices.to_numpy() for nombre, columna in columnas.items()},
+            tabla["categoria"].to_numpy(),
+            tabla["cantidad"].to_numpy(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.cantidad)
+
+    # Filtros -------------------------------------------------------------------
+
+    def _igual(self, dimension: str, valor: str) -> np.ndarray:
+        posiciones = np.flatnonzero(self.dimensiones[dimension] == valor)
+        if not len(posiciones):
+            return np.zeros(len(self), dtype=bool)
+        return self.codigos[dimension] == posiciones[0]
+
+    def _contiene(self, dimension: str, texto: str) -> np.ndarray:
+        # Se evalúa una vez por valor del diccionario y se expande con los códigos
+        aciertos = np.fromiter(
+            (v is not None and texto in v.upper() for v in self.dimensiones[dimension]),
+            dtype=bool, count=len(self.dimensiones[dimension])
+        )
+        return aciertos[self.codigos[dimension]]
+
+    def mascara(self, ano: Optional[str] = None, clase: Optional[str] = None, kw: Optional[str] = None) -> np.ndarray:
+        """Filas del cubo que cumplen los filtros, con la semántica de /estadisticas-suit"""
+        seleccion = np.ones(len(self), dtype=bool)
+        if ano:
+            seleccion &= self._igual("ano", ano)
+        if clase:
+            seleccion &= self._igual("clase", clase)
+        if kw:
+            texto = kw.upper()
+            seleccion &= self._contiene("nombre", texto) | self._contiene("nombre_comun", texto)
+        return seleccion
+
+    # Agregados -----------------------------------------------------------------
+
+    def _conteos(self, dimension: str, seleccion: np.ndarray) -> np.ndarray:
+        return np.bincount(
+            self.codigos[dimension][seleccion],
+            weights=self.cantidad[seleccion],
+            minlength=len(self.dimensiones[dimension]),
+        ).astype(np.int64)
+
+    def _grupos(self, dimension: str, seleccion: np.ndarray, alias: str) -> List[Dict]:
+        # Como Socrata, los valores nulos se omiten del registro
+        conteos = self._conteos(dimension, seleccion)
+        grupos = []
+        for posicion in np.flatnonzero(conteos):
+            valor = self.dimensiones[dimension][posicion]
+            grupo = {alias: valor} if valor is not None else {}
+            grupo["cantidad"] = int(conteos[posicion])
+            grupos.append(grupo)
+        return grupos
+
+    def estadisticas(self, ano: Optional[str] = None, clase: Optional[str] = None, kw: Optional[str] = None) -> Dict:
+        """Mismo contenido que la respuesta de /estadisticas-suit"""
+        seleccion = self.mascara(ano, clase, kw)
+
+        por_ano = self._grupos("ano", seleccion, "ano")
+        por_ano.sort(key=lambda g: (g.get("ano") is not None, g.get("ano") or ""), reverse=True)
+
+        por_clase = self._grupos("clase", seleccion, "clase")
+        por_clase.sort(key=lambda g: (-g["cantidad"], g.get("clase") or ""))
+
+        top_tramites = self._grupos("nombre", seleccion, "nombre")
+        top_tramites.sort(key=lambda g: (-g["cantidad"], g.get("nombre") or ""))
+
+        distribucion_categorias = []
+        for bit, etiqueta in enumerate(self.categorias):
+            en_categoria = seleccion & ((self.categoria >> bit) & 1).astype(bool)
+            cantidad = int(self.cantidad[en_categoria].sum())
+            if cantidad > 0:
+                distribucion_categorias.append({"categoria": etiqueta, "cantidad": cantidad})
+
+        anos = sorted((a for a in self.dimensiones["ano"] if a is not None), reverse=True)
+        clases = sorted(c for c in self.dimensiones["clase"] if c is not None)
+        return {
+            "total_registros": int(self.cantidad[seleccion].sum()),
+            "por_ano": por_ano[:50],
+            "por_clase": por_clase[:50],
+            "top_tramites": top_tramites[:20],
+            "distribucion_categorias": distribucion_categorias,
+            "clases_disponibles": clases[:100],
+            "anos_disponibles": anos[:50],
+            "filtros_aplicados": {"ano": ano, "clase": clase, "palabra_clave": kw},
+        }
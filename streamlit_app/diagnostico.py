@@ -0,0 +1,63 @@
+"""
+Diagnóstico de tiempos del backend
+Interpreta las cabeceras Server-Timing y X-Debug-Trace devueltas por FastAPI
+"""
+import json
+from typing import Dict, List, Optional
+
+import pandas as pd
+import streamlit as st
+
+# El backend solo devuelve la traza completa si tiene TRACE_DEBUG activo
+CABECERAS_DIAGNOSTICO = {"X-Debug-Trace": "1"}
+
+
+def parsear_server_timing(valor: Optional[str]) -> List[Dict]:
+    """
+    Convierte 'socrata;dur=12.3;desc="3 eventos", total;dur=15' en una lista de métricas
+    """
+    metricas = []
+    if not valor:
+        return metricas
+    for parte in valor.split(","):
+        campos = [c.strip() for c in parte.split(";") if c.strip()]
+        if not campos:
+            continue
+        metrica = {"metrica": campos[0], "duracion_ms": None, "descripcion": ""}
+        for campo in campos[1:]:
+            clave, _, dato = campo.partition("=")
+            if clave == "dur":
+                try:
+                    metrica["duracion_ms"] = float(dato)
+                except ValueError:
+                    pass
+            elif clave == "desc":
+                metrica["descripcion"] = dato.strip('"')
+        metricas.append(metrica)
+    return metricas
+
+
+def extraer_diagnostico(response) -> Dict:
+    """Guarda las cabeceras de tiempos de una respuesta de requests"""
+    return {
+        "server_timing": response.headers.get("Server-Timing", ""),
+        "traza": response.headers.get("X-Debug-Trace"),
+    }
+
+
+def mostrar_diagnostico(diagnostico: Optional[Dict]) -> None:
+    """Muestra el desglose de tiempos del backend en un expander"""
+    if not diagnostico or not diagnostico.get("server_timing"):
+        return
+    with st.expander("🩺 Diagnóstico de tiempos del backend", expanded=False):
+        metricas = parsear_server_timing(diagnostico["server_timing"])
+        st.dataframe(pd.DataFrame(metricas), use_container_width=True, hide_index=True)
+        if diagnostico.get("traza"):
+            try:
+                traza = json.loads(diagnostico["traza"])
+            except ValueError:
+                return
+            eventos = pd.DataFrame(traza.get("eventos", []))
+            if not eventos.empty:
+                st.caption("Detalle por evento")
+                st.dataframe(eventos, use_container_width=True, hide_index=True)
@@ -0,0 +1,210 @@
+"""
+Figuras de Plotly en caché
+Las páginas de Estadísticas y Tablero Público construyen sus gráficos con estas
+funciones. Cada figura se guarda por la huella de su DataFrame (tipos y valores,
+con pd.util.hash_pandas_object) y por sus parámetros de presentación, en
+st.cache_resource: la comparten todas las sesiones y no se copia ni se
+serializa. Un rerun que no cambia los datos (un botón, un expander, volver a un
+filtro ya visto) reutiliza la figura en lugar de recalcular colores, etiquetas y
+trazas. Las figuras guardadas se tratan como de solo lectura: st.plotly_chart
+las convierte a JSON sin modificarlas
+"""
+from typing import Callable, Dict, Optional
+import functools
+import hashlib
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+# Figuras distintas que se conservan (entre todas las páginas y sesiones)
+FIGURAS_GUARDADAS = 512
+
+_CONSTRUCTORES: Dict[str, Callable[..., go.Figure]] = {}
+
+
+def huella(df: pd.DataFrame) -> str:
+    """Huella del contenido del DataFrame: columnas, tipos y valores en orden (no el índice)"""
+    digesto = hashlib.blake2b(digest_size=16)
+    digesto.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    digesto.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digesto.hexdigest()
+
+
+@st.cache_resource(max_entries=FIGURAS_GUARDADAS, show_spinner=False)
+def _figura(constructor: str, huella_datos: str, parametros: Dict, _df: pd.DataFrame) -> go.Figure:
+    # _df no se hashea (guion bajo): la clave es la huella calculada antes
+    return _CONSTRUCTORES[constructor](_df, **parametros)
+
+
+def en_cache(construir: Callable[..., go.Figure]) -> Callable[..., go.Figure]:
+    """
+    Memoriza un constructor de figuras f(df, **parametros). La clave incluye el
+    bytecode del constructor, así editar un gráfico en desarrollo no sirve la
+    figura anterior
+    """
+    nombre = f"{construir.__name__}:{hashlib.sha1(construir.__code__.co_code).hexdigest()[:8]}"
+    _CONSTRUCTORES[nombre] = construir
+
+    @functools.wraps(construir)
+    def envoltura(df: pd.DataFrame, **parametros) -> go.Figure:
+        return _figura(nombre, huella(df), parametros, df)
+
+    return envoltura
+
+
+def _miles(valores: pd.Series):
+    return [f"{int(v):,}" for v in valores]
+
+
+# Constructores ---------------------------------------------------------------
+
+@en_cache
+def barras_por_ano(
+    df: pd.DataFrame, titulo: str, titulo_y: str, escala: str, alto: int, rejilla: bool = False
+) -> go.Figure:
+    """Barras verticales por año (columnas ano, cantidad) con un color por barra según la cantidad"""
+    colores = getattr(px.colors.sequential, escala)
+    proporcion = (df["cantidad"] / df["cantidad"].max()).fillna(0)
+    posiciones = (proporcion * (len(colores) - 1)).astype(int).clip(0, len(colores) - 1)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=df["ano"],
+        y=df["cantidad"],
+        text=_miles(df["cantidad"]),
+        textposition="outside",
+        marker=dict(color=[colores[p] for p in posiciones], line=dict(color="white", width=2)),
+        hovertemplate="<b>Año %{x}</b><br>Trámites: %{y:,}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title="Año",
+        yaxis_title=titulo_y,
+        height=alto,
+        showlegend=False,
+        xaxis=dict(type="category")
+    )
+    if rejilla:
+        fig.update_layout(plot_bgcolor="rgba(0,0,0,0)", yaxis=dict(gridcolor="rgba(128,128,128,0.2)"))
+    return fig
+
+
+@en_cache
+def lineas_por_ano(df: pd.DataFrame, titulo: str, alto: int) -> go.Figure:
+    """Tendencia por año (columnas ano, cantidad)"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=df["ano"],
+        y=df["cantidad"],
+        mode="lines+markers",
+        name="Evolución",
+        line=dict(color="#2E86AB", width=4),
+        marker=dict(size=12, color="#A23B72", line=dict(color="white", width=2)),
+        fill="tozeroy",
+        fillcolor="rgba(46, 134, 171, 0.2)",
+        hovertemplate="<b>%{x}</b><br>Cantidad: %{y:,}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title="Año",
+        yaxis_title="Cantidad",
+        height=alto,
+        showlegend=False
+    )
+    return fig
+
+
+@en_cache
+def barras_categorias(df: pd.DataFrame, titulo: str) -> go.Figure:
+    """Barras horizontales por categoría (columnas categoria, cantidad, porcentaje)"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=df["categoria"],
+        x=df["cantidad"],
+        orientation="h",
+        text=[f"{int(c):,} ({p}%)" for c, p in zip(df["cantidad"], df["porcentaje"])],
+        textposition="outside",
+        marker=dict(
+            color=px.colors.qualitative.Set3[:len(df)],
+            line=dict(color="white", width=2)
+        ),
+        hovertemplate="<b>%{y}</b><br>Cantidad: %{x:,}<br>Porcentaje: %{customdata:.1f}%<extra></extra>",
+        customdata=df["porcentaje"]
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title="Cantidad de Trámites",
+        yaxis_title="",
+        height=max(400, len(df) * 50),
+        showlegend=False,
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
+
+
+@en_cache
+def ranking(
+    df: pd.DataFrame,
+    etiqueta: str,
+    titulo: str,
+    titulo_x: str,
+    escala: str,
+    alto: int,
+    recortar: Optional[int] = None,
+) -> go.Figure:
+    """
+    Barras horizontales ordenadas (columnas `etiqueta` y cantidad). Con
+    `recortar`, las etiquetas largas se acortan y el nombre completo va en el hover
+    """
+    etiquetas = df[etiqueta]
+    hover = "<b>%{y}</b><br>Cantidad: %{x:,}<extra></extra>"
+    customdata = None
+    if recortar:
+        texto = etiquetas.astype(str)
+        etiquetas = texto.where(texto.str.len() <= recortar, texto.str[:recortar] + "...")
+        hover = "<b>%{customdata}</b><br>Cantidad: %{x:,}<extra></extra>"
+        customdata = df[etiqueta]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=etiquetas,
+        x=df["cantidad"],
+        orientation="h",
+        text=_miles(df["cantidad"]),
+        textposition="outside",
+        marker=dict(
+            color=df["cantidad"],
+            colorscale=escala,
+            showscale=False,
+            line=dict(color="white", width=1)
+        ),
+        hovertemplate=hover,
+        customdata=customdata
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title=titulo_x,
+        yaxis_title="",
+        height=alto,
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
+
+
+@en_cache
+def dona(df: pd.DataFrame, nombres: str, titulo: str, leyenda: bool = True) -> go.Figure:
+    """Gráfico de dona de la columna cantidad por `nombres`"""
+    fig = px.pie(
+        df,
+        values="cantidad",
+        names=nombres,
+        hole=0.4,
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_traces(
+        textposition="inside",
+        textinfo="percent",
+        hovertemplate="<b>%{label}</b><br>%{value:,} trámites<br>%{percent}<extra></extra>"
+    )
+    fig.update_layout(title=titulo, height=400, showlegend=leyenda)
+    return fig
@@ -4,13 +4,12 @@ HU-INVIMA-001: Búsqueda y consulta de trámites INVIMA en el SUIT
 import streamlit as st
 import requests
 import pandas as pd
-import os
 from typing import Dict, List
+from cliente_api import obtener_cliente
 
 st.set_page_config(page_title="Búsqueda de Trámites INVIMA - SUIT", page_icon="🔍", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_ENDPOINT = f"{FASTAPI_URL}/api/v1/tramites/suit"
+API_ENDPOINT = "/api/v1/tramites/suit"
 
 CATEGORY_OPTIONS: Dict[str, str] = {
     "medicamentos": "Medicamentos",
@@ -160,9 +159,9 @@ if submitted:
                 if categorias_slug:
                     params["categorias"] = categorias_slug
 
-            response = requests.get(API_ENDPOINT, params=params, timeout=30)
-            response.raise_for_status()
-            payload = response.json()
+            # Stream de Arrow: los trámites llegan tipados, sin parsear JSON
+            tabla, metadatos, _ = obtener_cliente().get_arrow(API_ENDPOINT, params=params)
+            payload = {**metadatos, "tramites": tabla.to_pylist()}
 
             st.session_state[RESULT_STATE_KEY] = payload
             st.session_state[SELECT_STATE_KEY] = 0
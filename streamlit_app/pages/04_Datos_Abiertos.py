@@ -1,18 +1,36 @@
 """
 HU04: Descarga de Datos Abiertos
 """
+import time
 import streamlit as st
-import requests
 import pandas as pd
-import os
+from cliente_api import (
+    FASTAPI_PUBLIC_URL, cargar_datos_filtros, como_dataframe, obtener_cliente, version_actual
+)
 
 st.set_page_config(page_title="Datos Abiertos", page_icon="📥", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_DATOS = f"{FASTAPI_URL}/api/v1/public/datos-abiertos"
+API_DATOS = "/api/v1/public/datos-abiertos"
+API_EXPORTACIONES = "/api/v1/public/exportaciones"
+API_PERFIL = "/api/v1/public/perfil"
+
+FORMATOS = {"csv": "CSV (.csv)", "json": "JSON (.json)", "parquet": "Parquet (.parquet)"}
+# Igual que EXPORTACION_MAX_FILAS del backend
+MAX_REGISTROS = 1_000_000
+# Segundos entre consultas del avance de una exportación
+SEGUNDOS_AVANCE = 1.0
+
+
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def cargar_perfil(version=None) -> dict:
+    """Perfil de columnas del dataset completo; `version` solo forma parte de la clave"""
+    response = obtener_cliente().get(API_PERFIL)
+    response.raise_for_status()
+    return response.json()
+
 
 st.title("📥 Descarga de Datos Abiertos")
-st.markdown("Descarga datasets completos en formato JSON o CSV")
+st.markdown("Descarga datasets completos en formato CSV, JSON o Parquet")
 
 # Información principal
 st.info("""
@@ -30,8 +48,8 @@ col1, col2 = st.columns(2)
 with col1:
     formato = st.selectbox(
         "Formato de descarga",
-        options=["json", "csv"],
-        format_func=lambda x: "JSON (.json)" if x == "json" else "CSV (.csv)",
+        options=list(FORMATOS),
+        format_func=FORMATOS.get,
         help="Selecciona el formato del archivo a descargar"
     )
 
@@ -39,12 +57,37 @@ with col2:
     limit = st.number_input(
         "Cantidad de registros",
         min_value=100,
-        max_value=10000,
-        value=1000,
-        step=100,
+        max_value=MAX_REGISTROS,
+        value=10000,
+        step=1000,
         help="Máximo de registros a descargar"
     )
 
+# Filtros opcionales (las opciones salen de las estadísticas ya en caché)
+with st.expander("🔍 Filtros (opcional)"):
+    anos_disponibles = ["Todos"]
+    clases_disponibles = ["Todas"]
+    try:
+        datos_filtros = cargar_datos_filtros(version_actual())
+        anos_disponibles += datos_filtros.get("anos_disponibles", [])
+        clases_disponibles += datos_filtros.get("clases_disponibles", [])
+    except Exception as e:
+        st.warning(f"⚠️ No se pudieron cargar las opciones de filtros: {str(e)}")
+
+    fcol1, fcol2, fcol3 = st.columns(3)
+    with fcol1:
+        ano_seleccionado = st.selectbox("📅 Año", options=anos_disponibles)
+    with fcol2:
+        clase_seleccionada = st.selectbox("📂 Clase de Trámite", options=clases_disponibles)
+    with fcol3:
+        palabra_clave = st.text_input("🔎 Palabra Clave", placeholder="Ej: sanitario, medicamento")
+
+filtros = {
+    "ano": None if ano_seleccionado == "Todos" else ano_seleccionado,
+    "clase": None if clase_seleccionada == "Todas" else clase_seleccionada,
+    "palabra_clave": palabra_clave.strip() or None,
+}
+
 st.divider()
 
 # Previsualización
@@ -53,41 +96,61 @@ st.subheader("👀 Previsualización")
 if st.button("🔍 Cargar Vista Previa (100 registros)", use_container_width=True):
     with st.spinner("Cargando previsualización..."):
         try:
-            response = requests.get(
+            # Stream de Arrow: el DataFrame llega tipado, sin parsear JSON
+            tabla, _, _ = obtener_cliente().get_arrow(
                 API_DATOS,
                 params={"formato": "json", "limit": 100}
             )
-            response.raise_for_status()
-            data = response.json()
             
-            if data.get('datos'):
-                df_preview = pd.DataFrame(data['datos'])
+            if tabla.num_rows:
+                df_preview = como_dataframe(tabla)
                 
                 st.success(f"✅ Se cargaron {len(df_preview)} registros de muestra")
                 
+                # Perfil del dataset completo, calculado en el backend una vez por versión
+                try:
+                    perfil = cargar_perfil(version_actual())
+                except Exception as e:
+                    perfil = None
+                    st.warning(f"⚠️ No se pudo cargar el perfil del dataset: {str(e)}")
+                
                 # Mostrar información del dataset
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Registros", len(df_preview))
-                with col2:
-                    st.metric("Columnas", len(df_preview.columns))
-                with col3:
-                    # Calcular tamaño aproximado
-                    size_kb = df_preview.memory_usage(deep=True).sum() / 1024
-                    st.metric("Tamaño Aprox.", f"{size_kb:.1f} KB")
+                if perfil:
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Registros", f"{perfil['filas']:,}")
+                    with col2:
+                        st.metric("Columnas", perfil["columnas"])
+                    with col3:
+                        # Sin snapshot el perfil sale de agregados de Socrata, sin tamaño
+                        tamano = perfil.get("bytes")
+                        st.metric("Tamaño en Memoria", f"{tamano / 1024 / 1024:,.1f} MB" if tamano is not None else "—")
                 
                 # Mostrar tabla
                 st.dataframe(df_preview, use_container_width=True, hide_index=True)
                 
-                # Información de columnas
-                with st.expander("📋 Información de Columnas"):
-                    col_info = pd.DataFrame({
-                        'Columna': df_preview.columns,
-                        'Tipo': df_preview.dtypes.astype(str),
-                        'No Nulos': df_preview.count(),
-                        'Valores Únicos': df_preview.nunique()
-                    })
-                    st.dataframe(col_info, use_container_width=True)
+                # Información de columnas (todo el dataset, no solo la muestra)
+                if perfil:
+                    with st.expander("📋 Información de Columnas"):
+                        col_info = pd.DataFrame([
+                            {
+                                'Columna': c['columna'],
+                                'Tipo': c['tipo'],
+                                'No Nulos': c['no_nulos'],
+                                '% Nulos': c['porcentaje_nulos'],
+                                'Valores Únicos': c['distintos'],
+                                'Vacíos': c['vacios'],
+                                'Long. Mín': (c['longitud'] or {}).get('min'),
+                                'Long. Media': (c['longitud'] or {}).get('media'),
+                                'Long. Máx': (c['longitud'] or {}).get('max'),
+                                'Más Frecuentes': ", ".join(
+                                    f"{t['valor']} ({t['cantidad']:,})" for t in c['top']
+                                ),
+                            }
+                            for c in perfil['perfil']
+                        ])
+                        st.dataframe(col_info, use_container_width=True, hide_index=True)
+                        st.caption(f"Perfil de los {perfil['filas']:,} registros de la versión {perfil['version']}")
             else:
                 st.warning("No se encontraron datos")
                 
@@ -99,51 +162,69 @@ st.divider()
 # Descarga completa
 st.subheader("💾 Descargar Dataset Completo")
 
+# Archivos ya generados para la versión del dataset: descarga inmediata,
+# comprimida en tránsito y reanudable
+st.caption("Todos los registros, listos para descargar (se actualizan con cada versión del dataset)")
+for columna, (clave, etiqueta) in zip(st.columns(len(FORMATOS)), FORMATOS.items()):
+    with columna:
+        st.link_button(
+            f"⚡ {etiqueta}", f"{FASTAPI_PUBLIC_URL}{API_DATOS}/completo.{clave}", use_container_width=True
+        )
+
+st.subheader("🎯 Descarga Personalizada")
+
 st.warning(f"⚠️ Estás a punto de descargar hasta {limit:,} registros en formato {formato.upper()}")
 
-if st.button("📥 DESCARGAR AHORA", type="primary", use_container_width=True):
-    with st.spinner(f"Generando archivo {formato.upper()}..."):
+# El archivo se genera en el backend como un trabajo: aquí solo se envía y se
+# sigue su avance; la descarga va directo del backend al navegador
+if st.button("📥 GENERAR ARCHIVO", type="primary", use_container_width=True):
+    try:
+        response = obtener_cliente().post(
+            API_EXPORTACIONES,
+            json={"formato": formato, "limite": int(limit), **{k: v for k, v in filtros.items() if v}}
+        )
+        if response.status_code == 503:
+            st.error("⏳ Hay demasiadas exportaciones en espera. Intenta de nuevo en unos segundos.")
+        else:
+            response.raise_for_status()
+            st.session_state["exportacion"] = response.json()
+    except Exception as e:
+        st.error(f"❌ Error al enviar la exportación: {str(e)}")
+
+trabajo = st.session_state.get("exportacion")
+if trabajo:
+    if trabajo["estado"] in ("en_cola", "en_curso"):
         try:
-            if formato == "csv":
-                # Descargar CSV
-                response = requests.get(
-                    API_DATOS,
-                    params={"formato": "csv", "limit": limit}
-                )
-                response.raise_for_status()
-                
-                st.download_button(
-                    label="📥 Descargar archivo CSV",
-                    data=response.content,
-                    file_name=f"invima_datos_{limit}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                st.success("✅ ¡Archivo CSV listo para descargar!")
-                
-            else:
-                # Descargar JSON
-                response = requests.get(
-                    API_DATOS,
-                    params={"formato": "json", "limit": limit}
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                import json
-                json_str = json.dumps(data, indent=2, ensure_ascii=False)
-                
-                st.download_button(
-                    label="📥 Descargar archivo JSON",
-                    data=json_str,
-                    file_name=f"invima_datos_{limit}.json",
-                    mime="application/json",
-                    use_container_width=True
-                )
-                st.success("✅ ¡Archivo JSON listo para descargar!")
-                
+            response = obtener_cliente().get(f"{API_EXPORTACIONES}/{trabajo['id']}")
+            response.raise_for_status()
+            trabajo = st.session_state["exportacion"] = response.json()
         except Exception as e:
-            st.error(f"❌ Error al generar descarga: {str(e)}")
+            st.error(f"❌ Error al consultar la exportación: {str(e)}")
+
+    if trabajo["estado"] == "en_cola":
+        st.progress(0.0, text="🕒 En cola...")
+    elif trabajo["estado"] == "en_curso":
+        if trabajo.get("total"):
+            texto = f"⚙️ Generando archivo... {trabajo['filas']:,} de {trabajo['total']:,} registros"
+        else:
+            texto = "⚙️ Consultando registros..."
+        st.progress(trabajo.get("progreso") or 0.0, text=texto)
+    elif trabajo["estado"] == "listo":
+        st.success(
+            f"✅ ¡Archivo {trabajo['formato'].upper()} listo! {trabajo['filas']:,} registros, "
+            f"{(trabajo.get('bytes') or 0) / 1024:,.1f} KB"
+        )
+        st.link_button(
+            f"📥 Descargar archivo {trabajo['formato'].upper()}",
+            f"{FASTAPI_PUBLIC_URL}{trabajo['descarga']}",
+            use_container_width=True
+        )
+    else:
+        st.error(f"❌ Error al generar descarga: {trabajo.get('error')}")
+
+    if trabajo["estado"] in ("en_cola", "en_curso"):
+        time.sleep(SEGUNDOS_AVANCE)
+        st.rerun()
 
 st.divider()
 
@@ -159,6 +240,7 @@ with st.expander("📖 Información sobre Datos Abiertos"):
     
     - **JSON**: Formato ideal para desarrollo de aplicaciones y APIs
     - **CSV**: Formato ideal para análisis en Excel, R, Python, etc.
+    - **Parquet**: Formato columnar comprimido, ideal para pandas, Spark o DuckDB
     
     ### Casos de Uso
     
@@ -175,7 +257,8 @@ with st.expander("📖 Información sobre Datos Abiertos"):
     
     ### Limitaciones
     
-    - Máximo 10,000 registros por descarga
+    - Máximo 1,000,000 registros por descarga
+    - Los archivos generados se conservan 24 horas
     - Los datos se actualizan periódicamente
     - Información de carácter público únicamente
     
@@ -191,6 +274,7 @@ st.info("""
 
 - Para análisis en Excel: Descarga en formato **CSV**
 - Para desarrollo de apps: Descarga en formato **JSON**
+- Para volúmenes grandes: Descarga en formato **Parquet**
 - Usa la previsualización para verificar los datos antes de descargar
-- Si necesitas más de 10,000 registros, descarga en lotes
+- Una descarga igual a otra reciente se entrega sin volver a generarla
 """)
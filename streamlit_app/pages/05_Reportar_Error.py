@@ -3,13 +3,12 @@ HU05: Reportar Errores o Inconsistencias
 """
 import streamlit as st
 import requests
-import os
 from datetime import datetime
+from cliente_api import obtener_cliente
 
 st.set_page_config(page_title="Reportar Error", page_icon="📝", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_REPORTES = f"{FASTAPI_URL}/api/v1/reportes/crear"
+API_REPORTES = "/api/v1/reportes/crear"
 
 st.title("📝 Reportar Error o Inconsistencia")
 st.markdown("Ayúdanos a mejorar la calidad de los datos reportando errores o inconsistencias")
@@ -121,7 +120,7 @@ if submitted:
                     "numero_radicado": numero_radicado if numero_radicado else None
                 }
                 
-                response = requests.post(API_REPORTES, json=payload)
+                response = obtener_cliente().post(API_REPORTES, json=payload)
                 response.raise_for_status()
                 
                 resultado = response.json()
@@ -3,18 +3,19 @@ HU05: Visualización de Reportes de Errores (Datos Anónimos)
 Interfaz de administración para consultar reportes sin exponer datos personales
 """
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import os
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict
+from urllib.parse import urlencode
+from cliente_api import FASTAPI_PUBLIC_URL, obtener_cliente
 
 st.set_page_config(page_title="Reportes de Errores", page_icon="📊", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_REPORTES = f"{FASTAPI_URL}/api/v1/reportes/listar"
+API_REPORTES = "/api/v1/reportes/listar"
+API_ESTADISTICAS = "/api/v1/reportes/estadisticas"
+API_EXPORTAR = f"{FASTAPI_PUBLIC_URL}/api/v1/reportes/exportar"
 
 st.title("📊 Reportes de Errores")
 st.markdown("Visualización de reportes con datos anónimos para análisis y seguimiento")
@@ -30,162 +31,98 @@ with col2:
 
 st.divider()
 
-# Función para anonimizar datos
-def anonimizar_datos(reportes: List[Dict]) -> List[Dict]:
+# Estadísticas de todo el histórico, calculadas en el backend con contadores
+def cargar_estadisticas(dias: int = 30) -> Dict:
     """
-    Anonimiza los datos personales de los reportes manteniendo la información útil
+    Obtiene las estadísticas de reportes desde la API sin caché
     """
-    reportes_anonimos = []
-    
-    for i, reporte in enumerate(reportes):
-        # Generar identificador anónimo basado en el índice
-        usuario_id = f"Usuario_{i+1:03d}"
-        
-        # Extraer dominio del email para análisis (sin exponer el email completo)
-        email_dominio = "Desconocido"
-        if reporte.get("email"):
-            try:
-                email_dominio = reporte["email"].split("@")[1] if "@" in reporte["email"] else "Desconocido"
-            except:
-                email_dominio = "Desconocido"
-        
-        reporte_anonimo = {
-            "usuario_id": usuario_id,
-            "email_dominio": email_dominio,
-            "tipo_error": reporte.get("tipo_error", "No especificado"),
-            "descripcion": reporte.get("descripcion", ""),
-            "numero_radicado": reporte.get("numero_radicado"),
-            "fecha_reporte": reporte.get("fecha_reporte", ""),
-            "reporte_id": reporte.get("reporte_id", ""),
-            "tiene_radicado": "Sí" if reporte.get("numero_radicado") else "No"
-        }
-        reportes_anonimos.append(reporte_anonimo)
-    
-    return reportes_anonimos
-
-# Función para obtener estadísticas
-def obtener_estadisticas(reportes: List[Dict]) -> Dict:
-    """
-    Calcula estadísticas de los reportes
-    """
-    if not reportes:
-        return {
-            "total_reportes": 0,
-            "por_tipo": {},
-            "por_dominio": {},
-            "con_radicado": 0,
-            "sin_radicado": 0,
-            "ultimos_7_dias": 0,
-            "ultimos_30_dias": 0
-        }
-    
-    # Contadores
-    por_tipo = {}
-    por_dominio = {}
-    con_radicado = 0
-    sin_radicado = 0
-    ultimos_7_dias = 0
-    ultimos_30_dias = 0
-    
-    fecha_actual = datetime.now()
-    fecha_7_dias = fecha_actual - timedelta(days=7)
-    fecha_30_dias = fecha_actual - timedelta(days=30)
-    
-    for reporte in reportes:
-        # Por tipo de error
-        tipo = reporte.get("tipo_error", "No especificado")
-        por_tipo[tipo] = por_tipo.get(tipo, 0) + 1
-        
-        # Por dominio de email
-        dominio = reporte.get("email_dominio", "Desconocido")
-        por_dominio[dominio] = por_dominio.get(dominio, 0) + 1
-        
-        # Con/sin radicado
-        if reporte.get("numero_radicado"):
-            con_radicado += 1
-        else:
-            sin_radicado += 1
-        
-        # Por fecha
-        try:
-            fecha_reporte = datetime.fromisoformat(reporte.get("fecha_reporte", "").replace("Z", "+00:00"))
-            if fecha_reporte >= fecha_7_dias:
-                ultimos_7_dias += 1
-            if fecha_reporte >= fecha_30_dias:
-                ultimos_30_dias += 1
-        except:
-            pass
-    
-    return {
-        "total_reportes": len(reportes),
-        "por_tipo": por_tipo,
-        "por_dominio": por_dominio,
-        "con_radicado": con_radicado,
-        "sin_radicado": sin_radicado,
-        "ultimos_7_dias": ultimos_7_dias,
-        "ultimos_30_dias": ultimos_30_dias
-    }
+    try:
+        response = obtener_cliente().get(API_ESTADISTICAS, params={"dias": dias}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        st.error(f"Error al cargar estadísticas: {str(e)}")
+        return {}
 
 # Cargar datos sin caché
-def cargar_reportes():
+def cargar_reportes(params: Dict = None) -> Dict:
     """
-    Carga los reportes desde la API sin caché
+    Carga los reportes desde la API sin caché. Los filtros, el orden, la
+    paginación por cursor y la anonimización se resuelven en el backend
     """
     try:
-        # Agregar parámetro timestamp para evitar caché del navegador
-        import time
-        url = f"{API_REPORTES}?_t={int(time.time())}"
-        response = requests.get(url, timeout=10)
+        # Sin marca de tiempo en la URL: la sesión compartida no guarda respuestas
+        # sin ETag, y así dos reruns seguidos comparten la misma solicitud en curso
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        params["anonimizado"] = "true"
+        response = obtener_cliente().get(API_REPORTES, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        return data.get("reportes", [])
+        return response.json()
     except Exception as e:
         st.error(f"Error al cargar reportes: {str(e)}")
-        return []
+        return {"reportes": [], "siguiente": None}
 
-# Cargar reportes
+# Cargar estadísticas
 with st.spinner("Cargando reportes..."):
-    reportes_raw = cargar_reportes()
+    estadisticas = cargar_estadisticas(dias=30)
 
-if not reportes_raw:
+if not estadisticas.get("total_reportes"):
     st.warning("No hay reportes disponibles")
     st.stop()
 
-# Anonimizar datos
-reportes_anonimos = anonimizar_datos(reportes_raw)
-estadisticas = obtener_estadisticas(reportes_anonimos)
-
 # Sidebar con filtros
 st.sidebar.header("🔍 Filtros")
 
+# Búsqueda de texto (índice invertido en el backend, sin distinguir tildes)
+busqueda = st.sidebar.text_input(
+    "Buscar en descripción o radicado", "", help="Resultados ordenados por relevancia"
+).strip()
+
 # Filtro por tipo de error
-tipos_disponibles = ["Todos"] + list(set([r["tipo_error"] for r in reportes_anonimos]))
+tipos_disponibles = ["Todos"] + sorted(set(estadisticas["por_tipo"]) - {"No especificado"})
 tipo_seleccionado = st.sidebar.selectbox("Tipo de Error", tipos_disponibles)
 
 # Filtro por dominio de email
-dominios_disponibles = ["Todos"] + list(set([r["email_dominio"] for r in reportes_anonimos]))
+dominios_disponibles = ["Todos"] + sorted(set(estadisticas["por_dominio"]) - {"Desconocido"})
 dominio_seleccionado = st.sidebar.selectbox("Dominio de Email", dominios_disponibles)
 
 # Filtro por radicado
 radicado_filtro = st.sidebar.selectbox("Con Radicado", ["Todos", "Sí", "No"])
-
-# Aplicar filtros
-reportes_filtrados = reportes_anonimos.copy()
-
-if tipo_seleccionado != "Todos":
-    reportes_filtrados = [r for r in reportes_filtrados if r["tipo_error"] == tipo_seleccionado]
-
-if dominio_seleccionado != "Todos":
-    reportes_filtrados = [r for r in reportes_filtrados if r["email_dominio"] == dominio_seleccionado]
-
-if radicado_filtro != "Todos":
-    valor_radicado = "Sí" if radicado_filtro == "Sí" else "No"
-    reportes_filtrados = [r for r in reportes_filtrados if r["tiene_radicado"] == valor_radicado]
+radicado_texto = st.sidebar.text_input("Número de Radicado", "").strip()
+cluster_texto = st.sidebar.text_input(
+    "Cluster de duplicados", "", help="cluster_id: muestra un reporte y sus casi duplicados"
+).strip()
+
+orden_seleccionado = st.sidebar.radio("Orden", ["Más recientes primero", "Más antiguos primero"])
+por_pagina = st.sidebar.selectbox("Reportes por página", [50, 100, 250, 500], index=1)
+
+# Aplicar filtros en el backend (consultas indexadas sobre todo el histórico)
+filtros_api = {
+    "tipo_error": None if tipo_seleccionado == "Todos" else tipo_seleccionado,
+    "dominio": None if dominio_seleccionado == "Todos" else dominio_seleccionado,
+    "con_radicado": None if radicado_filtro == "Todos" else str(radicado_filtro == "Sí").lower(),
+    "radicado": radicado_texto or None,
+    "cluster": cluster_texto or None,
+    "q": busqueda or None,
+    "orden": "desc" if orden_seleccionado == "Más recientes primero" else "asc",
+    "limit": por_pagina,
+}
+
+# Paginación por cursor: pila de cursores de las páginas visitadas con estos filtros
+clave_filtros = tuple(sorted((k, str(v)) for k, v in filtros_api.items()))
+if st.session_state.get("reportes_filtros") != clave_filtros:
+    st.session_state["reportes_filtros"] = clave_filtros
+    st.session_state["reportes_cursores"] = [None]
+cursores = st.session_state["reportes_cursores"]
+
+pagina_actual = cargar_reportes({**filtros_api, "cursor": cursores[-1]})
+reportes_filtrados = pagina_actual.get("reportes", [])
+siguiente_cursor = pagina_actual.get("siguiente")
 
 # Estadísticas principales
 st.header("📈 Estadísticas Generales")
 
-col1, col2, col3, col4 = st.columns(4)
+col1, col2, col3, col4, col5 = st.columns(5)
 
 with col1:
     st.metric(
@@ -209,10 +146,18 @@ with col3:
     )
 
 with col4:
+    st.metric(
+        label="Posibles Duplicados",
+        value=estadisticas.get("duplicados", 0),
+        delta=f"{estadisticas.get('clusters_con_duplicados', 0)} grupos",
+        delta_color="off"
+    )
+
+with col5:
     st.metric(
         label="Reportes Filtrados",
         value=len(reportes_filtrados),
-        delta=f"{len(reportes_filtrados)} de {len(reportes_anonimos)}"
+        delta=f"Página {len(cursores)}"
     )
 
 # Gráficos
@@ -242,8 +187,39 @@ with col2:
         fig_dominios.update_layout(xaxis_tickangle=45)
         st.plotly_chart(fig_dominios, use_container_width=True)
 
+# Serie diaria de los últimos 30 días
+if estadisticas.get("serie_diaria"):
+    df_serie = pd.DataFrame(estadisticas["serie_diaria"])
+    fig_serie = px.bar(
+        df_serie, x="fecha", y="cantidad",
+        title="Reportes por Día (últimos 30 días)",
+        labels={"fecha": "Fecha", "cantidad": "Reportes"}
+    )
+    st.plotly_chart(fig_serie, use_container_width=True)
+
+# Grupos de casi duplicados más grandes (su cluster_id sirve como filtro)
+if estadisticas.get("clusters_principales"):
+    with st.expander("🔁 Grupos de posibles duplicados"):
+        st.dataframe(
+            pd.DataFrame(estadisticas["clusters_principales"]).rename(
+                columns={"cluster_id": "Cluster", "reportes": "Reportes"}
+            ),
+            use_container_width=True,
+            hide_index=True
+        )
+
 # Tabla de reportes filtrados
-st.header(f"📋 Reportes ({len(reportes_filtrados)} encontrados)")
+st.header(f"📋 Reportes (página {len(cursores)}, {len(reportes_filtrados)} reportes)")
+
+col_anterior, col_siguiente, _ = st.columns([1, 1, 4])
+with col_anterior:
+    if st.button("⬅️ Anterior", disabled=len(cursores) == 1, use_container_width=True):
+        cursores.pop()
+        st.rerun()
+with col_siguiente:
+    if st.button("Siguiente ➡️", disabled=not siguiente_cursor, use_container_width=True):
+        cursores.append(siguiente_cursor)
+        st.rerun()
 
 if reportes_filtrados:
     # Crear DataFrame para la tabla
@@ -252,14 +228,17 @@ if reportes_filtrados:
     # Reordenar columnas
     columnas_ordenadas = [
         "reporte_id", "usuario_id", "tipo_error", "email_dominio", 
-        "tiene_radicado", "numero_radicado", "fecha_reporte", "descripcion"
+        "tiene_radicado", "numero_radicado", "fecha_reporte", "descripcion",
+        "cluster_id", "duplicado_de"
     ]
     df_reportes = df_reportes[columnas_ordenadas]
+    df_reportes["tiene_radicado"] = df_reportes["tiene_radicado"].map({True: "Sí", False: "No"})
     
     # Renombrar columnas para mejor visualización
     df_reportes.columns = [
         "ID Reporte", "Usuario", "Tipo Error", "Dominio Email",
-        "Con Radicado", "Número Radicado", "Fecha", "Descripción"
+        "Con Radicado", "Número Radicado", "Fecha", "Descripción",
+        "Cluster", "Duplicado de"
     ]
     
     # Formatear fecha
@@ -273,28 +252,22 @@ if reportes_filtrados:
         height=400
     )
     
-    # Opciones de descarga
+    # Exportación de todos los reportes filtrados (no solo esta página),
+    # anonimizada y generada por el backend; el navegador la descarga directo
     st.subheader("💾 Exportar Datos")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        csv_data = df_reportes.to_csv(index=False)
-        st.download_button(
-            label="📥 Descargar CSV",
-            data=csv_data,
-            file_name=f"reportes_anonimos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
-    
-    with col2:
-        json_data = df_reportes.to_json(orient="records", indent=2)
-        st.download_button(
-            label="📥 Descargar JSON",
-            data=json_data,
-            file_name=f"reportes_anonimos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            mime="application/json"
-        )
+
+    params_exportar = urlencode({
+        k: v for k, v in filtros_api.items() if v is not None and k not in ("limit", "q")
+    })
+    col1, col2, col3 = st.columns(3)
+
+    for columna, formato, etiqueta in (
+        (col1, "csv", "📥 Descargar CSV"),
+        (col2, "jsonl", "📥 Descargar JSON Lines"),
+        (col3, "parquet", "📥 Descargar Parquet"),
+    ):
+        with columna:
+            st.link_button(etiqueta, f"{API_EXPORTAR}?formato={formato}&{params_exportar}")
 
 else:
     st.info("No hay reportes que coincidan con los filtros seleccionados")
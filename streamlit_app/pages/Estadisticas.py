@@ -5,17 +5,16 @@ Dashboard de análisis y visualización de datos
 import streamlit as st
 import requests
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import os
-from io import BytesIO
-import xlsxwriter
+from urllib.parse import urlencode
+import figuras
+from diagnostico import mostrar_diagnostico
+from cliente_api import (
+    FASTAPI_PUBLIC_URL, FASTAPI_URL, cargar_datos_filtros, obtener_estadisticas, version_actual, version_dataset
+)
 
 st.set_page_config(page_title="Estadísticas INVIMA", page_icon="📊", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_STATS_SUIT = f"{FASTAPI_URL}/api/v1/dashboard/estadisticas-suit"
+API_EXCEL = f"{FASTAPI_PUBLIC_URL}/api/v1/dashboard/estadisticas-suit/export.xlsx"
 
 # Header
 st.title("📊 Estadísticas de Trámites")
@@ -24,35 +23,34 @@ st.markdown("Análisis y visualización de datos del INVIMA")
 # Info de conectividad
 info_col1, info_col2 = st.columns([3, 1])
 with info_col2:
-    if st.button("🔄 Recargar", help="Limpiar caché y recargar datos"):
-        st.cache_data.clear()
+    if st.button("🔄 Recargar", help="Buscar una versión nueva de los datos y recargar"):
+        # Solo se vuelve a preguntar la versión del dataset: si cambió, las
+        # estadísticas se recargan; la caché de otras páginas y usuarios no se toca
+        version_dataset.clear()
         st.rerun()
 
+version = version_actual()
+if version:
+    info_col1.caption(f"🗂️ Versión del dataset: {version}")
+
 st.divider()
 
 # Sidebar - Filtros
 st.sidebar.header("🔍 Filtros")
 st.sidebar.markdown("Personaliza tu búsqueda")
 
-# Cargar datos iniciales para opciones de filtros
-@st.cache_data(ttl=300)
-def cargar_datos_filtros():
-    try:
-        response = requests.get(API_STATS_SUIT, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.sidebar.error(f"⚠️ Error conectando con la API: {str(e)}")
-        st.sidebar.info("Asegúrate de que el backend FastAPI esté corriendo en http://localhost:8000")
-        return None
-
 # Inicializar listas por defecto
 anos_disponibles = ["Todos"]
 clases_disponibles = ["Todas"]
 
-# Intentar cargar datos de filtros
+# Intentar cargar datos de filtros (la misma consulta sin filtros que usa el Tablero Público)
 with st.spinner("Cargando opciones de filtros..."):
-    datos_filtros = cargar_datos_filtros()
+    try:
+        datos_filtros = cargar_datos_filtros(version)
+    except Exception as e:
+        datos_filtros = None
+        st.sidebar.error(f"⚠️ Error conectando con la API: {str(e)}")
+        st.sidebar.info(f"Asegúrate de que el backend FastAPI esté corriendo en {FASTAPI_URL}")
     
 if datos_filtros:
     anos_disponibles += datos_filtros.get("anos_disponibles", [])
@@ -79,39 +77,22 @@ palabra_clave = st.sidebar.text_input(
     help="Buscar en nombre del trámite"
 )
 
-aplicar_filtros = st.sidebar.button("🔄 Aplicar Filtros", use_container_width=True)
+# Los filtros forman parte de la clave de caché: aplicarlos no invalida nada
+st.sidebar.button("🔄 Aplicar Filtros", use_container_width=True)
 
-if aplicar_filtros:
-    st.cache_data.clear()
+filtro_ano = None if ano_seleccionado == "Todos" else ano_seleccionado
+filtro_clase = None if clase_seleccionada == "Todas" else clase_seleccionada
+filtro_kw = palabra_clave.strip() if palabra_clave.strip() else None
 
-# Cargar estadísticas con filtros
-@st.cache_data(ttl=300)
-def cargar_estadisticas(ano=None, clase=None, kw=None):
+with st.spinner("⏳ Cargando estadísticas... (criterio: <5 segundos para 10,000 registros)"):
     try:
-        params = {}
-        if ano and ano != "Todos":
-            params["ano"] = ano
-        if clase and clase != "Todas":
-            params["clase"] = clase
-        if kw:
-            params["palabra_clave"] = kw
-        
-        response = requests.get(API_STATS_SUIT, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        data, diagnostico = obtener_estadisticas(filtro_ano, filtro_clase, filtro_kw, version)
     except requests.exceptions.Timeout:
         st.error("⏱️ Consulta tardó más de 30 segundos. Intenta con filtros más específicos.")
-        return None
+        data, diagnostico = None, None
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
-        return None
-
-filtro_ano = None if ano_seleccionado == "Todos" else ano_seleccionado
-filtro_clase = None if clase_seleccionada == "Todas" else clase_seleccionada
-filtro_kw = palabra_clave.strip() if palabra_clave.strip() else None
-
-with st.spinner("⏳ Cargando estadísticas... (criterio: <5 segundos para 10,000 registros)"):
-    data = cargar_estadisticas(filtro_ano, filtro_clase, filtro_kw)
+        data, diagnostico = None, None
 
 if data:
     total_registros = data.get("total_registros", 0)
@@ -132,6 +113,8 @@ if data:
             if filtros_aplicados.get("palabra_clave"):
                 cols[2].metric("Palabra Clave", filtros_aplicados["palabra_clave"])
     
+    mostrar_diagnostico(diagnostico)
+    
     # Métricas resumen
     st.subheader("📊 Resumen General")
     col1, col2, col3, col4 = st.columns(4)
@@ -159,35 +142,10 @@ if data:
         df_ano['cantidad'] = pd.to_numeric(df_ano['cantidad'], errors='coerce')
         df_ano = df_ano.sort_values('ano')
         
-        # Gráfico de barras vertical
-        fig = go.Figure()
-        
-        # Crear gradiente de colores basado en la cantidad
-        colors_scale = px.colors.sequential.Blues
-        color_values = df_ano['cantidad'] / df_ano['cantidad'].max()
-        bar_colors = [colors_scale[min(int(v * (len(colors_scale)-1)), len(colors_scale)-1)] for v in color_values]
-        
-        fig.add_trace(go.Bar(
-            x=df_ano['ano'],
-            y=df_ano['cantidad'],
-            text=df_ano['cantidad'].apply(lambda x: f"{int(x):,}"),
-            textposition='outside',
-            marker=dict(
-                color=bar_colors,
-                line=dict(color='white', width=2)
-            ),
-            hovertemplate='<b>Año %{x}</b><br>Trámites: %{y:,}<extra></extra>'
-        ))
-        
-        fig.update_layout(
-            title='Evolución de Trámites por Año',
-            xaxis_title='Año',
-            yaxis_title='Cantidad de Trámites',
-            height=450,
-            showlegend=False,
-            xaxis=dict(type='category'),
-            plot_bgcolor='rgba(0,0,0,0)',
-            yaxis=dict(gridcolor='rgba(128,128,128,0.2)')
+        # Gráfico de barras vertical (en caché mientras los datos no cambien)
+        fig = figuras.barras_por_ano(
+            df_ano, titulo='Evolución de Trámites por Año', titulo_y='Cantidad de Trámites',
+            escala='Blues', alto=450, rejilla=True
         )
         
         st.plotly_chart(fig, use_container_width=True)
@@ -222,56 +180,13 @@ if data:
         
         with col1:
             # Gráfico de barras horizontales con porcentajes
-            fig = go.Figure()
-            
-            colors = px.colors.qualitative.Set3[:len(df_cat)]
-            
-            fig.add_trace(go.Bar(
-                y=df_cat['categoria'],
-                x=df_cat['cantidad'],
-                orientation='h',
-                text=[f"{int(c):,} ({p}%)" for c, p in zip(df_cat['cantidad'], df_cat['porcentaje'])],
-                textposition='outside',
-                marker=dict(
-                    color=colors,
-                    line=dict(color='white', width=2)
-                ),
-                hovertemplate='<b>%{y}</b><br>Cantidad: %{x:,}<br>Porcentaje: %{customdata:.1f}%<extra></extra>',
-                customdata=df_cat['porcentaje']
-            ))
-            
-            fig.update_layout(
-                title='Categorías de Trámites',
-                xaxis_title='Cantidad de Trámites',
-                yaxis_title='',
-                height=max(400, len(df_cat) * 50),
-                showlegend=False,
-                yaxis=dict(autorange="reversed")
-            )
+            fig = figuras.barras_categorias(df_cat, titulo='Categorías de Trámites')
             
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Gráfico de dona
-            fig_pie = px.pie(
-                df_cat,
-                values='cantidad',
-                names='categoria',
-                hole=0.4,
-                color_discrete_sequence=colors
-            )
-            
-            fig_pie.update_traces(
-                textposition='inside',
-                textinfo='percent',
-                hovertemplate='<b>%{label}</b><br>%{value:,} trámites<br>%{percent}<extra></extra>'
-            )
-            
-            fig_pie.update_layout(
-                title='Proporción',
-                height=400,
-                showlegend=False
-            )
+            fig_pie = figuras.dona(df_cat, nombres='categoria', titulo='Proporción', leyenda=False)
             
             st.plotly_chart(fig_pie, use_container_width=True)
         
@@ -298,29 +213,9 @@ if data:
         top_n = min(15, len(df_clase))
         df_clase_top = df_clase.head(top_n)
         
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            y=df_clase_top['clase'],
-            x=df_clase_top['cantidad'],
-            orientation='h',
-            text=df_clase_top['cantidad'].apply(lambda x: f"{int(x):,}"),
-            textposition='outside',
-            marker=dict(
-                color=df_clase_top['cantidad'],
-                colorscale='Reds',
-                showscale=False,
-                line=dict(color='white', width=1)
-            ),
-            hovertemplate='<b>%{y}</b><br>Cantidad: %{x:,}<extra></extra>'
-        ))
-        
-        fig.update_layout(
-            title=f'Top {top_n} Clases de Trámites',
-            xaxis_title='Cantidad de Trámites',
-            yaxis_title='',
-            height=max(400, top_n * 40),
-            yaxis=dict(autorange="reversed")
+        fig = figuras.ranking(
+            df_clase_top, etiqueta='clase', titulo=f'Top {top_n} Clases de Trámites',
+            titulo_x='Cantidad de Trámites', escala='Reds', alto=max(400, top_n * 40)
         )
         
         st.plotly_chart(fig, use_container_width=True)
@@ -341,35 +236,10 @@ if data:
         df_top['cantidad'] = pd.to_numeric(df_top['cantidad'], errors='coerce')
         df_top = df_top.sort_values('cantidad', ascending=False).head(10)
         
-        # Acortar nombres para mejor visualización
-        df_top['nombre_corto'] = df_top['nombre'].apply(
-            lambda x: (str(x)[:50] + '...') if len(str(x)) > 50 else str(x)
-        )
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Bar(
-            y=df_top['nombre_corto'],
-            x=df_top['cantidad'],
-            orientation='h',
-            text=df_top['cantidad'].apply(lambda x: f"{int(x):,}"),
-            textposition='outside',
-            marker=dict(
-                color=df_top['cantidad'],
-                colorscale='Greens',
-                showscale=False,
-                line=dict(color='white', width=1)
-            ),
-            hovertemplate='<b>%{customdata}</b><br>Cantidad: %{x:,}<extra></extra>',
-            customdata=df_top['nombre']
-        ))
-        
-        fig.update_layout(
-            title='Top 10 Trámites Más Solicitados',
-            xaxis_title='Cantidad de Solicitudes',
-            yaxis_title='',
-            height=500,
-            yaxis=dict(autorange="reversed")
+        # Nombres acortados a 50 caracteres en el gráfico; completos en el hover
+        fig = figuras.ranking(
+            df_top[['nombre', 'cantidad']], etiqueta='nombre', titulo='Top 10 Trámites Más Solicitados',
+            titulo_x='Cantidad de Solicitudes', escala='Greens', alto=500, recortar=50
         )
         
         st.plotly_chart(fig, use_container_width=True)
@@ -388,41 +258,14 @@ if data:
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if st.button("📊 Descargar Excel", use_container_width=True, type="primary"):
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                # Resumen general
-                df_resumen = pd.DataFrame([{
-                    'Total Registros': total_registros,
-                    'Años': len(por_ano),
-                    'Clases': len(por_clase),
-                    'Categorías': len(distribucion_categorias)
-                }])
-                df_resumen.to_excel(writer, sheet_name='Resumen', index=False)
-                
-                # Por Año
-                if por_ano:
-                    pd.DataFrame(por_ano).to_excel(writer, sheet_name='Por Año', index=False)
-                
-                # Por Categoría
-                if distribucion_categorias:
-                    pd.DataFrame(distribucion_categorias).to_excel(writer, sheet_name='Por Categoría', index=False)
-                
-                # Por Clase
-                if por_clase:
-                    pd.DataFrame(por_clase).to_excel(writer, sheet_name='Por Clase', index=False)
-                
-                # Top Trámites
-                if top_tramites:
-                    pd.DataFrame(top_tramites).to_excel(writer, sheet_name='Top Trámites', index=False)
-            
-            st.download_button(
-                label="⬇️ Descargar Excel",
-                data=output.getvalue(),
-                file_name=f"estadisticas_invima_{filtro_ano or 'todos'}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
+        # El backend arma el libro (con el detalle de todas las filas filtradas)
+        # y el navegador lo descarga directamente, sin pasar por esta sesión
+        params_excel = urlencode({
+            k: v for k, v in {"ano": filtro_ano, "clase": filtro_clase, "palabra_clave": filtro_kw}.items() if v
+        })
+        st.link_button(
+            "📊 Descargar Excel", f"{API_EXCEL}?{params_excel}", use_container_width=True, type="primary"
+        )
     
     with col2:
         if st.button("📄 Descargar CSV", use_container_width=True):
@@ -483,7 +326,8 @@ else:
     col1, col2 = st.columns([1, 3])
     with col1:
         if st.button("🔄 Reintentar", use_container_width=True):
-            st.cache_data.clear()
+            # Los errores no quedan en caché: basta con volver a consultar
+            version_dataset.clear()
             st.rerun()
     with col2:
         st.caption("Haz clic en 'Reintentar' después de verificar que los servicios estén corriendo")
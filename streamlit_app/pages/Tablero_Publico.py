@@ -3,20 +3,15 @@ Tablero Público de Trámites del INVIMA
 Dashboard de indicadores de desempeño y eficiencia operativa
 """
 import streamlit as st
-import requests
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import os
 from io import BytesIO
 import xlsxwriter
+import figuras
+from diagnostico import mostrar_diagnostico
+from cliente_api import cargar_datos_filtros, obtener_estadisticas, version_actual, version_dataset
 
 st.set_page_config(page_title="Tablero Público INVIMA", page_icon="🌐", layout="wide")
 
-FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
-API_STATS_SUIT = f"{FASTAPI_URL}/api/v1/dashboard/estadisticas-suit"
-
 st.title("🌐 Tablero Público de Indicadores")
 st.markdown("**Indicadores de desempeño de trámites del INVIMA** | Acceso libre y abierto")
 
@@ -24,26 +19,25 @@ st.markdown("**Indicadores de desempeño de trámites del INVIMA** | Acceso libr
 col1, col2 = st.columns([3, 1])
 with col2:
     if st.button("🔄 Actualizar", help="Actualizar datos del tablero", use_container_width=True):
-        st.cache_data.clear()
+        # Solo se vuelve a preguntar la versión del dataset (ver cliente_api)
+        version_dataset.clear()
         st.rerun()
 
+version = version_actual()
+if version:
+    col1.caption(f"🗂️ Versión del dataset: {version}")
+
 st.divider()
 
 # Sidebar - Filtros dinámicos
 st.sidebar.header("🔍 Filtros Dinámicos")
 st.sidebar.markdown("Actualiza los gráficos en tiempo real")
 
-# Cargar opciones de filtros
-@st.cache_data(ttl=300)
-def cargar_datos_filtros():
-    try:
-        response = requests.get(API_STATS_SUIT, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return None
-
-datos_filtros = cargar_datos_filtros()
+# Cargar opciones de filtros (la misma consulta sin filtros que usa Estadísticas)
+try:
+    datos_filtros = cargar_datos_filtros(version)
+except Exception:
+    datos_filtros = None
 anos_disponibles = ["Todos"]
 clases_disponibles = ["Todas"]
 
@@ -70,30 +64,15 @@ palabra_clave = st.sidebar.text_input(
     help="Buscar en nombre del trámite"
 )
 
-# Cargar estadísticas
-@st.cache_data(ttl=300)
-def cargar_estadisticas(ano=None, clase=None, kw=None):
-    try:
-        params = {}
-        if ano and ano != "Todos":
-            params["ano"] = ano
-        if clase and clase != "Todas":
-            params["clase"] = clase
-        if kw:
-            params["palabra_clave"] = kw
-        
-        response = requests.get(API_STATS_SUIT, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return None
-
 filtro_ano = None if ano_seleccionado == "Todos" else ano_seleccionado
 filtro_clase = None if clase_seleccionada == "Todas" else clase_seleccionada
 filtro_kw = palabra_clave.strip() if palabra_clave.strip() else None
 
 with st.spinner("⏳ Cargando indicadores... (menos de 5 segundos)"):
-    data = cargar_estadisticas(filtro_ano, filtro_clase, filtro_kw)
+    try:
+        data, diagnostico = obtener_estadisticas(filtro_ano, filtro_clase, filtro_kw, version)
+    except Exception:
+        data, diagnostico = None, None
 
 if data:
     total_registros = data.get("total_registros", 0)
@@ -102,6 +81,8 @@ if data:
     top_tramites = data.get("top_tramites", [])
     distribucion_categorias = data.get("distribucion_categorias", [])
     
+    mostrar_diagnostico(diagnostico)
+    
     # INDICADORES GENERALES
     st.subheader("📊 Indicadores Generales")
     
@@ -148,56 +129,16 @@ if data:
         col1, col2 = st.columns(2)
         
         with col1:
-            # Gráfico de barras por año
-            fig_barras = go.Figure()
-            
-            colors_scale = px.colors.sequential.Teal
-            color_values = df_ano['cantidad'] / df_ano['cantidad'].max()
-            bar_colors = [colors_scale[min(int(v * (len(colors_scale)-1)), len(colors_scale)-1)] for v in color_values]
-            
-            fig_barras.add_trace(go.Bar(
-                x=df_ano['ano'],
-                y=df_ano['cantidad'],
-                text=df_ano['cantidad'].apply(lambda x: f"{int(x):,}"),
-                textposition='outside',
-                marker=dict(color=bar_colors, line=dict(color='white', width=2)),
-                hovertemplate='<b>Año %{x}</b><br>Trámites: %{y:,}<extra></extra>'
-            ))
-            
-            fig_barras.update_layout(
-                title='Volumen de Trámites por Año',
-                xaxis_title='Año',
-                yaxis_title='Cantidad',
-                height=400,
-                showlegend=False,
-                xaxis=dict(type='category')
+            # Gráfico de barras por año (en caché mientras los datos no cambien)
+            fig_barras = figuras.barras_por_ano(
+                df_ano, titulo='Volumen de Trámites por Año', titulo_y='Cantidad', escala='Teal', alto=400
             )
             
             st.plotly_chart(fig_barras, use_container_width=True)
         
         with col2:
             # Gráfico de líneas - evolución
-            fig_lineas = go.Figure()
-            
-            fig_lineas.add_trace(go.Scatter(
-                x=df_ano['ano'],
-                y=df_ano['cantidad'],
-                mode='lines+markers',
-                name='Evolución',
-                line=dict(color='#2E86AB', width=4),
-                marker=dict(size=12, color='#A23B72', line=dict(color='white', width=2)),
-                fill='tozeroy',
-                fillcolor='rgba(46, 134, 171, 0.2)',
-                hovertemplate='<b>%{x}</b><br>Cantidad: %{y:,}<extra></extra>'
-            ))
-            
-            fig_lineas.update_layout(
-                title='Tendencia Temporal',
-                xaxis_title='Año',
-                yaxis_title='Cantidad',
-                height=400,
-                showlegend=False
-            )
+            fig_lineas = figuras.lineas_por_ano(df_ano, titulo='Tendencia Temporal', alto=400)
             
             st.plotly_chart(fig_lineas, use_container_width=True)
     
@@ -218,29 +159,9 @@ if data:
             top_n = min(10, len(df_clase))
             df_top = df_clase.head(top_n)
             
-            fig_clase = go.Figure()
-            
-            fig_clase.add_trace(go.Bar(
-                y=df_top['clase'],
-                x=df_top['cantidad'],
-                orientation='h',
-                text=df_top['cantidad'].apply(lambda x: f"{int(x):,}"),
-                textposition='outside',
-                marker=dict(
-                    color=df_top['cantidad'],
-                    colorscale='Viridis',
-                    showscale=False,
-                    line=dict(color='white', width=1)
-                ),
-                hovertemplate='<b>%{y}</b><br>Cantidad: %{x:,}<extra></extra>'
-            ))
-            
-            fig_clase.update_layout(
-                title=f'Top {top_n} Clases de Trámites',
-                xaxis_title='Cantidad',
-                yaxis_title='',
-                height=max(400, top_n * 50),
-                yaxis=dict(autorange="reversed")
+            fig_clase = figuras.ranking(
+                df_top, etiqueta='clase', titulo=f'Top {top_n} Clases de Trámites',
+                titulo_x='Cantidad', escala='Viridis', alto=max(400, top_n * 50)
             )
             
             st.plotly_chart(fig_clase, use_container_width=True)
@@ -249,22 +170,7 @@ if data:
             # Gráfico de pastel (pie chart)
             df_pie = df_clase.head(5)
             
-            fig_pie = px.pie(
-                df_pie,
-                values='cantidad',
-                names='clase',
-                title='Proporción Top 5 Clases',
-                hole=0.4,
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            
-            fig_pie.update_traces(
-                textposition='inside',
-                textinfo='percent',
-                hovertemplate='<b>%{label}</b><br>%{value:,}<br>%{percent}<extra></extra>'
-            )
-            
-            fig_pie.update_layout(height=400)
+            fig_pie = figuras.dona(df_pie, nombres='clase', titulo='Proporción Top 5 Clases')
             
             st.plotly_chart(fig_pie, use_container_width=True)
     
@@ -371,7 +277,8 @@ else:
     """)
     
     if st.button("🔄 Reintentar", use_container_width=True):
-        st.cache_data.clear()
+        # Los errores no quedan en caché: basta con volver a consultar
+        version_dataset.clear()
         st.rerun()
 
 # Información del tablero